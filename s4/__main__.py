@@ -83,6 +83,50 @@ def init():
         if config.ADMIN_API_KEY == "s4-admin-dev-key":
             logger.warning("Using default admin API key! Change this in production.")
 
+@cli.command()
+@click.option(
+    "--index-id",
+    default=None,
+    help="Only compact this index (tenant-prefixed ID); defaults to all indices"
+)
+def compact(index_id):
+    """Drop removed documents' chunks from on-disk indices."""
+    from s4.indexer import DocumentIndex
+    
+    if index_id:
+        index_ids = [index_id]
+    else:
+        suffix = ".vec.json"
+        index_ids = sorted(
+            path.name[:-len(suffix)]
+            for path in config.INDEX_STORAGE_PATH.glob(f"*{suffix}")
+        )
+        
+    for full_index_id in index_ids:
+        index = DocumentIndex(index_id=full_index_id)
+        removed = index.compact()
+        logger.info(f"Compacted {full_index_id}: removed {removed} chunks")
+
+@cli.command()
+@click.option("--index-id", required=True, help="Index to measure (tenant-prefixed ID)")
+@click.option("--k", default=10, help="Number of nearest neighbours compared per query")
+@click.option("--queries", default=100, help="Number of sampled query vectors")
+def recall(index_id, k, queries):
+    """Report recall@k of an index against exact full-precision search."""
+    from s4.indexer import DocumentIndex, backend
+    
+    index = DocumentIndex(index_id=index_id)
+    if index.index is None:
+        click.echo(f"Index {index_id} is empty")
+        return
+        
+    faiss_index = index.index
+    click.echo(f"Index type: {backend.get_index_type(faiss_index)}")
+    click.echo(f"Encoding: {backend.get_quantization(faiss_index) or 'float32'}")
+    click.echo(f"Vectors: {faiss_index.ntotal}")
+    click.echo(f"Index file size: {index.get_index_size()} bytes")
+    click.echo(f"Recall@{k}: {index.measure_recall(k=k, num_queries=queries):.4f}")
+
 @cli.command()
 def version():
     """Show S4 version information."""
@@ -12,6 +12,8 @@ from pydantic import BaseModel, Field, EmailStr
 from s4 import config
 from s4.models import Tenant, Plan, PlanType, get_plans
 from s4.db import tenant_manager
+from s4.embedding import embedding_cache, query_cache
+from s4.service import service_pool
 from s4.exceptions import ValidationError
 
 logger = logging.getLogger(__name__)
@@ -29,6 +31,8 @@ class TenantCreate(BaseModel):
     s3_bucket: Optional[str] = Field(None, description="Custom S3 bucket")
     s3_region: Optional[str] = Field(None, description="Custom S3 region")
     openai_api_key: Optional[str] = Field(None, description="Custom OpenAI API key")
+    openai_requests_per_minute: Optional[int] = Field(None, description="Request limit of the custom OpenAI API key")
+    openai_tokens_per_minute: Optional[int] = Field(None, description="Token limit of the custom OpenAI API key")
     active: bool = Field(True, description="Whether the tenant is active")
 
 class TenantUpdate(BaseModel):
@@ -41,6 +45,8 @@ class TenantUpdate(BaseModel):
     s3_bucket: Optional[str] = Field(None, description="Custom S3 bucket")
     s3_region: Optional[str] = Field(None, description="Custom S3 region")
     openai_api_key: Optional[str] = Field(None, description="Custom OpenAI API key")
+    openai_requests_per_minute: Optional[int] = Field(None, description="Request limit of the custom OpenAI API key")
+    openai_tokens_per_minute: Optional[int] = Field(None, description="Token limit of the custom OpenAI API key")
     active: Optional[bool] = Field(None, description="Whether the tenant is active")
     plan_expires_at: Optional[datetime] = Field(None, description="When the plan expires")
 
@@ -114,6 +120,8 @@ async def create_tenant(
             s3_bucket=tenant_data.s3_bucket,
             s3_region=tenant_data.s3_region,
             openai_api_key=tenant_data.openai_api_key,
+            openai_requests_per_minute=tenant_data.openai_requests_per_minute,
+            openai_tokens_per_minute=tenant_data.openai_tokens_per_minute,
             active=tenant_data.active,
             plan_expires_at=plan_expires_at
         )
@@ -188,6 +196,9 @@ async def update_tenant(
         # Update the tenant
         tenant = tenant_manager.update_tenant(tenant_id, update_data)
         
+        # Pooled services hold the tenant's old settings
+        service_pool.evict(tenant_id)
+        
         # Convert to response model
         result = tenant.dict()
         result['plan'] = tenant.get_plan_object().dict()
@@ -215,6 +226,7 @@ async def delete_tenant(
             
         # Delete the tenant
         tenant_manager.delete_tenant(tenant_id)
+        service_pool.evict(tenant_id)
         
         return {"status": "success", "message": f"Tenant {tenant_id} deleted"}
     except Exception as e:
@@ -242,4 +254,15 @@ async def reset_tenant_key(
         return {"status": "success", "auth_key": new_auth_key}
     except Exception as e:
         logger.error(f"Error resetting tenant key: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error") 
+
+# Cache endpoints
+@router.get("/query-cache")
+async def get_query_cache_stats(_: None = Depends(verify_admin_key)):
+    """Get hit-rate metrics of the query embedding cache."""
+    return query_cache.stats()
+
+@router.get("/embedding-cache")
+async def get_embedding_cache_stats(_: None = Depends(verify_admin_key)):
+    """Get hit and miss counters of the chunk embedding cache."""
+    return embedding_cache.stats()
@@ -1,20 +1,18 @@
 """API routes for S4."""
 
-import io
 import logging
-import tempfile
 from typing import Dict, List, Optional, Any, Union
-from pathlib import Path
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Header, UploadFile, Query, Request
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 
 from s4 import config
-from s4.service import S4Service
+from s4.service import S4Service, service_pool
 from s4.exceptions import S4Error, ValidationError
 from s4.db import tenant_manager
-from s4.auth.minimal_auth import get_s4_service
+from s4.auth.minimal_auth import get_s4_service as get_authenticated_s4_service
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +37,60 @@ class SearchResult(BaseModel):
     metadata: Dict[str, Any] = Field(..., description="Chunk metadata")
     file_metadata: Optional[Dict[str, Any]] = Field(None, description="File metadata")
 
+class BatchSearchQuery(BaseModel):
+    """One query of a batch search."""
+    
+    query: str = Field(..., description="Search query")
+    file_id: Optional[str] = Field(None, description="Optional file ID to restrict search to")
+
+class BatchSearchRequest(BaseModel):
+    """Batch search request."""
+    
+    queries: List[BatchSearchQuery] = Field(..., description="Queries to run")
+    limit: int = Field(5, description="Maximum number of results per query")
+    mode: str = Field("vector", description="vector, lexical or hybrid")
+
+class BatchSearchResult(BaseModel):
+    """Results of one query in a batch search."""
+    
+    query: str
+    results: List[SearchResult]
+
+class UploadRequest(BaseModel):
+    """Request to start a presigned upload."""
+    
+    filename: str = Field(..., description="Original filename")
+    size: int = Field(..., description="File size in bytes")
+    content_type: Optional[str] = Field(None, description="MIME type")
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="Custom metadata")
+
+class UploadPart(BaseModel):
+    """Presigned URL for one part of an upload."""
+    
+    part_number: int
+    url: str = Field(..., description="Presigned PUT URL for the part")
+
+class PresignedUpload(BaseModel):
+    """Upload the client sends straight to S3."""
+    
+    file_id: str
+    upload_id: str
+    part_size: int = Field(..., description="Bytes per part; the last part may be smaller")
+    expires_in: int = Field(..., description="Seconds the part URLs stay valid")
+    parts: List[UploadPart]
+
+class CompletedPart(BaseModel):
+    """A part the client has uploaded."""
+    
+    part_number: int
+    etag: str = Field(..., description="ETag header returned by S3 for the part")
+
+class CompleteUploadRequest(BaseModel):
+    """Request to finish a presigned upload."""
+    
+    file_id: str
+    parts: List[CompletedPart]
+
 class TenantUsage(BaseModel):
     """Tenant usage statistics."""
     
@@ -75,7 +127,8 @@ async def verify_auth_key(x_auth_key: str = Header(None)) -> str:
 async def get_s4_service(tenant_id: str = Depends(verify_auth_key)) -> S4Service:
     """Get S4 service for the authenticated tenant."""
     try:
-        return S4Service(tenant_id=tenant_id)
+        # Loading a cold tenant's index reads from disk, so keep it off the event loop
+        return await run_in_threadpool(service_pool.get, tenant_id)
     except ValidationError as e:
         raise HTTPException(status_code=403, detail=str(e))
     except Exception as e:
@@ -86,10 +139,10 @@ async def get_s4_service(tenant_id: str = Depends(verify_auth_key)) -> S4Service
 async def get_s4_service_combined(request: Request) -> S4Service:
     """Get S4 service using API key authentication.
     """
-    return await get_s4_service(request)
+    return await get_authenticated_s4_service(request)
 
 @router.post("/files", response_model=FileMetadata)
-async def upload_file(
+def upload_file(
     file: UploadFile = File(...),
     file_id: Optional[str] = Form(None),
     metadata_json: Optional[str] = Form(None),
@@ -103,69 +156,127 @@ async def upload_file(
             import json
             metadata = json.loads(metadata_json)
             
-        # Read file content
-        file_content = await file.read()
-        
-        # Upload file
-        file_id = s4_service.upload_file_object(
-            io.BytesIO(file_content),
+        # Hand the spooled upload over by reference; uploads past a small
+        # threshold are already on disk rather than in memory
+        file.file.seek(0)
+        return s4_service.upload_file_object(
+            file.file,
             filename=file.filename,
             content_type=file.content_type,
             file_id=file_id,
             metadata=metadata
         )
-        
-        # Get file metadata
-        result = s4_service.get_file_metadata(file_id)
-        
-        return result
     except S4Error as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Unexpected error uploading file: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.post("/files/uploads", response_model=PresignedUpload)
+def create_upload(
+    request: UploadRequest,
+    s4_service: S4Service = Depends(get_s4_service_combined)
+):
+    """Start an upload that the client sends straight to S3.
+    
+    The client PUTs each ``part_size`` slice of the file to its part's
+    URL, in parallel if it likes, then completes the upload with the
+    ETags S3 returned.
+    """
+    try:
+        return s4_service.create_upload(
+            request.filename,
+            request.size,
+            content_type=request.content_type,
+            metadata=request.metadata
+        )
+    except S4Error as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error starting upload: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.post("/files/uploads/{upload_id}/complete", response_model=FileMetadata)
+def complete_upload(
+    upload_id: str,
+    request: CompleteUploadRequest,
+    s4_service: S4Service = Depends(get_s4_service_combined)
+):
+    """Finish a presigned upload and index the file."""
+    try:
+        return s4_service.complete_upload(
+            request.file_id,
+            upload_id,
+            [part.dict() for part in request.parts]
+        )
+    except S4Error as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error completing upload: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.delete("/files/uploads/{upload_id}")
+def abort_upload(
+    upload_id: str,
+    file_id: str,
+    s4_service: S4Service = Depends(get_s4_service_combined)
+):
+    """Abandon a presigned upload and discard its parts."""
+    try:
+        if not s4_service.abort_upload(file_id, upload_id):
+            raise HTTPException(status_code=400, detail="Upload could not be aborted")
+        return {"success": True}
+    except HTTPException:
+        raise
+    except S4Error as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error aborting upload: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.get("/files/{file_id}", response_class=StreamingResponse)
-async def download_file(
+def download_file(
     file_id: str,
     disposition: str = "attachment",
+    presigned: bool = False,
+    byte_range: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
     s4_service: S4Service = Depends(get_s4_service_combined)
 ):
-    """Download a file from S4."""
+    """Download a file from S4.
+    
+    The S3 response body is streamed straight to the client, and one GET
+    supplies the content type, size and metadata. Single byte ranges and
+    If-None-Match revalidation are passed through to S3. With
+    ``presigned=true`` the client is redirected to a presigned S3 URL
+    instead, so the bytes bypass the API workers.
+    """
     try:
-        # Get file metadata for content type
-        metadata = s4_service.get_file_metadata(file_id)
-        
-        # Download to temporary file
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_path = temp_file.name
+        if presigned:
+            url = s4_service.get_download_url(file_id, disposition=disposition)
+            return RedirectResponse(url, status_code=307)
             
-        file_path = s4_service.download_file(file_id, temp_path)
+        download = s4_service.stream_file(file_id, byte_range=byte_range, if_none_match=if_none_match)
+        headers = download["headers"]
+        if download["body"] is None:
+            # Not modified, or the range cannot be satisfied
+            return Response(status_code=download["status"], headers=headers)
         
         # Get filename from metadata
+        metadata = download["metadata"]
         filename = metadata.get("original_filename", file_id)
-        
-        # Return streaming response
-        def file_generator():
-            with open(file_path, "rb") as f:
-                yield from f
-            # Clean up temp file after streaming
-            Path(file_path).unlink(missing_ok=True)
-            
-        headers = {}
         if disposition == "inline":
             headers["Content-Disposition"] = f"inline; filename=\"{filename}\""
         else:
             headers["Content-Disposition"] = f"attachment; filename=\"{filename}\""
             
-        if "content_type" in metadata:
-            return StreamingResponse(
-                file_generator(), 
-                media_type=metadata["content_type"],
-                headers=headers
-            )
+        media_type = headers.pop("Content-Type")
+        if media_type == "application/octet-stream" and "content_type" in metadata:
+            media_type = metadata["content_type"]
         return StreamingResponse(
-            file_generator(),
+            download["body"],
+            status_code=download["status"],
+            media_type=media_type,
             headers=headers
         )
     except S4Error as e:
@@ -175,7 +286,7 @@ async def download_file(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.delete("/files/{file_id}")
-async def delete_file(
+def delete_file(
     file_id: str,
     s4_service: S4Service = Depends(get_s4_service_combined)
 ):
@@ -190,7 +301,7 @@ async def delete_file(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/files", response_model=List[FileMetadata])
-async def list_files(
+def list_files(
     prefix: str = "",
     max_results: int = 1000,
     s4_service: S4Service = Depends(get_s4_service_combined)
@@ -206,15 +317,16 @@ async def list_files(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/search", response_model=List[SearchResult])
-async def search_files(
+def search_files(
     query: str,
     limit: int = 5,
     file_id: Optional[str] = None,
+    mode: str = "vector",
     s4_service: S4Service = Depends(get_s4_service_combined)
 ):
-    """Search for files in S4."""
+    """Search for files in S4 by meaning (vector), keywords (lexical) or both (hybrid)."""
     try:
-        result = s4_service.search_files(query, limit, file_id)
+        result = s4_service.search(query, limit, file_id, mode=mode)
         return result
     except S4Error as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -222,8 +334,33 @@ async def search_files(
         logger.error(f"Unexpected error searching files: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.post("/search/batch", response_model=List[BatchSearchResult])
+def search_files_batch(
+    request: BatchSearchRequest,
+    s4_service: S4Service = Depends(get_s4_service_combined)
+):
+    """Run many searches with one embedding request, returning results per query."""
+    if len(request.queries) > config.MAX_BATCH_SEARCH_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.MAX_BATCH_SEARCH_QUERIES} queries per batch"
+        )
+        
+    try:
+        queries = [query.dict() for query in request.queries]
+        batches = s4_service.search_batch(queries, request.limit, mode=request.mode)
+        return [
+            {"query": query["query"], "results": results}
+            for query, results in zip(queries, batches)
+        ]
+    except S4Error as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error searching files: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.get("/files/{file_id}/metadata", response_model=FileMetadata)
-async def get_file_metadata(
+def get_file_metadata(
     file_id: str,
     s4_service: S4Service = Depends(get_s4_service_combined)
 ):
@@ -238,15 +375,14 @@ async def get_file_metadata(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.put("/files/{file_id}/metadata", response_model=FileMetadata)
-async def update_file_metadata(
+def update_file_metadata(
     file_id: str,
     metadata: Dict[str, Any],
     s4_service: S4Service = Depends(get_s4_service_combined)
 ):
     """Update metadata for a file."""
     try:
-        result = s4_service.update_file_metadata(file_id, metadata)
-        return result
+        return s4_service.update_metadata(file_id, metadata)
     except S4Error as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -254,7 +390,7 @@ async def update_file_metadata(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/usage", response_model=TenantUsage)
-async def get_usage(s4_service: S4Service = Depends(get_s4_service_combined)):
+def get_usage(s4_service: S4Service = Depends(get_s4_service_combined)):
     """Get tenant usage statistics."""
     try:
         usage = s4_service.get_tenant_usage()
@@ -5,8 +5,9 @@ from typing import Optional, Union, Dict, Any
 
 from fastapi import Request, HTTPException, Depends, Header
 from fastapi.security import APIKeyHeader
+from starlette.concurrency import run_in_threadpool
 from s4.db import tenant_manager
-from s4.service import S4Service
+from s4.service import service_pool
 from s4.exceptions import ValidationError
 
 # Setup logging
@@ -79,7 +80,8 @@ async def get_s4_service(request: Request):
     """
     try:
         tenant_id = await get_tenant_id(request)
-        return S4Service(tenant_id=tenant_id)
+        # Loading a cold tenant's index reads from disk, so keep it off the event loop
+        return await run_in_threadpool(service_pool.get, tenant_id)
     except HTTPException:
         raise
     except ValidationError as e:
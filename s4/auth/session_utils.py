@@ -8,7 +8,7 @@ from supertokens_python.recipe.session import SessionContainer
 from supertokens_python.recipe.session.framework.fastapi import verify_session
 
 from s4.db import tenant_manager
-from s4.service import S4Service
+from s4.service import S4Service, service_pool
 
 logger = logging.getLogger(__name__)
 
@@ -61,7 +61,7 @@ async def get_s4_service_from_session(session: SessionContainer = Depends(verify
         raise HTTPException(status_code=403, detail="No tenant associated with this account")
     
     try:
-        return S4Service(tenant_id=tenant_id)
+        return service_pool.get(tenant_id)
     except Exception as e:
         logger.error(f"Error initializing S4 service: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
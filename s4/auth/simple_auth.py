@@ -45,5 +45,5 @@ async def get_tenant_id(request: Request, api_key: str = Depends(API_KEY_HEADER)
 
 async def get_s4_service(tenant_id: str = Depends(get_tenant_id)):
     """Get S4 service for the authenticated tenant."""
-    from s4.service import S4Service
-    return S4Service(tenant_id=tenant_id)
+    from s4.service import service_pool
+    return service_pool.get(tenant_id)
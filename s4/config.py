@@ -18,6 +18,7 @@ DEBUG = os.getenv("S4_DEBUG", "False").lower() in ("true", "1", "t")
 # API settings
 API_HOST = os.getenv("S4_API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("S4_API_PORT", "8000"))
+MAX_BATCH_SEARCH_QUERIES = int(os.getenv("S4_MAX_BATCH_SEARCH_QUERIES", "500"))  # Queries accepted by one batch search request
 
 # Authentication settings
 DISABLE_API_AUTH = os.getenv("S4_DISABLE_API_AUTH", "False").lower() in ("true", "1", "t")
@@ -32,6 +33,12 @@ S3_BUCKET = os.getenv("S4_S3_BUCKET")
 S3_REGION = os.getenv("S4_S3_REGION", "us-east-1")
 S3_PREFIX = os.getenv("S4_S3_PREFIX", "")
 S3_ENDPOINT_URL = os.getenv("S4_S3_ENDPOINT_URL")  # For non-AWS S3 (e.g., MinIO)
+S3_MULTIPART_THRESHOLD_MB = int(os.getenv("S4_S3_MULTIPART_THRESHOLD_MB", "8"))  # Uploads at least this large are sent in parts
+S3_PART_SIZE_MB = int(os.getenv("S4_S3_PART_SIZE_MB", "16"))  # Size of each multipart upload part
+S3_MAX_CONCURRENCY = int(os.getenv("S4_S3_MAX_CONCURRENCY", "16"))  # Parts of one upload sent in parallel
+S3_STREAM_CHUNK_KB = int(os.getenv("S4_S3_STREAM_CHUNK_KB", "64"))  # Size of the pieces downloads are streamed in
+S3_DOWNLOAD_SPOOL_MB = int(os.getenv("S4_S3_DOWNLOAD_SPOOL_MB", "8"))  # Downloads larger than this are buffered on disk
+PRESIGNED_URL_EXPIRES = int(os.getenv("S4_PRESIGNED_URL_EXPIRES", "3600"))  # Seconds presigned upload and download URLs stay valid
 
 # AWS credentials
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
@@ -39,17 +46,62 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 
 # OpenAI API settings
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-EMBEDDING_MODEL = os.getenv("S4_EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_MODEL = os.getenv("S4_EMBEDDING_MODEL", "text-embedding-ada-002")  # local-hash embeds offline without OpenAI
+LOCAL_EMBEDDING_DIMENSION = int(os.getenv("S4_LOCAL_EMBEDDING_DIMENSION", "384"))  # Dimensions of local hashing embeddings
+QUERY_CACHE_SIZE = int(os.getenv("S4_QUERY_CACHE_SIZE", "10000"))  # Query embeddings kept in memory; 0 disables the cache
+QUERY_CACHE_TTL = float(os.getenv("S4_QUERY_CACHE_TTL", "3600"))  # Seconds a cached query embedding stays valid; 0 never expires
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("S4_EMBEDDING_CACHE_MAX_ENTRIES", "200000"))  # Chunk embeddings kept on disk; 0 disables the cache
+EMBEDDING_MAX_INPUT_TOKENS = int(os.getenv("S4_EMBEDDING_MAX_INPUT_TOKENS", "8191"))  # Token limit of a single embedding input
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("S4_EMBEDDING_MAX_BATCH_TOKENS", "300000"))  # Token limit of one embedding request
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("S4_EMBEDDING_MAX_BATCH_SIZE", "2048"))  # Inputs allowed in one embedding request
+EMBEDDING_OVERSIZE = os.getenv("S4_EMBEDDING_OVERSIZE", "split")  # truncate or split (and average) inputs over the token limit
+EMBEDDING_CONCURRENCY = int(os.getenv("S4_EMBEDDING_CONCURRENCY", "8"))  # Embedding requests in flight per API key
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("S4_EMBEDDING_REQUESTS_PER_MINUTE", "3000"))  # Default request limit per API key; 0 for none
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("S4_EMBEDDING_TOKENS_PER_MINUTE", "1000000"))  # Default token limit per API key; 0 for none
+EMBEDDING_MAX_RETRIES = int(os.getenv("S4_EMBEDDING_MAX_RETRIES", "6"))  # Retries of a throttled or failed embedding request
 MAX_CHUNK_SIZE = int(os.getenv("S4_MAX_CHUNK_SIZE", "1000"))
 CHUNK_OVERLAP = int(os.getenv("S4_CHUNK_OVERLAP", "200"))
+CHUNK_TOKENS = int(os.getenv("S4_CHUNK_TOKENS", "256"))  # Maximum tokens per indexed chunk
+CHUNK_OVERLAP_TOKENS = int(os.getenv("S4_CHUNK_OVERLAP_TOKENS", "32"))  # Tokens shared by consecutive chunks
+
+EXTRACTION_WORKERS = int(os.getenv("S4_EXTRACTION_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))  # Text extraction processes; 0 extracts inline
+EXTRACTION_TIMEOUT = float(os.getenv("S4_EXTRACTION_TIMEOUT", "600"))  # Seconds allowed to extract the text of one file
+EXTRACTION_MEMORY_MB = int(os.getenv("S4_EXTRACTION_MEMORY_MB", "2048"))  # Address space limit of each extraction process; 0 for none
+EXTRACTION_PAGES_PER_TASK = int(os.getenv("S4_EXTRACTION_PAGES_PER_TASK", "4"))  # PDF pages extracted per task
 
 # Local storage paths
 APP_DIR = Path(__file__).parent
 DATA_DIR = Path(os.getenv("S4_DATA_DIR", Path.home() / ".s4"))
 TEMP_DIR = DATA_DIR / "temp"
 INDEX_STORAGE_PATH = DATA_DIR / "indices"
+EMBEDDING_CACHE_PATH = DATA_DIR / "embeddings.sqlite"
 TENANT_STORAGE_PATH = DATA_DIR / "tenants"
 
+# Index maintenance settings
+INDEX_COMPACTION_RATIO = float(os.getenv("S4_INDEX_COMPACTION_RATIO", "0.2"))  # Tombstoned share of chunks that triggers compaction
+INDEX_CHECKPOINT_OPS = int(os.getenv("S4_INDEX_CHECKPOINT_OPS", "100"))  # Logged operations between full index writes
+INDEX_CHECKPOINT_INTERVAL = float(os.getenv("S4_INDEX_CHECKPOINT_INTERVAL", "60"))  # Seconds between full index writes
+INDEX_STREAM_BATCH_CHUNKS = int(os.getenv("S4_INDEX_STREAM_BATCH_CHUNKS", "1000"))  # Chunks of a streamed document embedded per batch
+
+# ANN index settings (a threshold of 0 disables that index type)
+INDEX_HNSW_THRESHOLD = int(os.getenv("S4_INDEX_HNSW_THRESHOLD", "50000"))  # Chunks above which an HNSW graph replaces the flat index
+INDEX_IVF_THRESHOLD = int(os.getenv("S4_INDEX_IVF_THRESHOLD", "1000000"))  # Chunks above which an IVF index is used
+INDEX_IVF_NPROBE = int(os.getenv("S4_INDEX_IVF_NPROBE", "16"))  # IVF lists visited per query
+INDEX_IVF_TRAINING_SAMPLES_PER_LIST = int(os.getenv("S4_INDEX_IVF_TRAINING_SAMPLES_PER_LIST", "50"))  # Training vectors per IVF list
+INDEX_HNSW_M = int(os.getenv("S4_INDEX_HNSW_M", "32"))  # HNSW neighbours per node
+INDEX_HNSW_EF_SEARCH = int(os.getenv("S4_INDEX_HNSW_EF_SEARCH", "64"))  # HNSW search beam width
+
+# Vector compression settings
+INDEX_QUANTIZATION = os.getenv("S4_INDEX_QUANTIZATION") or None  # fp16, int8 or pq; unset keeps float32
+INDEX_PQ_SUBVECTOR_DIM = int(os.getenv("S4_INDEX_PQ_SUBVECTOR_DIM", "4"))  # Dimensions per one-byte PQ code (4 = 16x smaller)
+INDEX_RERANK_FACTOR = int(os.getenv("S4_INDEX_RERANK_FACTOR", "4"))  # Candidates per result re-ranked at full precision
+INDEX_HYBRID_CANDIDATES = int(os.getenv("S4_INDEX_HYBRID_CANDIDATES", "50"))  # Results taken from each ranking before hybrid fusion
+INDEX_RRF_K = int(os.getenv("S4_INDEX_RRF_K", "60"))  # Reciprocal rank fusion constant
+
+# Service pool settings
+SERVICE_POOL_SIZE = int(os.getenv("S4_SERVICE_POOL_SIZE", "64"))  # Tenant services kept warm per process
+SERVICE_POOL_MEMORY_MB = int(os.getenv("S4_SERVICE_POOL_MEMORY_MB", "2048"))  # Index memory budget of the pool; 0 disables it
+
 # Multi-tenant settings
 DEFAULT_PLAN_ID = os.getenv("S4_DEFAULT_PLAN_ID", "basic")
 TENANT_ISOLATION_MODE = os.getenv("S4_TENANT_ISOLATION_MODE", "prefix")  # 'bucket', 'prefix'
@@ -77,8 +129,8 @@ def validate_config():
         if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY:
             errors.append("AWS credentials must be set in single-tenant mode")
             
-    # Check OpenAI API key
-    if not OPENAI_API_KEY:
+    # Check OpenAI API key (local embedding models run without one)
+    if not OPENAI_API_KEY and not EMBEDDING_MODEL.startswith("local-"):
         errors.append("OPENAI_API_KEY must be set")
         
     # In multi-tenant mode, check admin API key
@@ -74,6 +74,8 @@ class TenantManager:
         s3_bucket: Optional[str] = None,
         s3_region: Optional[str] = None,
         openai_api_key: Optional[str] = None,
+        openai_requests_per_minute: Optional[int] = None,
+        openai_tokens_per_minute: Optional[int] = None,
         active: bool = True,
         plan_expires_at: Optional[datetime] = None
     ) -> Tenant:
@@ -88,6 +90,8 @@ class TenantManager:
             s3_bucket: Custom S3 bucket (optional)
             s3_region: Custom S3 region (optional)
             openai_api_key: Custom OpenAI API key (optional)
+            openai_requests_per_minute: Request limit of the custom key (optional)
+            openai_tokens_per_minute: Token limit of the custom key (optional)
             active: Whether the tenant is active (default True)
             plan_expires_at: When the plan expires (default 30 days)
             
@@ -115,6 +119,8 @@ class TenantManager:
             s3_bucket=s3_bucket,
             s3_region=s3_region,
             openai_api_key=openai_api_key,
+            openai_requests_per_minute=openai_requests_per_minute,
+            openai_tokens_per_minute=openai_tokens_per_minute,
             active=active,
             plan_expires_at=plan_expires_at
         )
@@ -1,5 +1,47 @@
 """Embedding module for S4."""
 
+from typing import Optional
+
+from s4 import config
+
+from .base import EmbeddingProvider, embedding_key
+from .chunk_cache import EmbeddingCache
+from .local import HashingEmbeddings, create_local_embeddings, is_local_model
 from .openai_embeddings import OpenAIEmbeddings
+from .query_cache import QueryEmbeddingCache
+
+# Shared by every index in the process
+query_cache = QueryEmbeddingCache()
+embedding_cache = EmbeddingCache()
+
+def get_embeddings_provider(
+    model: Optional[str] = None,
+    api_key: Optional[str] = None
+) -> EmbeddingProvider:
+    """Create the embedding provider for a model.
+
+    Models named ``local-*`` are served locally; any other model by OpenAI.
+
+    Args:
+        model: Optional embedding model name; defaults to ``config.EMBEDDING_MODEL``
+        api_key: Optional OpenAI API key
+
+    Returns:
+        The embedding provider
+    """
+    model = model or config.EMBEDDING_MODEL
+    if is_local_model(model):
+        return create_local_embeddings(model)
+    return OpenAIEmbeddings(api_key=api_key, model=model)
 
-__all__ = ["OpenAIEmbeddings"]
+__all__ = [
+    "EmbeddingCache",
+    "EmbeddingProvider",
+    "HashingEmbeddings",
+    "OpenAIEmbeddings",
+    "QueryEmbeddingCache",
+    "embedding_cache",
+    "embedding_key",
+    "get_embeddings_provider",
+    "query_cache",
+]
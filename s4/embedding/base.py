@@ -0,0 +1,80 @@
+"""Embedding provider interface for S4."""
+
+from abc import abstractmethod
+from typing import Any, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+def embedding_key(embeddings: Any) -> str:
+    """Identify the vectors an embedding model produces, for caches keyed by text.
+
+    The key names the provider class, the model and the number of
+    dimensions, so vectors cached for one configuration are never served
+    to another.
+
+    Args:
+        embeddings: Embedding provider, or any LangChain embedding model
+
+    Returns:
+        str: Key of the model's vectors
+    """
+    model = getattr(embeddings, 'model', None)
+    dimension = getattr(embeddings, 'dimension', None) or getattr(embeddings, 'dimensions', None)
+    return f"{type(embeddings).__name__}:{model}:{dimension or 'default'}"
+
+class EmbeddingProvider(Embeddings):
+    """Base class of embedding providers.
+
+    Providers also implement LangChain's ``Embeddings`` interface, so they
+    can be used wherever a LangChain embedding model is expected.
+    """
+
+    model: str
+
+    @abstractmethod
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for a batch of texts.
+
+        Args:
+            texts: List of texts to embed
+
+        Returns:
+            List[List[float]]: List of embedding vectors
+        """
+
+    def embed_text(self, text: str) -> List[float]:
+        """Generate embeddings for a single text.
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            List[float]: Embedding vector
+        """
+        return self.embed_batch([text])[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_batch(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_text(text)
+
+    def similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
+        """Calculate cosine similarity between two embeddings.
+
+        Args:
+            embedding1: First embedding vector
+            embedding2: Second embedding vector
+
+        Returns:
+            float: Cosine similarity score (0-1)
+        """
+        vec1 = np.array(embedding1)
+        vec2 = np.array(embedding2)
+
+        dot_product = np.dot(vec1, vec2)
+        norm1 = np.linalg.norm(vec1)
+        norm2 = np.linalg.norm(vec2)
+
+        return dot_product / (norm1 * norm2)
@@ -0,0 +1,206 @@
+"""Token-aware packing of texts into embedding requests."""
+
+import functools
+import logging
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from s4 import config
+
+logger = logging.getLogger(__name__)
+
+# How oversize texts are handled
+TRUNCATE = "truncate"
+SPLIT = "split"
+
+class _ByteEncoding:
+    """Fallback encoding counting one token per UTF-8 byte.
+
+    BPE tokens are at least one byte long, so this never undercounts.
+    It is used when the tiktoken encoding cannot be loaded, e.g. offline.
+    """
+
+    def encode(self, text: str) -> List[int]:
+        return list(text.encode("utf-8"))
+
+    def decode(self, tokens: List[int]) -> str:
+        return bytes(tokens).decode("utf-8", errors="ignore")
+
+    def decode_tokens_bytes(self, tokens: List[int]) -> List[bytes]:
+        return [bytes((token,)) for token in tokens]
+
+@functools.lru_cache(maxsize=None)
+def load_encoding(model: str) -> Any:
+    """Load the tiktoken encoding of an embedding model.
+
+    Args:
+        model: Embedding model name
+
+    Returns:
+        Encoding with ``encode`` and ``decode`` methods
+    """
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding for {model}, counting bytes instead: {e}")
+        return _ByteEncoding()
+
+class EmbeddingBatch:
+    """Texts packed into one embedding request."""
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.tokens = 0
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+class TokenBatcher:
+    """Packs texts into maximal embedding requests under the model's limits.
+
+    Texts longer than the per-input token limit are either truncated, or
+    split into pieces whose embeddings are averaged (weighted by token
+    count) back into one vector per text. Order is preserved, so the same
+    input always yields the same requests.
+    """
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        max_input_tokens: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+        max_batch_size: Optional[int] = None,
+        oversize: Optional[str] = None,
+        encoding: Optional[Any] = None
+    ):
+        """Initialize the batcher.
+
+        Args:
+            model: Optional embedding model name
+            max_input_tokens: Optional token limit of a single input
+            max_batch_tokens: Optional token limit of a request
+            max_batch_size: Optional number of inputs allowed per request
+            oversize: Optional handling of oversize texts (``"truncate"`` or ``"split"``)
+            encoding: Optional tokenizer; loaded from tiktoken on first use by default
+        """
+        self.model = model or config.EMBEDDING_MODEL
+        self.max_input_tokens = max_input_tokens or config.EMBEDDING_MAX_INPUT_TOKENS
+        self.max_batch_tokens = max_batch_tokens or config.EMBEDDING_MAX_BATCH_TOKENS
+        self.max_batch_size = max_batch_size or config.EMBEDDING_MAX_BATCH_SIZE
+        self.oversize = oversize or config.EMBEDDING_OVERSIZE
+        if self.oversize not in (TRUNCATE, SPLIT):
+            raise ValueError(f"Unknown oversize handling: {self.oversize}")
+        self._encoding = encoding
+
+        # Totals over every request sent through this batcher
+        self.requests = 0
+        self.tokens = 0
+
+    @property
+    def encoding(self) -> Any:
+        if self._encoding is None:
+            self._encoding = load_encoding(self.model)
+        return self._encoding
+
+    def _pieces(self, text: str) -> List[Tuple[str, int]]:
+        """Cut a text into pieces that each fit one input.
+
+        Returns:
+            List of (text, token count) pairs
+        """
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= self.max_input_tokens:
+            return [(text, len(tokens))]
+        if self.oversize == TRUNCATE:
+            starts = [0]
+        else:
+            starts = range(0, len(tokens), self.max_input_tokens)
+        pieces = [tokens[start:start + self.max_input_tokens] for start in starts]
+        return [(self.encoding.decode(piece), len(piece)) for piece in pieces]
+
+    def _pack(self, pieces: List[Tuple[str, int]]) -> List[EmbeddingBatch]:
+        """Greedily fill requests with (text, token count) pieces, in order."""
+        batches = [EmbeddingBatch()]
+        for text, tokens in pieces:
+            batch = batches[-1]
+            if len(batch) and (
+                len(batch) >= self.max_batch_size
+                or batch.tokens + tokens > self.max_batch_tokens
+            ):
+                batch = EmbeddingBatch()
+                batches.append(batch)
+            batch.texts.append(text)
+            batch.tokens += tokens
+        return [batch for batch in batches if len(batch)]
+
+    def pack(self, texts: List[str]) -> List[EmbeddingBatch]:
+        """Pack texts into requests, in order.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            List of batches; oversize texts contribute one input per piece
+        """
+        return self._pack([piece for text in texts for piece in self._pieces(text)])
+
+    def embed(self, texts: List[str], embed_many: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Embed texts with as few requests as the limits allow, one after another.
+
+        Args:
+            texts: Texts to embed
+            embed_many: Callable embedding the texts of one request
+
+        Returns:
+            One embedding per text, in the order of ``texts``
+        """
+        return self._embed(texts, lambda batches: [embed_many(batch.texts) for batch in batches])
+
+    def embed_concurrently(self, texts: List[str], engine: Any) -> List[List[float]]:
+        """Embed texts with as few requests as the limits allow, sent concurrently.
+
+        Args:
+            texts: Texts to embed
+            engine: :class:`~s4.embedding.engine.EmbeddingEngine` sending the requests
+
+        Returns:
+            One embedding per text, in the order of ``texts``
+        """
+        return self._embed(texts, engine.embed_batches)
+
+    def _embed(
+        self,
+        texts: List[str],
+        send_batches: Callable[[List[EmbeddingBatch]], List[List[List[float]]]]
+    ) -> List[List[float]]:
+        """Pack texts, send the requests and map the vectors back to the texts."""
+        pieces = [self._pieces(text) for text in texts]
+        weights = [tokens for text_pieces in pieces for _, tokens in text_pieces]
+
+        batches = self._pack([piece for text_pieces in pieces for piece in text_pieces])
+        for i, batch in enumerate(batches):
+            logger.debug(f"Embedding request {i + 1}/{len(batches)}: {len(batch)} inputs, {batch.tokens} tokens")
+        vectors = [vector for batch_vectors in send_batches(batches) for vector in batch_vectors]
+        self.requests += len(batches)
+        self.tokens += sum(batch.tokens for batch in batches)
+
+        # Average the pieces of split texts back into one vector each
+        embeddings = []
+        start = 0
+        for count in map(len, pieces):
+            if count == 1:
+                embeddings.append(vectors[start])
+            else:
+                combined = np.average(
+                    np.asarray(vectors[start:start + count], dtype=np.float64),
+                    axis=0,
+                    weights=weights[start:start + count]
+                )
+                embeddings.append((combined / np.linalg.norm(combined)).tolist())
+            start += count
+        return embeddings
@@ -0,0 +1,201 @@
+"""Persistent content-addressed cache of chunk embeddings."""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from s4 import config
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """SQLite-backed cache of chunk embeddings shared by all tenants.
+
+    Entries are keyed by ``(model key, sha256(text))``, so identical chunks
+    in re-uploaded files or in other tenants' files are embedded only once.
+    The model key (see :func:`s4.embedding.base.embedding_key`) includes the
+    provider and the number of dimensions. The least recently used entries
+    are evicted once the cache grows past its maximum size.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, max_entries: Optional[int] = None):
+        """Initialize the cache.
+
+        The database is opened on first use.
+
+        Args:
+            path: Optional path of the SQLite file
+            max_entries: Optional maximum number of cached embeddings (0 disables caching)
+        """
+        self.path = Path(path or config.EMBEDDING_CACHE_PATH)
+        self.max_entries = max_entries if max_entries is not None else config.EMBEDDING_CACHE_MAX_ENTRIES
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " digest BLOB NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (model, digest)"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _digest(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Look up cached embeddings.
+
+        Args:
+            model: Embedding model key
+            texts: Chunk texts
+
+        Returns:
+            Dict mapping each cached text to its embedding
+        """
+        if not self.max_entries or not texts:
+            return {}
+
+        digests = {self._digest(text): text for text in texts}
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            conn = self._connect()
+            keys = list(digests)
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT digest, vector FROM embeddings WHERE model = ? "
+                    f"AND digest IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                ).fetchall()
+                for digest, vector in rows:
+                    found[digests[digest]] = np.frombuffer(vector, dtype=np.float32)
+                if rows:
+                    conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND digest = ?",
+                        [(time.time(), model, digest) for digest, _ in rows]
+                    )
+            conn.commit()
+            self.hits += len(found)
+            self.misses += len(digests) - len(found)
+        return found
+
+    def put_many(self, model: str, texts: List[str], vectors: np.ndarray):
+        """Store embeddings, evicting the least recently used entries if full.
+
+        Texts that are already cached keep their vector, which is the same
+        one for the same model key and text. Other processes (e.g. server
+        workers) share the file, so the table is counted after inserting,
+        while the transaction holds SQLite's write lock.
+
+        Args:
+            model: Embedding model key
+            texts: Chunk texts
+            vectors: One embedding per text
+        """
+        if not self.max_entries or not texts:
+            return
+
+        now = time.time()
+        rows = [
+            (model, self._digest(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            conn = self._connect()
+            changes = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            # The table only grows past its bound if something was inserted
+            if conn.total_changes > changes:
+                count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                excess = count - self.max_entries
+                if excess > 0:
+                    conn.execute(
+                        "DELETE FROM embeddings WHERE (model, digest) IN "
+                        "(SELECT model, digest FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (excess,)
+                    )
+            conn.commit()
+
+    def embed(
+        self,
+        model: str,
+        texts: List[str],
+        embed_many: Callable[[List[str]], List[List[float]]]
+    ) -> np.ndarray:
+        """Get embeddings for chunks, calling the model only for uncached texts.
+
+        Args:
+            model: Embedding model key
+            texts: Chunk texts
+            embed_many: Callable embedding a list of texts in one request
+
+        Returns:
+            np.ndarray with one float32 embedding per text
+        """
+        try:
+            vectors = self.get_many(model, texts)
+        except sqlite3.Error as e:
+            # The cache is an optimization, so embedding goes on without it
+            logger.warning(f"Error reading embedding cache: {e}")
+            vectors = {}
+
+        missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+        if missing:
+            computed = np.asarray(embed_many(missing), dtype=np.float32)
+            vectors.update(zip(missing, computed))
+            try:
+                self.put_many(model, missing, computed)
+            except sqlite3.Error as e:
+                logger.warning(f"Error writing embedding cache: {e}")
+
+        return np.stack([vectors[text] for text in texts])
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit and miss counters of the cache.
+
+        Returns:
+            Dictionary with the number of entries, hits and misses
+        """
+        with self._lock:
+            size = 0
+            if self.max_entries:
+                size = self._connect().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            requests = self.hits + self.misses
+            return {
+                'size': size,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0
+            }
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
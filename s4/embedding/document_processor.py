@@ -5,25 +5,23 @@ import logging
 import os
 from typing import Dict, List, Optional, Union, BinaryIO, Tuple
 
-import docx
-import PyPDF2
-from PIL import Image
-import pytesseract
-
-from s4.embedding.openai_embeddings import OpenAIEmbeddings
+from s4.embedding import get_embeddings_provider
+from s4.embedding.base import EmbeddingProvider
+from s4.exceptions import ProcessingError
+from s4.indexer.extraction import extract_docx, extraction_pool, ocr_image
 
 logger = logging.getLogger(__name__)
 
 class DocumentProcessor:
     """Document processor for extracting text and generating embeddings."""
     
-    def __init__(self, embeddings_provider: Optional[OpenAIEmbeddings] = None):
+    def __init__(self, embeddings_provider: Optional[EmbeddingProvider] = None):
         """Initialize document processor.
         
         Args:
             embeddings_provider: Optional embeddings provider
         """
-        self.embeddings_provider = embeddings_provider or OpenAIEmbeddings()
+        self.embeddings_provider = embeddings_provider or get_embeddings_provider()
         
     def process_document(
         self, 
@@ -82,12 +80,9 @@ class DocumentProcessor:
         Returns:
             str: Extracted text
         """
-        if not isinstance(file_content, io.BytesIO):
-            if isinstance(file_content, bytes):
-                file_content = io.BytesIO(file_content)
-            else:
-                file_content = io.BytesIO(file_content.read())
-                file_content.seek(0)
+        # File objects are read in place; spooling for workers reuses files on disk
+        if isinstance(file_content, bytes):
+            file_content = io.BytesIO(file_content)
                 
         if content_type == 'application/pdf':
             return self._extract_text_from_pdf(file_content)
@@ -101,7 +96,7 @@ class DocumentProcessor:
             logger.warning(f"Unsupported content type: {content_type}")
             return ""
             
-    def _extract_text_from_pdf(self, file_content: io.BytesIO) -> str:
+    def _extract_text_from_pdf(self, file_content: BinaryIO) -> str:
         """Extract text from a PDF file.
         
         Args:
@@ -111,16 +106,16 @@ class DocumentProcessor:
             str: Extracted text
         """
         try:
-            reader = PyPDF2.PdfReader(file_content)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            # Pages are extracted, or OCRed if scanned, in parallel worker processes
+            with extraction_pool.spooled(file_content, suffix=".pdf") as path:
+                return "".join(text + "\n" for text in extraction_pool.iter_pdf_pages(path))
+        except ProcessingError:
+            raise
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {e}")
             return ""
             
-    def _extract_text_from_docx(self, file_content: io.BytesIO) -> str:
+    def _extract_text_from_docx(self, file_content: BinaryIO) -> str:
         """Extract text from a DOCX file.
         
         Args:
@@ -130,16 +125,15 @@ class DocumentProcessor:
             str: Extracted text
         """
         try:
-            doc = docx.Document(file_content)
-            text = ""
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-            return text
+            with extraction_pool.spooled(file_content, suffix=".docx") as path:
+                return extraction_pool.run(extract_docx, path)
+        except ProcessingError:
+            raise
         except Exception as e:
             logger.error(f"Error extracting text from DOCX: {e}")
             return ""
             
-    def _extract_text_from_image(self, file_content: io.BytesIO) -> str:
+    def _extract_text_from_image(self, file_content: BinaryIO) -> str:
         """Extract text from an image using OCR.
         
         Args:
@@ -149,9 +143,11 @@ class DocumentProcessor:
             str: Extracted text
         """
         try:
-            image = Image.open(file_content)
-            text = pytesseract.image_to_string(image)
-            return text
+            # OCR is CPU-bound, so it runs in an extraction worker
+            with extraction_pool.spooled(file_content) as path:
+                return extraction_pool.run(ocr_image, path)
+        except ProcessingError:
+            raise
         except Exception as e:
             logger.error(f"Error extracting text from image: {e}")
             return ""
@@ -0,0 +1,246 @@
+"""Concurrent, rate-limited embedding engine."""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import openai
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from s4 import config
+from s4.embedding.batching import EmbeddingBatch
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: throttling, timeouts and server-side failures
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate.
+
+    Buckets are only used from the engine's event loop, so they need no lock.
+    """
+
+    def __init__(self, per_minute: int):
+        """Initialize the bucket.
+
+        Args:
+            per_minute: Capacity refilled every minute (0 for no limit)
+        """
+        self.per_minute = per_minute
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.per_minute, self.available + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    async def acquire(self, amount: int = 1):
+        """Wait until ``amount`` units are available and take them.
+
+        Args:
+            amount: Units to take; capped at the bucket's capacity
+        """
+        if not self.per_minute:
+            return
+        amount = min(amount, self.per_minute)
+        while True:
+            self._refill()
+            if self.available >= amount:
+                self.available -= amount
+                return
+            await asyncio.sleep((amount - self.available) * 60 / self.per_minute)
+
+class RateLimiter:
+    """Request, token and concurrency limits of one API key."""
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ):
+        """Initialize the limiter.
+
+        Args:
+            requests_per_minute: Optional request limit (0 for none)
+            tokens_per_minute: Optional token limit (0 for none)
+            concurrency: Optional number of requests in flight at once
+        """
+        self.requests = TokenBucket(
+            requests_per_minute if requests_per_minute is not None else config.EMBEDDING_REQUESTS_PER_MINUTE
+        )
+        self.tokens = TokenBucket(
+            tokens_per_minute if tokens_per_minute is not None else config.EMBEDDING_TOKENS_PER_MINUTE
+        )
+        self.concurrency = concurrency or config.EMBEDDING_CONCURRENCY
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily inside the engine's event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def acquire(self, tokens: int):
+        """Wait until a request of ``tokens`` tokens may be sent.
+
+        Args:
+            tokens: Tokens the request will consume
+        """
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(
+    api_key: Optional[str] = None,
+    requests_per_minute: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None
+) -> RateLimiter:
+    """Get the shared rate limiter of an API key.
+
+    Every client using the same key shares one limiter, since the
+    provider enforces limits per key. Limits passed for a key replace its
+    current ones, e.g. when a tenant brings its own key and quota.
+
+    Args:
+        api_key: OpenAI API key, or None for the default key
+        requests_per_minute: Optional request limit of the key
+        tokens_per_minute: Optional token limit of the key
+
+    Returns:
+        The key's rate limiter
+    """
+    key = hashlib.sha256((api_key or config.OPENAI_API_KEY or "").encode("utf-8")).hexdigest()
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(requests_per_minute, tokens_per_minute)
+        else:
+            if requests_per_minute is not None and requests_per_minute != limiter.requests.per_minute:
+                limiter.requests = TokenBucket(requests_per_minute)
+            if tokens_per_minute is not None and tokens_per_minute != limiter.tokens.per_minute:
+                limiter.tokens = TokenBucket(tokens_per_minute)
+        return limiter
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Get the delay in seconds requested by a response's Retry-After headers."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+_backoff = wait_random_exponential(multiplier=0.5, max=60)
+
+def _wait(retry_state: Any) -> float:
+    """Honour Retry-After if the server sent one, else back off with jitter."""
+    delay = _retry_after(retry_state.outcome.exception())
+    return delay if delay is not None else _backoff(retry_state)
+
+class _EventLoopThread:
+    """Event loop running in a daemon thread, shared by all engines.
+
+    Synchronous callers (including code already running inside another
+    event loop) submit coroutines to it and wait for the result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def run(self, coroutine: Awaitable) -> Any:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="s4-embedding-engine", daemon=True
+                ).start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+_event_loop = _EventLoopThread()
+
+class EmbeddingEngine:
+    """Sends packed embedding requests concurrently under an API key's limits.
+
+    Requests wait for the key's request and token buckets, at most
+    ``concurrency`` of them are in flight, and throttled or failed requests
+    are retried with jittered exponential backoff, honouring Retry-After.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[List[str]], Awaitable[List[List[float]]]],
+        api_key: Optional[str] = None,
+        max_retries: Optional[int] = None
+    ):
+        """Initialize the engine.
+
+        Args:
+            send: Coroutine function embedding the texts of one request
+            api_key: Optional API key whose rate limiter to use
+            max_retries: Optional number of retries of a failed request
+        """
+        self.send = send
+        self.api_key = api_key
+        self.max_retries = max_retries if max_retries is not None else config.EMBEDDING_MAX_RETRIES
+
+    @property
+    def limiter(self) -> RateLimiter:
+        return get_rate_limiter(self.api_key)
+
+    async def _send_batch(self, batch: EmbeddingBatch) -> List[List[float]]:
+        limiter = self.limiter
+        async with limiter.semaphore:
+            async for attempt in AsyncRetrying(
+                retry=retry_if_exception(lambda e: isinstance(e, _RETRYABLE_ERRORS)),
+                wait=_wait,
+                stop=stop_after_attempt(self.max_retries + 1),
+                before_sleep=lambda state: logger.warning(
+                    f"Embedding request failed ({state.outcome.exception()}), "
+                    f"retry {state.attempt_number}/{self.max_retries}"
+                ),
+                reraise=True
+            ):
+                with attempt:
+                    await limiter.acquire(batch.tokens)
+                    return await self.send(batch.texts)
+
+    async def embed_batches_async(self, batches: List[EmbeddingBatch]) -> List[List[List[float]]]:
+        """Embed packed requests concurrently.
+
+        Args:
+            batches: Requests from :meth:`TokenBatcher.pack`
+
+        Returns:
+            The embeddings of each request, in order
+        """
+        return list(await asyncio.gather(*(self._send_batch(batch) for batch in batches)))
+
+    def embed_batches(self, batches: List[EmbeddingBatch]) -> List[List[List[float]]]:
+        """Embed packed requests concurrently, blocking until all are done.
+
+        Args:
+            batches: Requests from :meth:`TokenBatcher.pack`
+
+        Returns:
+            The embeddings of each request, in order
+        """
+        return _event_loop.run(self.embed_batches_async(batches))
@@ -0,0 +1,110 @@
+"""Local embedding providers that run without network access."""
+
+import logging
+import re
+import zlib
+from collections import Counter
+from typing import List, Optional
+
+import numpy as np
+
+from s4 import config
+from s4.embedding.base import EmbeddingProvider
+
+logger = logging.getLogger(__name__)
+
+# Embedding model names starting with this prefix are served locally
+LOCAL_MODEL_PREFIX = "local-"
+
+_WORD_RE = re.compile(r"\w+")
+
+def is_local_model(model: Optional[str]) -> bool:
+    """Check whether an embedding model name refers to a local provider.
+
+    Args:
+        model: Embedding model name
+
+    Returns:
+        bool: True if the model is served locally
+    """
+    return bool(model) and model.startswith(LOCAL_MODEL_PREFIX)
+
+class HashingEmbeddings(EmbeddingProvider):
+    """Deterministic embeddings from hashed word and character n-grams.
+
+    Words, word bigrams and character trigrams are hashed into a fixed
+    number of signed buckets, weighted by log term frequency and
+    L2-normalized. Texts sharing vocabulary end up close together, which
+    is enough for offline deployments, tests and benchmarks, at no API
+    cost and microseconds per text.
+    """
+
+    def __init__(self, model: Optional[str] = None, dimension: Optional[int] = None):
+        """Initialize hashing embeddings.
+
+        Args:
+            model: Optional model name, used as the cache key of its vectors
+            dimension: Optional number of dimensions
+        """
+        self.model = model or "local-hash"
+        self.dimension = dimension or config.LOCAL_EMBEDDING_DIMENSION
+
+    def _features(self, text: str) -> Counter:
+        words = _WORD_RE.findall(text.lower())
+        features = Counter(f"w:{word}" for word in words)
+        features.update(f"b:{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"#{word}#"
+            features.update(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def _embed(self, text: str) -> List[float]:
+        features = self._features(text)
+        if not features:
+            return [0.0] * self.dimension
+
+        hashes = np.fromiter(
+            (zlib.crc32(feature.encode("utf-8")) for feature in features),
+            dtype=np.uint64, count=len(features)
+        )
+        counts = np.fromiter(features.values(), dtype=np.float64, count=len(features))
+        signs = np.where(hashes >> np.uint64(31) & np.uint64(1), -1.0, 1.0)
+        vector = np.bincount(
+            (hashes % np.uint64(self.dimension)).astype(np.int64),
+            weights=signs * np.log1p(counts),
+            minlength=self.dimension
+        )
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for a batch of texts.
+
+        Args:
+            texts: List of texts to embed
+
+        Returns:
+            List[List[float]]: List of embedding vectors
+        """
+        return [self._embed(text) for text in texts]
+
+# Local providers by model name
+LOCAL_MODELS = {
+    "local-hash": HashingEmbeddings,
+}
+
+def create_local_embeddings(model: str) -> EmbeddingProvider:
+    """Create the local provider serving an embedding model.
+
+    Args:
+        model: Local embedding model name
+
+    Returns:
+        The embedding provider
+    """
+    try:
+        provider = LOCAL_MODELS[model]
+    except KeyError:
+        raise ValueError(f"Unknown local embedding model: {model}")
+    logger.info(f"Initialized local embeddings with model: {model}")
+    return provider(model=model)
@@ -5,13 +5,16 @@ import os
 from typing import List, Dict, Any, Optional, Union
 
 import openai
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 from s4 import config
+from s4.embedding.base import EmbeddingProvider
+from s4.embedding.batching import TokenBatcher
+from s4.embedding.engine import EmbeddingEngine
 
 logger = logging.getLogger(__name__)
 
-class OpenAIEmbeddings:
+class OpenAIEmbeddings(EmbeddingProvider):
     """OpenAI embeddings implementation."""
     
     def __init__(
@@ -31,7 +34,10 @@ class OpenAIEmbeddings:
         if not self.api_key:
             raise ValueError("OpenAI API key is required")
             
-        self.client = OpenAI(api_key=self.api_key)
+        # Retries are handled by the engine, which honours Retry-After
+        self.async_client = AsyncOpenAI(api_key=self.api_key, max_retries=0)
+        self.batcher = TokenBatcher(model=self.model)
+        self.engine = EmbeddingEngine(self._create_embeddings, api_key=self.api_key)
         logger.info(f"Initialized OpenAI embeddings with model: {self.model}")
         
     def embed_text(self, text: str) -> List[float]:
@@ -44,11 +50,7 @@ class OpenAIEmbeddings:
             List[float]: Embedding vector
         """
         try:
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=text
-            )
-            return response.data[0].embedding
+            return self.batcher.embed_concurrently([text], self.engine)[0]
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
             raise
@@ -56,6 +58,10 @@ class OpenAIEmbeddings:
     def embed_batch(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for a batch of texts.
         
+        The texts are packed into as few requests as the model's token and
+        input limits allow, which are sent concurrently within the API key's
+        rate limits.
+        
         Args:
             texts: List of texts to embed
             
@@ -63,32 +69,15 @@ class OpenAIEmbeddings:
             List[List[float]]: List of embedding vectors
         """
         try:
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=texts
-            )
-            return [item.embedding for item in response.data]
+            return self.batcher.embed_concurrently(texts, self.engine)
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {e}")
             raise
             
-    def similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
-        """Calculate cosine similarity between two embeddings.
-        
-        Args:
-            embedding1: First embedding vector
-            embedding2: Second embedding vector
-            
-        Returns:
-            float: Cosine similarity score (0-1)
-        """
-        import numpy as np
-        
-        vec1 = np.array(embedding1)
-        vec2 = np.array(embedding2)
-        
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        
-        return dot_product / (norm1 * norm2)
+    async def _create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Send one embedding request."""
+        response = await self.async_client.embeddings.create(
+            model=self.model,
+            input=texts
+        )
+        return [item.embedding for item in response.data]
@@ -0,0 +1,173 @@
+"""Process-wide cache of query embeddings."""
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from s4 import config
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_query(text: str) -> str:
+    """Normalize query text for use as a cache key.
+
+    Unicode forms and whitespace are normalized. Case is kept, since
+    embeddings are case-sensitive.
+
+    Args:
+        text: Query text
+
+    Returns:
+        Normalized query text
+    """
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query vectors with a time to live.
+
+    Entries are keyed by embedding model key and normalized query text.
+    The model key (see :func:`s4.embedding.base.embedding_key`) includes the
+    provider and the number of dimensions, so a vector is never served to
+    a differently configured model. Concurrent requests for a query that is
+    not cached yet wait for a single embedding call instead of each making
+    their own.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        """Initialize the cache.
+
+        Args:
+            max_size: Optional maximum number of cached queries (0 disables caching)
+            ttl: Optional lifetime of an entry in seconds (0 for no expiry)
+        """
+        self.max_size = max_size if max_size is not None else config.QUERY_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else config.QUERY_CACHE_TTL
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[List[float], float]]" = OrderedDict()
+        self._pending: Dict[Tuple[str, str], Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, model: str, text: str, embed: Callable[[str], List[float]]) -> List[float]:
+        """Get the embedding of a query, computing it on a miss.
+
+        Args:
+            model: Embedding model key
+            text: Query text
+            embed: Callable embedding a single text
+
+        Returns:
+            The query embedding
+        """
+        return self.get_many(model, [text], lambda texts: [embed(t) for t in texts])[0]
+
+    def get_many(
+        self,
+        model: str,
+        texts: List[str],
+        embed_many: Callable[[List[str]], List[List[float]]]
+    ) -> List[List[float]]:
+        """Get the embeddings of several queries, computing the misses in one call.
+
+        Args:
+            model: Embedding model key
+            texts: Query texts
+            embed_many: Callable embedding a list of texts in one request
+
+        Returns:
+            One embedding per query, in the order of ``texts``
+        """
+        if not self.max_size:
+            return embed_many(texts)
+
+        keys = [(model, normalize_query(text)) for text in texts]
+        vectors: Dict[Tuple[str, str], List[float]] = {}
+        waiting: Dict[Tuple[str, str], Future] = {}
+        owned: Dict[Tuple[str, str], Future] = {}
+        now = time.monotonic()
+
+        with self._lock:
+            for key in keys:
+                if key in vectors or key in waiting or key in owned:
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None and (not self.ttl or entry[1] > now):
+                    self._entries.move_to_end(key)
+                    vectors[key] = entry[0]
+                    self.hits += 1
+                    continue
+                if entry is not None:
+                    del self._entries[key]
+
+                pending = self._pending.get(key)
+                if pending is not None:
+                    waiting[key] = pending
+                    self.coalesced += 1
+                else:
+                    owned[key] = self._pending[key] = Future()
+                    self.misses += 1
+
+        if owned:
+            misses = list(owned)
+            try:
+                computed = embed_many([key[1] for key in misses])
+            except BaseException as e:
+                with self._lock:
+                    for key in misses:
+                        del self._pending[key]
+                for future in owned.values():
+                    future.set_exception(e)
+                raise
+
+            expires = time.monotonic() + self.ttl
+            with self._lock:
+                for key, vector in zip(misses, computed):
+                    del self._pending[key]
+                    self._entries[key] = (vector, expires)
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            for key, vector in zip(misses, computed):
+                owned[key].set_result(vector)
+                vectors[key] = vector
+
+        for key, pending in waiting.items():
+            vectors[key] = pending.result()
+
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit-rate metrics of the cache.
+
+        Returns:
+            Dictionary with counts of hits, misses and coalesced requests
+        """
+        with self._lock:
+            requests = self.hits + self.misses + self.coalesced
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': (self.hits + self.coalesced) / requests if requests else 0.0
+            }
+
+    def clear(self):
+        """Drop all cached queries and reset the metrics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -3,99 +3,305 @@
 import logging
 import os
 import json
-from typing import Dict, List, Optional, Union, Any
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
 
 import numpy as np
 
-from s4.embedding.openai_embeddings import OpenAIEmbeddings
+from s4.embedding import embedding_cache, get_embeddings_provider, query_cache
+from s4.embedding.base import EmbeddingProvider, embedding_key
+from s4.indexer.vector_store import VectorStore
 from s4 import config
 
 logger = logging.getLogger(__name__)
 
+# Superseded log entries tolerated before the files are rewritten
+COMPACTION_MIN_DEAD = 1000
+
 class SearchIndex:
-    """Search index for S4."""
-    
+    """Search index for S4.
+
+    The index is kept in append-only files sharing the index path's prefix:
+
+    - ``<prefix>.vec*``: unit-normalized embeddings in a :class:`VectorStore`, keyed by slot
+    - ``<prefix>.<generation>.text``: concatenated UTF-8 document texts
+    - ``<prefix>.<generation>.log``: JSON lines adding a document (slot, text
+      offset and length, metadata) or removing one
+    - ``<prefix>.manifest.json``: current generation and committed file lengths
+
+    Writes are appended and flushed before the manifest is atomically
+    replaced, so a crash leaves at most an ignored tail. Loading replays
+    the log and memory-maps the vectors; texts are read only for results.
+    """
+
     def __init__(
         self,
-        embeddings_provider: Optional[OpenAIEmbeddings] = None,
+        embeddings_provider: Optional[EmbeddingProvider] = None,
         index_path: Optional[str] = None
     ):
         """Initialize search index.
-        
+
         Args:
-            embeddings_provider: Optional embeddings provider
+            embeddings_provider: Optional embeddings provider; defaults to the configured model
             index_path: Optional path to store the index
         """
-        self.embeddings_provider = embeddings_provider or OpenAIEmbeddings()
+        self.embeddings_provider = embeddings_provider or get_embeddings_provider()
         self.index_path = index_path or os.path.join(config.DATA_DIR, "search_index.json")
-        self.index = self._load_index()
-        
-    def _load_index(self) -> Dict:
-        """Load the search index from disk.
-        
-        Returns:
-            Dict: The search index
-        """
-        if os.path.exists(self.index_path):
+        self.path_prefix = os.path.splitext(self.index_path)[0]
+        self.manifest_path = Path(f"{self.path_prefix}.manifest.json")
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+
+        self.vector_store = VectorStore(self.path_prefix)
+        self._generation = 0
+        self._text_bytes = 0
+        self._log_bytes = 0
+        # Log entries that no longer describe a live document
+        self._dead = 0
+
+        # Live documents: ID -> {slot, offset, length, metadata}
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        # Vector store rows of the live documents, rebuilt after mutations
+        self._live_rows: Optional[np.ndarray] = None
+        self._live_ids: List[str] = []
+
+        self._load_index()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._documents
+
+    def _path(self, generation: int, suffix: str) -> Path:
+        return Path(f"{self.path_prefix}.{generation}.{suffix}")
+
+    def _load_index(self):
+        """Load the search index from disk, migrating a legacy JSON index."""
+        if not self.manifest_path.exists():
+            if os.path.exists(self.index_path):
+                self._migrate_json_index()
+            return
+
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            self._generation = manifest['generation']
+            self._text_bytes = manifest['text_bytes']
+            self._log_bytes = manifest['log_bytes']
+
+            # Drop bytes from a write that never reached the manifest
+            for suffix, size in (('text', self._text_bytes), ('log', self._log_bytes)):
+                path = self._path(self._generation, suffix)
+                if path.exists() and path.stat().st_size > size:
+                    with open(path, 'r+b') as f:
+                        f.truncate(size)
+
+            with open(self._path(self._generation, 'log'), 'rb') as f:
+                log = f.read(self._log_bytes)
+            for line in log.splitlines():
+                self._apply(json.loads(line))
+        except Exception as e:
+            logger.error(f"Error loading search index: {e}")
+
+    def _migrate_json_index(self):
+        """Move an index saved as a single JSON file into the append-only files."""
+        try:
+            with open(self.index_path, 'r') as f:
+                documents = json.load(f).get("documents", {})
+            self._append_documents([
+                (doc_id, doc["text"], doc["metadata"], doc["embedding"])
+                for doc_id, doc in documents.items()
+            ])
+            logger.info(f"Migrated {len(documents)} documents from {self.index_path}")
+        except Exception as e:
+            logger.error(f"Error loading search index: {e}")
+
+    def _apply(self, record: Dict[str, Any]):
+        """Apply one log record to the in-memory document table."""
+        if record['id'] in self._documents:
+            self._dead += 1
+        if record['op'] == 'add':
+            self._documents[record['id']] = {
+                'slot': record['slot'],
+                'offset': record['offset'],
+                'length': record['length'],
+                'metadata': record['metadata']
+            }
+        else:
+            self._documents.pop(record['id'], None)
+            self._dead += 1
+        self._live_rows = None
+
+    def _write_manifest(self, generation: int, text_bytes: int, log_bytes: int):
+        """Atomically record the generation and committed file lengths."""
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'generation': generation,
+                'text_bytes': text_bytes,
+                'log_bytes': log_bytes
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def _append(self, suffix: str, data: bytes) -> int:
+        """Append bytes to a file of the current generation and flush them."""
+        with open(self._path(self._generation, suffix), 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return len(data)
+
+    def _commit(self, records: List[Dict[str, Any]]):
+        """Log records, commit them in the manifest and apply them."""
+        self._log_bytes += self._append('log', b"".join(
+            json.dumps(record).encode('utf-8') + b"\n" for record in records
+        ))
+        self._write_manifest(self._generation, self._text_bytes, self._log_bytes)
+        for record in records:
+            self._apply(record)
+        self._maybe_compact()
+
+    def _append_documents(self, documents: List[Tuple[str, str, Dict[str, Any], Any]]):
+        """Store (ID, text, metadata, embedding) tuples, replacing existing IDs."""
+        if not documents:
+            return
+
+        vectors = np.asarray([embedding for _, _, _, embedding in documents], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+        first_slot = self.vector_store.next_id
+        self.vector_store.append(range(first_slot, first_slot + len(documents)), vectors)
+
+        texts = []
+        records = []
+        offset = self._text_bytes
+        for slot, (doc_id, text, metadata, _) in enumerate(documents, first_slot):
+            encoded = text.encode('utf-8')
+            texts.append(encoded)
+            records.append({
+                'op': 'add',
+                'id': doc_id,
+                'slot': slot,
+                'offset': offset,
+                'length': len(encoded),
+                'metadata': metadata
+            })
+            offset += len(encoded)
+        self._text_bytes += self._append('text', b"".join(texts))
+        self._commit(records)
+
+    def _read_texts(self, doc_ids: List[str]) -> List[str]:
+        """Read documents' texts from the text file."""
+        texts = []
+        with open(self._path(self._generation, 'text'), 'rb') as f:
+            for doc_id in doc_ids:
+                doc = self._documents[doc_id]
+                f.seek(doc['offset'])
+                texts.append(f.read(doc['length']).decode('utf-8'))
+        return texts
+
+    def _maybe_compact(self):
+        if self._dead >= COMPACTION_MIN_DEAD and self._dead > len(self._documents):
             try:
-                with open(self.index_path, 'r') as f:
-                    return json.load(f)
+                self.compact()
             except Exception as e:
-                logger.error(f"Error loading search index: {e}")
-                return {"documents": {}}
-        else:
-            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
-            return {"documents": {}}
-            
-    def _save_index(self):
-        """Save the search index to disk."""
+                # The current generation is untouched, so compaction can wait for the next write
+                logger.error(f"Error compacting search index: {e}")
+
+    def _write_file(self, path: Path, data: bytes):
+        """Write a file under a temporary name, then move it into place."""
+        tmp_path = path.with_name(path.name + ".tmp")
         try:
-            with open(self.index_path, 'w') as f:
-                json.dump(self.index, f)
-        except Exception as e:
-            logger.error(f"Error saving search index: {e}")
-            
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def compact(self):
+        """Rewrite the index files with only the live documents.
+
+        The documents are written to a new generation, and the manifest is
+        switched to it last. The index keeps using the current generation
+        until that succeeds, so a failure or crash part way leaves the
+        index as it was.
+
+        Raises:
+            OSError: If the new generation cannot be written
+        """
+        doc_ids = list(self._documents)
+        texts = [text.encode('utf-8') for text in self._read_texts(doc_ids)]
+        documents = {}
+        offset = 0
+        for doc_id, text in zip(doc_ids, texts):
+            documents[doc_id] = dict(self._documents[doc_id], offset=offset)
+            offset += len(text)
+        log = b"".join(
+            json.dumps(dict(doc, op='add', id=doc_id)).encode('utf-8') + b"\n"
+            for doc_id, doc in documents.items()
+        )
+
+        generation = self._generation + 1
+        try:
+            self._write_file(self._path(generation, 'text'), b"".join(texts))
+            self._write_file(self._path(generation, 'log'), log)
+            self._write_manifest(generation, offset, len(log))
+        except Exception:
+            for suffix in ('text', 'log'):
+                self._path(generation, suffix).unlink(missing_ok=True)
+            raise
+
+        old_generation = self._generation
+        self._generation = generation
+        self._text_bytes = offset
+        self._log_bytes = len(log)
+        self._documents = documents
+        self._dead = 0
+        self._live_rows = None
+        for suffix in ('text', 'log'):
+            self._path(old_generation, suffix).unlink(missing_ok=True)
+        self.vector_store.retain(doc['slot'] for doc in documents.values())
+        logger.info(f"Compacted search index to {len(documents)} documents")
+
     def add_document(self, doc_id: str, text: str, metadata: Dict[str, Any]) -> bool:
         """Add a document to the search index.
-        
+
         Args:
             doc_id: Document ID
             text: Document text
             metadata: Document metadata
-            
+
         Returns:
             bool: True if successful
         """
         try:
-            embedding = self.embeddings_provider.embed_text(text)
-            
-            self.index["documents"][doc_id] = {
-                "text": text,
-                "embedding": embedding,
-                "metadata": metadata
-            }
-            
-            self._save_index()
-            
+            embedding = embedding_cache.embed(
+                embedding_key(self.embeddings_provider), [text], self.embeddings_provider.embed_batch
+            )[0]
+            self._append_documents([(doc_id, text, metadata, embedding)])
+
             logger.info(f"Added document {doc_id} to search index")
             return True
         except Exception as e:
             logger.error(f"Error adding document to search index: {e}")
             return False
-            
+
     def remove_document(self, doc_id: str) -> bool:
         """Remove a document from the search index.
-        
+
         Args:
             doc_id: Document ID
-            
+
         Returns:
             bool: True if successful
         """
-        if doc_id in self.index["documents"]:
+        if doc_id in self._documents:
             try:
-                del self.index["documents"][doc_id]
-                self._save_index()
+                self._commit([{'op': 'remove', 'id': doc_id}])
                 logger.info(f"Removed document {doc_id} from search index")
                 return True
             except Exception as e:
@@ -104,59 +310,66 @@ class SearchIndex:
         else:
             logger.warning(f"Document {doc_id} not found in search index")
             return False
-            
+
+    def _live(self) -> Tuple[np.ndarray, List[str]]:
+        """Get the vector store rows and IDs of the live documents."""
+        if self._live_rows is None:
+            self._live_ids = list(self._documents)
+            slots = np.fromiter(
+                (self._documents[doc_id]['slot'] for doc_id in self._live_ids),
+                dtype=np.int64, count=len(self._live_ids)
+            )
+            order = np.argsort(self.vector_store.ids)
+            self._live_rows = order[np.searchsorted(self.vector_store.ids, slots, sorter=order)]
+        return self._live_rows, self._live_ids
+
     def search(
-        self, 
-        query: str, 
-        limit: int = 10, 
+        self,
+        query: str,
+        limit: int = 10,
         threshold: float = 0.7
     ) -> List[Dict]:
         """Search the index for documents matching the query.
-        
+
+        All documents are scored by one matrix-vector product against the
+        pre-normalized embeddings, and only the top ``limit`` are sorted.
+
         Args:
             query: Search query
             limit: Maximum number of results
             threshold: Minimum similarity threshold
-            
+
         Returns:
             List[Dict]: Search results
         """
         try:
-            query_embedding = self.embeddings_provider.embed_text(query)
-            
-            results = []
-            for doc_id, doc in self.index["documents"].items():
-                similarity = self._calculate_similarity(query_embedding, doc["embedding"])
-                if similarity >= threshold:
-                    results.append({
-                        "id": doc_id,
-                        "text": doc["text"],
-                        "metadata": doc["metadata"],
-                        "score": similarity
-                    })
-                    
-            results.sort(key=lambda x: x["score"], reverse=True)
-            
-            return results[:limit]
+            query_embedding = query_cache.get(
+                embedding_key(self.embeddings_provider), query, self.embeddings_provider.embed_text
+            )
+
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query_vector)
+            if not self._documents or not norm or limit <= 0:
+                return []
+
+            rows, ids = self._live()
+            scores = (self.vector_store.vectors @ (query_vector / norm))[rows]
+            candidates = np.flatnonzero(scores >= threshold)
+            if len(candidates) > limit:
+                candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+            candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+            doc_ids = [ids[i] for i in candidates]
+            texts = self._read_texts(doc_ids)
+            return [
+                {
+                    "id": doc_id,
+                    "text": text,
+                    "metadata": self._documents[doc_id]['metadata'],
+                    "score": float(scores[i])
+                }
+                for i, doc_id, text in zip(candidates, doc_ids, texts)
+            ]
         except Exception as e:
             logger.error(f"Error searching index: {e}")
             return []
-            
-    def _calculate_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
-        """Calculate cosine similarity between two embeddings.
-        
-        Args:
-            embedding1: First embedding
-            embedding2: Second embedding
-            
-        Returns:
-            float: Similarity score
-        """
-        vec1 = np.array(embedding1)
-        vec2 = np.array(embedding2)
-        
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        
-        return dot_product / (norm1 * norm2)
@@ -1,6 +1,8 @@
 """Indexer module for S4."""
 
+from s4.indexer.chunker import Chunk, TokenChunker
 from s4.indexer.document_processor import DocumentProcessor
+from s4.indexer.extraction import ExtractionPool, extraction_pool
 from s4.indexer.index import DocumentIndex
 
-__all__ = ['DocumentProcessor', 'DocumentIndex'] 
\ No newline at end of file
+__all__ = ['Chunk', 'DocumentProcessor', 'DocumentIndex', 'ExtractionPool', 'TokenChunker', 'extraction_pool'] 
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""FAISS index selection, quantization and search parameters for S4 indices."""
+
+import logging
+import math
+from typing import Any, Optional
+
+import faiss
+import numpy as np
+
+from s4 import config
+
+logger = logging.getLogger(__name__)
+
+FLAT = "flat"
+IVF = "ivf"
+HNSW = "hnsw"
+
+FP16 = "fp16"
+INT8 = "int8"
+PQ = "pq"
+QUANTIZATIONS = (FP16, INT8, PQ)
+
+_SQ_TYPES = {
+    FP16: faiss.ScalarQuantizer.QT_fp16,
+    INT8: faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Each PQ sub-quantizer has 2**8 centroids and needs at least that many training vectors
+_PQ_MIN_VECTORS = 256
+
+def select_index_type(num_vectors: int) -> str:
+    """Choose the FAISS index type for a corpus of the given size.
+
+    Small corpora stay on an exact flat index. Past the configured
+    thresholds an HNSW graph and then an IVF index are used. A threshold
+    of 0 disables that index type.
+
+    Args:
+        num_vectors: Number of live vectors in the index
+
+    Returns:
+        str: One of ``"flat"``, ``"hnsw"`` or ``"ivf"``
+    """
+    if config.INDEX_IVF_THRESHOLD and num_vectors >= config.INDEX_IVF_THRESHOLD:
+        return IVF
+    if config.INDEX_HNSW_THRESHOLD and num_vectors >= config.INDEX_HNSW_THRESHOLD:
+        return HNSW
+    return FLAT
+
+def get_index_type(index: Any) -> str:
+    """Get the type of an existing FAISS index.
+
+    Args:
+        index: FAISS index
+
+    Returns:
+        str: One of ``"flat"``, ``"hnsw"`` or ``"ivf"``
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        return IVF
+    if isinstance(index, faiss.IndexHNSW):
+        return HNSW
+    return FLAT
+
+def get_quantization(index: Any) -> Optional[str]:
+    """Get the vector encoding of an existing FAISS index.
+
+    Args:
+        index: FAISS index
+
+    Returns:
+        str: One of ``"fp16"``, ``"int8"`` or ``"pq"``, or None for float32
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return FP16 if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else INT8
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return PQ
+    return None
+
+def effective_quantization(quantization: Optional[str], num_vectors: int) -> Optional[str]:
+    """Get the encoding actually used for a corpus of the given size.
+
+    PQ falls back to int8 until there are enough vectors to train its codebooks.
+
+    Args:
+        quantization: Requested encoding, or None for float32
+        num_vectors: Number of live vectors in the index
+
+    Returns:
+        str: The encoding to build the index with, or None for float32
+    """
+    if quantization == PQ and num_vectors < _PQ_MIN_VECTORS:
+        return INT8
+    return quantization or None
+
+def _ivf_nlist(num_vectors: int) -> int:
+    """Number of IVF lists for a corpus, roughly 4 * sqrt(n)."""
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+def _pq_m(dim: int) -> int:
+    """Number of one-byte PQ sub-quantizers, which must divide the dimension."""
+    m = max(1, dim // config.INDEX_PQ_SUBVECTOR_DIM)
+    while dim % m:
+        m -= 1
+    return m
+
+def build_index(
+    vectors: np.ndarray,
+    index_type: Optional[str] = None,
+    quantization: Optional[str] = None
+) -> Any:
+    """Build a FAISS index over the given vectors.
+
+    Positions in the returned index match row order in ``vectors``. IVF
+    lists and quantizer codebooks are trained on a sample of the vectors
+    themselves.
+
+    Args:
+        vectors: float32 matrix with one row per chunk
+        index_type: Optional index type; chosen by corpus size if omitted
+        quantization: Optional vector encoding (``"fp16"``, ``"int8"`` or ``"pq"``)
+
+    Returns:
+        The populated FAISS index
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dim = vectors.shape
+    index_type = index_type or select_index_type(num_vectors)
+    quantization = effective_quantization(quantization, num_vectors)
+    sample_size = _PQ_MIN_VECTORS * config.INDEX_IVF_TRAINING_SAMPLES_PER_LIST
+
+    if index_type == IVF:
+        nlist = _ivf_nlist(num_vectors)
+        sample_size = max(sample_size, nlist * config.INDEX_IVF_TRAINING_SAMPLES_PER_LIST)
+        quantizer = faiss.IndexFlatL2(dim)
+        if quantization == PQ:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m(dim), 8)
+        elif quantization:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, _SQ_TYPES[quantization])
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        index.nprobe = config.INDEX_IVF_NPROBE
+    elif index_type == HNSW:
+        if quantization == PQ:
+            index = faiss.IndexHNSWPQ(dim, _pq_m(dim), config.INDEX_HNSW_M)
+        elif quantization:
+            index = faiss.IndexHNSWSQ(dim, _SQ_TYPES[quantization], config.INDEX_HNSW_M)
+        else:
+            index = faiss.IndexHNSWFlat(dim, config.INDEX_HNSW_M)
+        index.hnsw.efSearch = config.INDEX_HNSW_EF_SEARCH
+    else:
+        if quantization == PQ:
+            index = faiss.IndexPQ(dim, _pq_m(dim), 8)
+        elif quantization:
+            index = faiss.IndexScalarQuantizer(dim, _SQ_TYPES[quantization])
+        else:
+            index = faiss.IndexFlatL2(dim)
+
+    if not index.is_trained:
+        sample_size = min(num_vectors, sample_size)
+        index.train(vectors[np.random.default_rng(0).choice(num_vectors, sample_size, replace=False)])
+
+    index.add(vectors)
+    logger.info(
+        f"Built {index_type} index over {num_vectors} vectors"
+        + (f" with {quantization} encoding" if quantization else "")
+    )
+    return index
+
+def needs_rebuild(index: Any, num_vectors: int, quantization: Optional[str] = None) -> bool:
+    """Check whether an index should be rebuilt for its current size.
+
+    This is the case when the corpus crossed a type threshold, the index
+    does not use the requested encoding, or an IVF index has grown far past
+    the size its lists were trained for.
+
+    Args:
+        index: Existing FAISS index
+        num_vectors: Number of live vectors in the index
+        quantization: Requested vector encoding, or None for float32
+
+    Returns:
+        bool: True if the index should be rebuilt from stored vectors
+    """
+    index_type = get_index_type(index)
+    if index_type != select_index_type(num_vectors):
+        return True
+    if get_quantization(index) != effective_quantization(quantization, num_vectors):
+        return True
+    if index_type == IVF:
+        return _ivf_nlist(num_vectors) >= 2 * faiss.downcast_index(index).nlist
+    return False
+
+def supports_removal(index: Any) -> bool:
+    """Check whether vectors can be removed in place without renumbering issues.
+
+    Only flat indices shift positions the way the docstore mapping expects;
+    other types are rebuilt instead.
+    """
+    return get_index_type(index) == FLAT
+
+def memory_usage(index: Any) -> int:
+    """Estimate the bytes held by a FAISS index's vectors and graph.
+
+    Args:
+        index: FAISS index
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        # Level-0 neighbour links dominate the graph
+        links = index.ntotal * index.hnsw.nb_neighbors(0) * 4
+        return links + memory_usage(index.storage)
+    if isinstance(index, faiss.IndexIVF):
+        # Codes plus the 8-byte ID stored with each entry
+        return index.ntotal * (index.code_size + 8)
+    if isinstance(index, faiss.IndexFlatCodes):
+        return index.ntotal * index.code_size
+    return index.ntotal * index.d * 4
+
+def supports_selectors(index: Any) -> bool:
+    """Check whether an index can evaluate ID selectors during search.
+
+    Flat PQ indices cannot, so their results are filtered after the search.
+    """
+    return not isinstance(faiss.downcast_index(index), faiss.IndexPQ)
+
+def search_parameters(
+    index: Any,
+    selector: Optional[Any] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None
+) -> Optional[Any]:
+    """Build FAISS search parameters for an index.
+
+    Args:
+        index: FAISS index to be searched
+        selector: Optional ID selector restricting the candidates
+        nprobe: Optional number of IVF lists to visit
+        ef_search: Optional HNSW search beam width
+
+    Returns:
+        FAISS search parameters, or None if the index defaults apply
+    """
+    index_type = get_index_type(index)
+    if index_type == IVF and nprobe is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+    if index_type == HNSW and ef_search is not None:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+    if selector is not None:
+        if index_type == IVF:
+            return faiss.SearchParametersIVF(sel=selector, nprobe=faiss.downcast_index(index).nprobe)
+        if index_type == HNSW:
+            return faiss.SearchParametersHNSW(
+                sel=selector, efSearch=faiss.downcast_index(index).hnsw.efSearch
+            )
+        return faiss.SearchParameters(sel=selector)
+    return None
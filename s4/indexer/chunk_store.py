@@ -0,0 +1,385 @@
+"""Memory-mapped chunk text and metadata store for S4 indices."""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from s4.exceptions import IndexError
+
+logger = logging.getLogger(__name__)
+
+# One fixed-width row per chunk, in FAISS position order
+CHUNK_DTYPE = np.dtype([
+    ('chunk_id', '<i8'),
+    ('offset', '<i8'),
+    ('length', '<i4'),
+    ('slot', '<i4'),
+    ('chunk_index', '<i4'),
+    ('chunk_count', '<i4'),
+])
+
+class ChunkStore:
+    """Chunk texts and metadata for a FAISS index, without pickling.
+
+    Row ``i`` describes the vector at FAISS position ``i``. The store consists
+    of files sharing a common prefix:
+
+    - ``<prefix>.chunks.json``: manifest with the committed generation, text
+      size and one metadata entry per indexed file version
+    - ``<prefix>.chunks.<generation>.npy``: fixed-width table with each chunk's
+      ID, text offset and length, file version, chunk index and chunk count
+    - ``<prefix>.chunks.<generation>.txt``: UTF-8 chunk texts back to back
+
+    The table and texts are memory-mapped read-only, so loading is O(1) and
+    pages are shared between processes through the OS page cache. Rows added
+    since the last save are held in memory until :meth:`save` writes a new
+    generation and atomically switches the manifest to it. Chunk IDs increase
+    with position, so lookups by chunk ID are binary searches.
+    """
+
+    def __init__(self, path_prefix: Union[str, Path], load: bool = True):
+        """Initialize the chunk store.
+
+        Args:
+            path_prefix: Path prefix for the store files (usually the index path without suffix)
+            load: Whether to map the committed store from disk
+        """
+        self.path_prefix = str(path_prefix)
+        self.manifest_path = Path(f"{self.path_prefix}.chunks.json")
+
+        self._generation = 0
+        self._text_generation = 0
+        self._text_bytes = 0
+        self._table = np.empty(0, dtype=CHUNK_DTYPE)
+        self._text = np.empty(0, dtype=np.uint8)
+        self._files: List[Dict[str, Any]] = []
+
+        # Rows appended since the last save
+        self._tail: List[tuple] = []
+        self._tail_texts: List[bytes] = []
+        self._tail_positions: Dict[int, int] = {}
+        self._rewrite_text = False
+
+        if load:
+            self._load()
+
+    def _table_path(self, generation: int) -> Path:
+        return Path(f"{self.path_prefix}.chunks.{generation}.npy")
+
+    def _text_path(self, generation: int) -> Path:
+        return Path(f"{self.path_prefix}.chunks.{generation}.txt")
+
+    def exists(self) -> bool:
+        """Check whether a committed store exists on disk."""
+        return self.manifest_path.exists()
+
+    def _load(self):
+        """Map the committed table and texts from disk."""
+        if not self.manifest_path.exists():
+            return
+
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            self._generation = manifest['generation']
+            self._text_generation = manifest['text_generation']
+            self._text_bytes = manifest['text_bytes']
+            self._files = manifest['files']
+
+            if manifest['count']:
+                self._table = np.load(
+                    self._table_path(self._generation), mmap_mode='r', allow_pickle=False
+                )
+            if self._text_bytes:
+                self._text = np.memmap(
+                    self._text_path(self._text_generation), dtype=np.uint8,
+                    mode='r', shape=(self._text_bytes,)
+                )
+        except Exception as e:
+            logger.error(f"Error loading chunk store {self.manifest_path}: {e}")
+            raise IndexError(f"Error loading chunk store: {str(e)}")
+
+    def __len__(self) -> int:
+        return len(self._table) + len(self._tail)
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return self.positions([chunk_id])[0] != -1
+
+    def _last_chunk_id(self) -> int:
+        if self._tail:
+            return self._tail[-1][0]
+        return int(self._table['chunk_id'][-1]) if len(self._table) else -1
+
+    def chunk_ids(self, positions: Optional[Iterable[int]] = None) -> np.ndarray:
+        """Get the chunk IDs at the given positions.
+
+        Args:
+            positions: Optional positions; all chunks if omitted
+
+        Returns:
+            np.ndarray: int64 chunk IDs
+        """
+        if positions is None:
+            tail_ids = np.fromiter((row[0] for row in self._tail), dtype=np.int64)
+            return np.concatenate([self._table['chunk_id'], tail_ids])
+
+        positions = np.asarray(positions, dtype=np.int64)
+        ids = np.empty(len(positions), dtype=np.int64)
+        in_base = positions < len(self._table)
+        ids[in_base] = self._table['chunk_id'][positions[in_base]]
+        ids[~in_base] = [self._tail[p - len(self._table)][0] for p in positions[~in_base]]
+        return ids
+
+    def positions(self, chunk_ids: Iterable[int]) -> np.ndarray:
+        """Get the positions of the given chunk IDs.
+
+        Args:
+            chunk_ids: IDs of the chunks
+
+        Returns:
+            np.ndarray: int64 positions, -1 for chunk IDs not in the store
+        """
+        chunk_ids = np.fromiter(chunk_ids, dtype=np.int64)
+        base_ids = self._table['chunk_id']
+        found = np.searchsorted(base_ids, chunk_ids)
+        valid = found < len(base_ids)
+        valid[valid] = base_ids[found[valid]] == chunk_ids[valid]
+
+        positions = np.where(valid, found, -1)
+        for i in np.flatnonzero(~valid):
+            positions[i] = self._tail_positions.get(int(chunk_ids[i]), -1)
+        return positions
+
+    def positions_with_metadata(self, key: str, value: Any) -> np.ndarray:
+        """Get the positions of all chunks whose file metadata has ``key == value``.
+
+        Args:
+            key: File metadata key, e.g. ``tenant_id``
+            value: Value to match
+
+        Returns:
+            np.ndarray: int64 positions in ascending order
+        """
+        slots = [slot for slot, entry in enumerate(self._files) if entry['metadata'].get(key) == value]
+        base = np.flatnonzero(np.isin(self._table['slot'], slots))
+        slots = set(slots)
+        tail = np.fromiter(
+            (len(self._table) + i for i, row in enumerate(self._tail) if row[1] in slots),
+            dtype=np.int64
+        )
+        return np.concatenate([base, tail])
+
+    def text(self, position: int) -> str:
+        """Get the text of the chunk at a position."""
+        if position >= len(self._table):
+            return self._tail_texts[position - len(self._table)].decode('utf-8')
+        row = self._table[position]
+        start = int(row['offset'])
+        return self._text[start:start + int(row['length'])].tobytes().decode('utf-8')
+
+    def metadata(self, position: int) -> Dict[str, Any]:
+        """Get the metadata of the chunk at a position.
+
+        Returns:
+            Dict with the file ID, chunk ID, chunk index and count, and the file metadata
+        """
+        if position >= len(self._table):
+            chunk_id, slot, chunk_index, chunk_count = self._tail[position - len(self._table)]
+        else:
+            row = self._table[position]
+            chunk_id, slot = int(row['chunk_id']), int(row['slot'])
+            chunk_index, chunk_count = int(row['chunk_index']), int(row['chunk_count'])
+
+        entry = self._files[slot]
+        return {
+            'file_id': entry['file_id'],
+            'chunk_id': chunk_id,
+            'chunk_index': chunk_index,
+            'chunk_count': chunk_count,
+            **entry['metadata']
+        }
+
+    def update_metadata(self, chunk_id: int, metadata: Dict[str, Any]) -> bool:
+        """Replace the file metadata shared by a chunk and its file version.
+
+        Every chunk of a file version refers to one metadata entry, so this
+        is O(1) in the number of chunks. Stores copied by :meth:`select`
+        share their entries and see the change too.
+
+        Args:
+            chunk_id: ID of any chunk of the file version
+            metadata: New file metadata
+
+        Returns:
+            bool: True if the chunk was found
+        """
+        position = int(self.positions([chunk_id])[0])
+        if position == -1:
+            return False
+        if position >= len(self._table):
+            slot = self._tail[position - len(self._table)][1]
+        else:
+            slot = int(self._table[position]['slot'])
+        self._files[slot]['metadata'] = metadata
+        return True
+
+    def append(
+        self,
+        file_id: str,
+        metadata: Dict[str, Any],
+        chunk_ids: Sequence[int],
+        texts: Sequence[str],
+        chunk_indexes: Optional[Sequence[int]] = None,
+        chunk_count: Optional[int] = None
+    ) -> int:
+        """Append the chunks of one file version.
+
+        Args:
+            file_id: Unique identifier for the file
+            metadata: File metadata shared by the chunks
+            chunk_ids: IDs of the chunks, greater than any ID already stored
+            texts: Text of each chunk
+            chunk_indexes: Optional index of each chunk within the file; defaults to 0..n-1
+            chunk_count: Optional number of chunks in the file; defaults to ``len(chunk_ids)``
+
+        Returns:
+            int: Position of the first appended chunk
+        """
+        if len(chunk_ids) != len(texts):
+            raise IndexError("Chunk store append needs one text per chunk ID")
+        if len(chunk_ids) and (
+            chunk_ids[0] <= self._last_chunk_id()
+            or any(a >= b for a, b in zip(chunk_ids, chunk_ids[1:]))
+        ):
+            raise IndexError("Chunk IDs must increase with position")
+
+        slot = len(self._files)
+        self._files.append({'file_id': file_id, 'metadata': metadata})
+        if chunk_indexes is None:
+            chunk_indexes = range(len(chunk_ids))
+        if chunk_count is None:
+            chunk_count = len(chunk_ids)
+
+        first_position = len(self)
+        for offset, (chunk_id, text, chunk_index) in enumerate(zip(chunk_ids, texts, chunk_indexes)):
+            self._tail.append((int(chunk_id), slot, int(chunk_index), int(chunk_count)))
+            self._tail_texts.append(text.encode('utf-8'))
+            self._tail_positions[int(chunk_id)] = first_position + offset
+        return first_position
+
+    def extend(self, source: 'ChunkStore', positions: Iterable[int]):
+        """Append rows copied from another store, keeping their metadata.
+
+        Args:
+            source: Store to copy from
+            positions: Positions in ``source`` to copy, in order
+        """
+        slots: Dict[int, int] = {}
+        for position in positions:
+            position = int(position)
+            metadata = source.metadata(position)
+            source_slot = (
+                source._tail[position - len(source._table)][1]
+                if position >= len(source._table) else int(source._table[position]['slot'])
+            )
+            if source_slot not in slots:
+                slots[source_slot] = len(self._files)
+                self._files.append(source._files[source_slot])
+
+            chunk_id = metadata['chunk_id']
+            if chunk_id <= self._last_chunk_id():
+                raise IndexError("Chunk IDs must increase with position")
+            self._tail_positions[chunk_id] = len(self)
+            self._tail.append((chunk_id, slots[source_slot], metadata['chunk_index'], metadata['chunk_count']))
+            self._tail_texts.append(source.text(position).encode('utf-8'))
+
+    def select(self, positions: Iterable[int]) -> 'ChunkStore':
+        """Copy the given rows into a new, unsaved store at the same location.
+
+        Saving the copy replaces this store on disk.
+
+        Args:
+            positions: Positions to keep, in order
+
+        Returns:
+            ChunkStore: The new store
+        """
+        store = ChunkStore(self.path_prefix, load=False)
+        store._generation = self._generation
+        store._text_generation = self._text_generation
+        store._rewrite_text = True
+        store.extend(self, positions)
+        return store
+
+    def save(self):
+        """Write a new generation of the store and switch the manifest to it."""
+        generation = self._generation + 1
+
+        # Texts are append-only unless rows were dropped
+        text_generation = generation if self._rewrite_text else self._text_generation
+        text_path = self._text_path(text_generation)
+        text_bytes = 0 if self._rewrite_text else self._text_bytes
+        offsets = []
+        with open(text_path, 'r+b' if text_path.exists() and not self._rewrite_text else 'wb') as f:
+            # Bytes past the committed size are left over from an interrupted save
+            f.seek(text_bytes)
+            f.truncate()
+            for text in self._tail_texts:
+                offsets.append(text_bytes)
+                f.write(text)
+                text_bytes += len(text)
+            f.flush()
+            os.fsync(f.fileno())
+
+        tail = np.array(
+            [
+                (chunk_id, offset, len(text), slot, chunk_index, chunk_count)
+                for (chunk_id, slot, chunk_index, chunk_count), offset, text
+                in zip(self._tail, offsets, self._tail_texts)
+            ],
+            dtype=CHUNK_DTYPE
+        )
+        table = np.concatenate([np.asarray(self._table), tail])
+
+        # Drop file versions no chunk refers to anymore
+        used_slots, table['slot'] = np.unique(table['slot'], return_inverse=True)
+        files = [self._files[slot] for slot in used_slots]
+
+        with open(self._table_path(generation), 'wb') as f:
+            np.save(f, table, allow_pickle=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'generation': generation,
+                'text_generation': text_generation,
+                'text_bytes': text_bytes,
+                'count': len(table),
+                'files': files
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+        # Processes that still map the old generation keep their open files
+        self._table_path(self._generation).unlink(missing_ok=True)
+        if text_generation != self._text_generation:
+            self._text_path(self._text_generation).unlink(missing_ok=True)
+
+        self._tail, self._tail_texts, self._tail_positions = [], [], {}
+        self._rewrite_text = False
+        self._table = np.empty(0, dtype=CHUNK_DTYPE)
+        self._text = np.empty(0, dtype=np.uint8)
+        self._load()
+
+    def delete(self):
+        """Remove the store files from disk."""
+        self.manifest_path.unlink(missing_ok=True)
+        self._table_path(self._generation).unlink(missing_ok=True)
+        self._text_path(self._text_generation).unlink(missing_ok=True)
@@ -0,0 +1,197 @@
+"""Token-based text chunking for S4 indices."""
+
+import logging
+from typing import Any, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from s4 import config
+from s4.embedding.batching import load_encoding
+
+logger = logging.getLogger(__name__)
+
+# Bytes a chunk may end before, so chunks break between words
+_BREAK_BYTES = frozenset(b" \t\r\n")
+
+class Chunk:
+    """A chunk of text and its position in the source document.
+
+    Offsets are half-open ranges over the document's characters and over
+    its tokens in the embedding model's encoding.
+    """
+
+    __slots__ = ('text', 'char_start', 'char_end', 'token_start', 'token_end')
+
+    def __init__(self, text: str, char_start: int, char_end: int, token_start: int, token_end: int):
+        self.text = text
+        self.char_start = char_start
+        self.char_end = char_end
+        self.token_start = token_start
+        self.token_end = token_end
+
+    @property
+    def tokens(self) -> int:
+        return self.token_end - self.token_start
+
+    def __repr__(self) -> str:
+        return (
+            f"Chunk(chars={self.char_start}:{self.char_end}, "
+            f"tokens={self.token_start}:{self.token_end}, text={self.text[:30]!r})"
+        )
+
+class TokenChunker:
+    """Splits text into chunks of a target number of tokens.
+
+    Text is tokenized once with the embedding model's encoding. Windows of
+    ``chunk_tokens`` tokens are then cut in one pass, each starting
+    ``overlap_tokens`` before the end of the previous one. Both ends of a
+    window move back to a word boundary within an eighth of the chunk
+    size, if there is one, so words are rarely split. Character offsets
+    come from the byte length of each token, so no text is searched or
+    re-encoded.
+    """
+
+    def __init__(
+        self,
+        chunk_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None,
+        model: Optional[str] = None,
+        encoding: Optional[Any] = None
+    ):
+        """Initialize the chunker.
+
+        Args:
+            chunk_tokens: Optional maximum number of tokens per chunk
+            overlap_tokens: Optional number of tokens shared by consecutive chunks
+            model: Optional embedding model whose encoding counts tokens
+            encoding: Optional tokenizer; loaded from tiktoken on first use by default
+        """
+        self.chunk_tokens = chunk_tokens or config.CHUNK_TOKENS
+        self.overlap_tokens = overlap_tokens if overlap_tokens is not None else config.CHUNK_OVERLAP_TOKENS
+        if not 0 <= self.overlap_tokens < self.chunk_tokens:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self.model = model or config.EMBEDDING_MODEL
+        self._encoding = encoding
+
+    @property
+    def encoding(self) -> Any:
+        if self._encoding is None:
+            self._encoding = load_encoding(self.model)
+        return self._encoding
+
+    def _token_bytes(self, tokens: List[int]) -> List[bytes]:
+        decode_tokens_bytes = getattr(self.encoding, 'decode_tokens_bytes', None)
+        if decode_tokens_bytes is not None:
+            return decode_tokens_bytes(tokens)
+        return [self.encoding.decode([token]).encode('utf-8') for token in tokens]
+
+    @staticmethod
+    def _is_break(token: bytes) -> bool:
+        return bool(token) and token[0] in _BREAK_BYTES
+
+    def _windows(self, token_bytes: List[bytes], final: bool) -> Iterator[tuple]:
+        """Cut token windows, yielding (start, end) token indexes.
+
+        Unless ``final``, the last, possibly short window is not yielded;
+        its start is yielded alone as ``(start, None)`` instead.
+        """
+        count = len(token_bytes)
+        lookback = max(self.chunk_tokens // 8, 1)
+        start = 0
+        while start < count:
+            end = start + self.chunk_tokens
+            if end >= count:
+                if final:
+                    yield start, count
+                else:
+                    yield start, None
+                return
+            for cut in range(end, max(end - lookback, start + self.overlap_tokens + 1) - 1, -1):
+                if self._is_break(token_bytes[cut]):
+                    end = cut
+                    break
+            yield start, end
+
+            # Start the next window at a word boundary too, widening the overlap
+            previous, start = start, end - self.overlap_tokens
+            for cut in range(start, max(start - lookback, previous + 1) - 1, -1):
+                if self._is_break(token_bytes[cut]):
+                    start = cut
+                    break
+
+    def split(self, text: str) -> List[Chunk]:
+        """Split a text into chunks.
+
+        Args:
+            text: Text to split
+
+        Returns:
+            List[Chunk]: Chunks in order
+        """
+        return list(self.iter_chunks([text]))
+
+    def iter_chunks(self, segments: Iterable[str]) -> Iterator[Chunk]:
+        """Chunk text that arrives in consecutive segments, e.g. pages.
+
+        Segments are buffered until they hold a few chunks' worth of text.
+        Then complete windows are emitted, and the text of the last,
+        incomplete window is carried into the next buffer. Offsets count
+        from the start of the first segment.
+
+        Args:
+            segments: Consecutive pieces of the text
+
+        Yields:
+            Chunk: Chunks in order
+        """
+        buffer: List[str] = []
+        buffered = 0
+        char_base = 0
+        token_base = 0
+        # Roughly four characters per token, so about eight chunks per flush
+        flush_chars = 4 * 8 * self.chunk_tokens
+        flush_at = flush_chars
+
+        def flush(final: bool) -> Iterator[Chunk]:
+            nonlocal buffer, buffered, char_base, token_base, flush_at
+            text = "".join(buffer)
+            tokens = self.encoding.encode(text)
+            token_bytes = self._token_bytes(tokens)
+
+            # Character offset of every token boundary, from the UTF-8 lead bytes
+            lengths = np.fromiter(map(len, token_bytes), dtype=np.int64, count=len(tokens))
+            byte_offsets = np.concatenate([[0], np.cumsum(lengths)])
+            encoded = np.frombuffer(b"".join(token_bytes), dtype=np.uint8)
+            leads = np.concatenate([[0], np.cumsum((encoded & 0xC0) != 0x80)])
+            char_offsets = leads[byte_offsets]
+
+            for start, end in self._windows(token_bytes, final):
+                if end is None:
+                    # Carry the incomplete window into the next buffer
+                    carried = int(char_offsets[start])
+                    buffer = [text[carried:]]
+                    buffered = len(buffer[0])
+                    char_base += carried
+                    token_base += start
+                    # Tokenize the carried text again only with enough new text
+                    flush_at = buffered + flush_chars
+                    return
+                char_start, char_end = int(char_offsets[start]), int(char_offsets[end])
+                yield Chunk(
+                    text[char_start:char_end],
+                    char_base + char_start,
+                    char_base + char_end,
+                    token_base + start,
+                    token_base + end
+                )
+            buffer, buffered = [], 0
+
+        for segment in segments:
+            if not segment:
+                continue
+            buffer.append(segment)
+            buffered += len(segment)
+            if buffered >= flush_at:
+                yield from flush(final=False)
+        if buffered:
+            yield from flush(final=True)
@@ -1,31 +1,34 @@
 """Document processor for extracting text from different file types."""
 
+import codecs
 import io
 import logging
 import mimetypes
 import os
-from typing import Dict, List, Optional, BinaryIO, Tuple, Union
+from typing import Dict, Iterator, List, Optional, BinaryIO, Tuple, Union
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from s4.exceptions import ProcessingError
+from s4.indexer.chunker import Chunk, TokenChunker
+from s4.indexer.extraction import extract_docx, extract_excel, extraction_pool
 
 logger = logging.getLogger(__name__)
 
+# Bytes of a plain text file decoded at a time
+TEXT_BLOCK_SIZE = 1 << 20
+
 class DocumentProcessor:
     """Extract and process text from various document types."""
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None):
         """Initialize the document processor.
         
         Args:
-            chunk_size: Size of text chunks for indexing
-            chunk_overlap: Overlap between chunks
+            chunk_size: Optional maximum number of tokens per chunk
+            chunk_overlap: Optional number of tokens shared by consecutive chunks
         """
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-        )
+        self.chunker = TokenChunker(chunk_tokens=chunk_size, overlap_tokens=chunk_overlap)
+        self.chunk_size = self.chunker.chunk_tokens
+        self.chunk_overlap = self.chunker.overlap_tokens
         
     def process_document(
         self, 
@@ -43,6 +46,50 @@ class DocumentProcessor:
         Returns:
             List[str]: List of text chunks
         """
+        chunks = list(self.iter_chunks(file_obj, file_name, mime_type))
+        logger.info(f"Processed document into {len(chunks)} chunks")
+        return chunks
+    
+    def iter_chunks(
+        self,
+        file_obj: Union[BinaryIO, bytes, io.BytesIO],
+        file_name: Optional[str] = None,
+        mime_type: Optional[str] = None
+    ) -> Iterator[str]:
+        """Stream text chunks out of a document as it is extracted.
+        
+        Args:
+            file_obj: File object or bytes
+            file_name: Optional file name to help determine type
+            mime_type: Optional MIME type to specify file type
+            
+        Yields:
+            str: Text chunks in document order
+        """
+        for chunk in self.iter_chunk_spans(file_obj, file_name, mime_type):
+            yield chunk.text
+    
+    def iter_chunk_spans(
+        self,
+        file_obj: Union[BinaryIO, bytes, io.BytesIO],
+        file_name: Optional[str] = None,
+        mime_type: Optional[str] = None
+    ) -> Iterator[Chunk]:
+        """Stream chunks with their character and token offsets in the document.
+        
+        Extracted text (page by page for PDFs) is chunked by token count as
+        it arrives, so memory is bounded by a few chunks' worth of text
+        instead of the size of the document. Whitespace-only chunks are
+        skipped.
+        
+        Args:
+            file_obj: File object or bytes
+            file_name: Optional file name to help determine type
+            mime_type: Optional MIME type to specify file type
+            
+        Yields:
+            Chunk: Chunks in document order
+        """
         # Determine MIME type
         if not mime_type and file_name:
             mime_type, _ = mimetypes.guess_type(file_name)
@@ -51,18 +98,14 @@ class DocumentProcessor:
             # Default to plain text if we can't determine
             mime_type = 'text/plain'
             
-        # Extract text based on MIME type
-        text = self._extract_text(file_obj, mime_type)
-        
-        if not text:
-            logger.warning(f"No text extracted from document: {file_name or 'unnamed'}")
-            return []
+        extracted = False
+        for chunk in self.chunker.iter_chunks(self.iter_text(file_obj, mime_type)):
+            extracted = True
+            if chunk.text.strip():
+                yield chunk
             
-        # Split text into chunks
-        chunks = self.text_splitter.split_text(text)
-        
-        logger.info(f"Processed document into {len(chunks)} chunks")
-        return chunks
+        if not extracted:
+            logger.warning(f"No text extracted from document: {file_name or 'unnamed'}")
     
     def _extract_text(self, file_obj: Union[BinaryIO, bytes, io.BytesIO], mime_type: str) -> str:
         """Extract text from a file based on its MIME type.
@@ -74,76 +117,109 @@ class DocumentProcessor:
         Returns:
             str: Extracted text
         """
-        # Ensure we have bytes to work with
-        if isinstance(file_obj, io.BytesIO):
-            file_bytes = file_obj.getvalue()
-        elif isinstance(file_obj, bytes):
-            file_bytes = file_obj
-        else:
-            # Read from file-like object
-            file_bytes = file_obj.read()
+        return "".join(self.iter_text(file_obj, mime_type))
+    
+    def iter_text(self, file_obj: Union[BinaryIO, bytes, io.BytesIO], mime_type: str) -> Iterator[str]:
+        """Extract text from a file piece by piece, based on its MIME type.
+        
+        PDF, Word and Excel files are parsed in the extraction process pool,
+        PDFs page by page in parallel; plain text is decoded in blocks. Other
+        formats are parsed whole.
+        
+        Args:
+            file_obj: File object or bytes
+            mime_type: MIME type of the file
             
-        # Handle different file types
+        Yields:
+            str: Consecutive pieces of the extracted text
+            
+        Raises:
+            ProcessingError: If extraction times out or exceeds its memory limit
+        """
+        # Read the file in place rather than copying its content
+        if isinstance(file_obj, bytes):
+            stream = io.BytesIO(file_obj)
+        else:
+            stream = file_obj
+            if isinstance(stream, io.BytesIO):
+                stream.seek(0)
+                
         if mime_type.startswith('text/'):
-            # Plain text files
-            try:
-                return file_bytes.decode('utf-8')
-            except UnicodeDecodeError:
-                try:
-                    return file_bytes.decode('latin-1')
-                except Exception as e:
-                    logger.error(f"Error decoding text file: {e}")
-                    return ""
-                    
-        elif mime_type == 'application/pdf':
+            yield from self._iter_plain_text(stream)
+            return
+            
+        if mime_type == 'application/pdf':
             # PDF files
             try:
-                # Only import if needed
-                import PyPDF2
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_bytes))
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
+                with extraction_pool.spooled(stream, suffix=".pdf") as path:
+                    for text in extraction_pool.iter_pdf_pages(path):
+                        yield text + "\n"
+            except ProcessingError:
+                raise
             except ImportError:
                 logger.error("PyPDF2 package not installed. Cannot process PDF files.")
-                return ""
             except Exception as e:
                 logger.error(f"Error processing PDF file: {e}")
-                return ""
-                
-        elif mime_type in ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
+            return
+            
+        if mime_type in ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
             # Word documents
             try:
-                # Only import if needed
-                import docx
-                doc = docx.Document(io.BytesIO(file_bytes))
-                text = ""
-                for para in doc.paragraphs:
-                    text += para.text + "\n"
-                return text
+                with extraction_pool.spooled(stream, suffix=".docx") as path:
+                    yield extraction_pool.run(extract_docx, path)
+            except ProcessingError:
+                raise
             except ImportError:
                 logger.error("python-docx package not installed. Cannot process Word files.")
-                return ""
             except Exception as e:
                 logger.error(f"Error processing Word file: {e}")
-                return ""
-                
-        elif mime_type in ['application/vnd.ms-excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet']:
+            return
+            
+        if mime_type in ['application/vnd.ms-excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet']:
             # Excel files
             try:
-                # Only import if needed
-                import pandas as pd
-                df = pd.read_excel(io.BytesIO(file_bytes))
-                return df.to_string()
+                with extraction_pool.spooled(stream) as path:
+                    yield extraction_pool.run(extract_excel, path)
+            except ProcessingError:
+                raise
             except ImportError:
                 logger.error("pandas package not installed. Cannot process Excel files.")
-                return ""
             except Exception as e:
                 logger.error(f"Error processing Excel file: {e}")
-                return ""
-                
-        elif mime_type == 'application/json':
+            return
+            
+        yield self._extract_whole_text(stream.read(), mime_type)
+    
+    def _iter_plain_text(self, stream: BinaryIO) -> Iterator[str]:
+        """Decode a text file in blocks, as UTF-8 or else as Latin-1."""
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        while True:
+            block = stream.read(TEXT_BLOCK_SIZE)
+            pending = decoder.getstate()[0]
+            try:
+                text = decoder.decode(block, final=not block)
+            except UnicodeDecodeError:
+                # Latin-1 decodes any byte, so the rest of the file never fails
+                logger.warning("Text file is not valid UTF-8, decoding the rest as Latin-1")
+                decoder = codecs.getincrementaldecoder('latin-1')()
+                text = decoder.decode(pending + block, final=not block)
+            if text:
+                yield text
+            if not block:
+                return
+    
+    def _extract_whole_text(self, file_bytes: bytes, mime_type: str) -> str:
+        """Extract text from formats that can only be parsed whole.
+        
+        Args:
+            file_bytes: File content
+            mime_type: MIME type of the file
+            
+        Returns:
+            str: Extracted text
+        """
+        # Handle different file types
+        if mime_type == 'application/json':
             # JSON files
             try:
                 import json
@@ -0,0 +1,287 @@
+"""Process pool for CPU-heavy text extraction."""
+
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Callable, Iterator, List, Optional
+
+from s4 import config
+from s4.exceptions import ProcessingError
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Extra seconds the caller waits past a task's own deadline before giving up
+_TIMEOUT_GRACE = 5.0
+
+class ExtractionTimeout(ProcessingError):
+    """Extraction ran past its deadline."""
+
+    def __init__(self, message: str = "Extraction timed out"):
+        super().__init__(message)
+
+def _on_alarm(signum, frame):
+    raise ExtractionTimeout()
+
+def _init_worker(memory_mb: int):
+    """Limit a worker's address space and install the timeout handler."""
+    if memory_mb and resource is not None:
+        limit = memory_mb * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+def _run_with_deadline(timeout: float, func: Callable, *args: Any) -> Any:
+    """Run a task in a worker, interrupting it once ``timeout`` seconds pass."""
+    signal.setitimer(signal.ITIMER_REAL, max(timeout, 0.001))
+    try:
+        return func(*args)
+    except MemoryError:
+        raise ProcessingError("Extraction exceeded the worker memory limit")
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+def _ocr(image: Any) -> str:
+    """OCR an image with Tesseract, or return nothing if it is unavailable."""
+    try:
+        import pytesseract
+    except ImportError:
+        return ""
+    try:
+        return pytesseract.image_to_string(image)
+    except pytesseract.TesseractNotFoundError:
+        logger.warning("Tesseract is not installed. Cannot OCR images.")
+        return ""
+
+def pdf_page_count(path: str) -> int:
+    """Count the pages of a PDF file."""
+    import PyPDF2
+    return len(PyPDF2.PdfReader(path).pages)
+
+def extract_pdf_pages(path: str, start: int, stop: int, ocr: bool = True) -> List[str]:
+    """Extract the text of a range of PDF pages.
+
+    Pages without a text layer, e.g. scans, are OCRed from their images.
+
+    Args:
+        path: Path of the PDF file
+        start: First page
+        stop: Page after the last one
+        ocr: Whether to OCR pages that have no text
+
+    Returns:
+        List[str]: Text of each page
+    """
+    import PyPDF2
+    pages = PyPDF2.PdfReader(path).pages
+    texts = []
+    for number in range(start, min(stop, len(pages))):
+        page = pages[number]
+        text = page.extract_text()
+        if ocr and not text.strip():
+            from PIL import Image
+            images = []
+            try:
+                images = page.images
+            except Exception as e:
+                logger.warning(f"Could not read images of PDF page {number}: {e}")
+            text = "\n".join(_ocr(Image.open(io.BytesIO(image.data))) for image in images)
+        texts.append(text)
+    return texts
+
+def extract_docx(path: str) -> str:
+    """Extract the paragraphs of a Word document."""
+    import docx
+    return "".join(para.text + "\n" for para in docx.Document(path).paragraphs)
+
+def extract_excel(path: str) -> str:
+    """Render the first sheet of a spreadsheet as text."""
+    import pandas as pd
+    return pd.read_excel(path).to_string()
+
+def ocr_image(path: str) -> str:
+    """OCR an image file."""
+    from PIL import Image
+    with Image.open(path) as image:
+        return _ocr(image)
+
+class ExtractionPool:
+    """Runs text extraction in worker processes, off the API threads.
+
+    PDFs are split into page ranges that are extracted (and OCRed if
+    scanned) in parallel, with results yielded in page order. Every file
+    gets a deadline: workers interrupt a task once the file's remaining time
+    runs out. Each worker's address space is capped, so a pathological file
+    fails with a :class:`ProcessingError` instead of exhausting the host.
+    With zero workers, extraction runs inline in the calling thread.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        memory_mb: Optional[int] = None,
+        pages_per_task: Optional[int] = None
+    ):
+        """Initialize the pool; worker processes are started on first use.
+
+        Args:
+            workers: Optional number of worker processes (0 extracts inline)
+            timeout: Optional seconds allowed to extract one file
+            memory_mb: Optional memory limit of each worker in MB (0 for none)
+            pages_per_task: Optional number of PDF pages extracted per task
+        """
+        self.workers = workers if workers is not None else config.EXTRACTION_WORKERS
+        self.timeout = timeout or config.EXTRACTION_TIMEOUT
+        self.memory_mb = memory_mb if memory_mb is not None else config.EXTRACTION_MEMORY_MB
+        self.pages_per_task = pages_per_task or config.EXTRACTION_PAGES_PER_TASK
+
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Forking a threaded server is unsafe, so workers come from a clean process
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context(
+                    "forkserver" if "forkserver" in methods else "spawn"
+                )
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self.memory_mb,)
+                )
+            return self._executor
+
+    def _submit(self, deadline: float, func: Callable, *args: Any) -> Future:
+        """Schedule a task that must finish by ``deadline`` (a monotonic time)."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ExtractionTimeout(f"Extraction took longer than {self.timeout:g}s")
+        if not self.workers:
+            future: Future = Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._get_executor().submit(_run_with_deadline, remaining, func, *args)
+
+    def _result(self, future: Future, deadline: float) -> Any:
+        """Wait for a task, turning worker failures into processing errors."""
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0) + _TIMEOUT_GRACE)
+        except FutureTimeoutError:
+            future.cancel()
+            raise ExtractionTimeout(f"Extraction took longer than {self.timeout:g}s")
+        except BrokenProcessPool as e:
+            # A worker died, e.g. killed for its memory use; start afresh next time
+            with self._lock:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = None
+            raise ProcessingError(f"Extraction worker failed: {e}")
+
+    def run(self, func: Callable, *args: Any) -> Any:
+        """Run one extraction task in a worker.
+
+        Args:
+            func: Module-level function to run
+            *args: Picklable arguments of the function
+
+        Returns:
+            The function's result
+        """
+        deadline = time.monotonic() + self.timeout
+        return self._result(self._submit(deadline, func, *args), deadline)
+
+    def iter_pdf_pages(self, path: str, ocr: bool = True) -> Iterator[str]:
+        """Extract a PDF's pages in parallel, yielding them in order.
+
+        Only a few tasks per worker are in flight at once, so a slow consumer
+        does not pile up extracted pages in memory.
+
+        Args:
+            path: Path of the PDF file
+            ocr: Whether to OCR pages that have no text
+
+        Yields:
+            str: Text of each page
+        """
+        deadline = time.monotonic() + self.timeout
+        pages = self._result(self._submit(deadline, pdf_page_count, path), deadline)
+
+        ranges = iter(range(0, pages, self.pages_per_task))
+        window = 2 * max(self.workers, 1)
+        pending: deque = deque()
+        try:
+            while True:
+                while len(pending) < window:
+                    start = next(ranges, None)
+                    if start is None:
+                        break
+                    pending.append(self._submit(
+                        deadline, extract_pdf_pages, path, start, start + self.pages_per_task, ocr
+                    ))
+                if not pending:
+                    return
+                yield from self._result(pending.popleft(), deadline)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @contextlib.contextmanager
+    def spooled(self, file_obj: BinaryIO, suffix: str = "") -> Iterator[str]:
+        """Get a path workers can read a file from.
+
+        Files already on disk are used in place; anything else is copied to
+        a temporary file, which is removed afterwards.
+
+        Args:
+            file_obj: File object
+            suffix: Optional suffix of the temporary file name
+
+        Yields:
+            str: Path of the file
+        """
+        name = getattr(file_obj, 'name', None)
+        if isinstance(name, str) and os.path.isfile(name) and 'r' in getattr(file_obj, 'mode', ''):
+            yield name
+            return
+
+        os.makedirs(config.TEMP_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=config.TEMP_DIR)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(file_obj, f)
+            yield path
+        finally:
+            os.unlink(path)
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+# Shared by every document processor in the process
+extraction_pool = ExtractionPool()
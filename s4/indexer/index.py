@@ -1,21 +1,47 @@
 """Document index for S4 with vector database functionality."""
 
+import fcntl
+import itertools
 import json
 import logging
 import os
-import pickle
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any, Union
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Any
 
+import faiss
 import numpy as np
 from langchain_openai import OpenAIEmbeddings
 from langchain.vectorstores.faiss import FAISS
 
 from s4 import config
+from s4.embedding import embedding_cache, query_cache
+from s4.embedding.base import embedding_key
+from s4.embedding.local import create_local_embeddings, is_local_model
+from s4.embedding.batching import TokenBatcher
+from s4.embedding.engine import EmbeddingEngine
 from s4.exceptions import IndexError
+from s4.indexer import backend
+from s4.indexer.chunk_store import ChunkStore
+from s4.indexer.lexical import LexicalIndex
+from s4.indexer.vector_store import VectorStore
+from s4.indexer.wal import WriteAheadLog
 
 logger = logging.getLogger(__name__)
 
+# Map flat-coded vectors straight from the page cache where FAISS supports it
+_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+# Search modes accepted by DocumentIndex.search
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+# Chunk metadata keys set by the index, which metadata updates may not change
+RESERVED_METADATA_KEYS = ("tenant_id", "file_id", "chunk_id", "chunk_index", "chunk_count")
+
 class DocumentIndex:
     """Document index using vector embeddings for semantic search."""
     
@@ -23,7 +49,10 @@ class DocumentIndex:
         self, 
         index_id: str = "default",
         tenant_id: Optional[str] = None,
-        openai_api_key: Optional[str] = None
+        openai_api_key: Optional[str] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        quantization: Optional[str] = None
     ):
         """Initialize the document index.
         
@@ -31,9 +60,18 @@ class DocumentIndex:
             index_id: Unique identifier for this index
             tenant_id: Optional tenant ID for multi-tenant mode
             openai_api_key: Optional OpenAI API key
+            nprobe: Optional default number of IVF lists visited per query
+            ef_search: Optional default HNSW search beam width
+            quantization: Optional vector encoding for the in-memory index
+                (``"fp16"``, ``"int8"`` or ``"pq"``); defaults to the configured one
         """
         self.index_id = index_id
         self.tenant_id = tenant_id
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.quantization = quantization or config.INDEX_QUANTIZATION
+        if self.quantization and self.quantization not in backend.QUANTIZATIONS:
+            raise IndexError(f"Unknown index quantization: {self.quantization}")
         
         # Adjust index ID based on tenant (if in multi-tenant mode)
         self.full_index_id = index_id
@@ -41,36 +79,316 @@ class DocumentIndex:
             self.full_index_id = f"{tenant_id}_{index_id}"
             
         # Initialize embeddings with provided API key or default
-        self.embeddings = OpenAIEmbeddings(
-            model=config.EMBEDDING_MODEL,
-            openai_api_key=openai_api_key or config.OPENAI_API_KEY
-        )
+        self.batcher: Optional[TokenBatcher] = None
+        self.engine: Optional[EmbeddingEngine] = None
+        if is_local_model(config.EMBEDDING_MODEL):
+            # Local models need neither request packing nor rate limiting
+            self.embeddings = create_local_embeddings(config.EMBEDDING_MODEL)
+        else:
+            self.embeddings = OpenAIEmbeddings(
+                model=config.EMBEDDING_MODEL,
+                openai_api_key=openai_api_key or config.OPENAI_API_KEY,
+                # Requests are already packed under the model limits by the batcher
+                chunk_size=config.EMBEDDING_MAX_BATCH_SIZE,
+                check_embedding_ctx_length=False,
+                # Retries are handled by the engine, which honours Retry-After
+                max_retries=0
+            )
+            self.batcher = TokenBatcher(model=config.EMBEDDING_MODEL)
+            self.engine = EmbeddingEngine(
+                self.embeddings.aembed_documents,
+                api_key=openai_api_key or config.OPENAI_API_KEY
+            )
         
         # Set up paths for index storage
         self.index_path = config.INDEX_STORAGE_PATH / f"{self.full_index_id}.faiss"
+        # Pickled LangChain docstore of indices saved before the chunk store
+        self.docstore_path = config.INDEX_STORAGE_PATH / f"{self.full_index_id}.pkl"
         self.metadata_path = config.INDEX_STORAGE_PATH / f"{self.full_index_id}.json"
+        self.tombstones_path = config.INDEX_STORAGE_PATH / f"{self.full_index_id}.tombstones.json"
+        self.wal_path = config.INDEX_STORAGE_PATH / f"{self.full_index_id}.wal"
+        self.lock_path = config.INDEX_STORAGE_PATH / f"{self.full_index_id}.lock"
+        
+        # Guards the index against concurrent mutation by background compaction
+        self._lock = threading.RLock()
+        self._compaction_thread: Optional[threading.Thread] = None
+        # Vectors of documents still being streamed in, not yet in the log
+        self._staged: Set[int] = set()
+        # Vectors of documents that failed midway, dropped by the next compaction
+        self._abandoned: Set[int] = set()
+        
+        # Other processes (e.g. server workers) may serve the same index. The
+        # lock file serializes their writes and holds a change counter, so
+        # each process reloads the index once another one has changed it.
+        self.lock_path.touch(exist_ok=True)
+        self._lock_file = open(self.lock_path, 'r+b')
+        self._lock_depth = 0
+        self._modified = False
+        self._version = 0
+        self._reloads = 0
+        self._loaded = False
+        
+        # Mutations since the last checkpoint are only recorded in the log
+        self.wal = WriteAheadLog(self.wal_path)
+        self._ops_since_checkpoint = 0
+        self._last_checkpoint = (
+            os.path.getmtime(self.metadata_path) if os.path.exists(self.metadata_path)
+            else time.time()
+        )
+        
+        with self._exclusive():
+            self._load_state()
+        self._loaded = True
+    
+    def _load_state(self):
+        """Load the index from disk and replay the write-ahead log on top of it."""
+        # Durable copy of every chunk vector, so rebuilds never re-embed
+        self.vector_store = VectorStore(config.INDEX_STORAGE_PATH / self.full_index_id)
+        
+        # Chunk texts and metadata, row i describing FAISS position i
+        self.chunks = ChunkStore(config.INDEX_STORAGE_PATH / self.full_index_id)
+        self._index_mapped = False
+        
+        # BM25 inverted index over the same chunks, keyed by chunk ID
+        self.lexical = LexicalIndex(config.INDEX_STORAGE_PATH / self.full_index_id)
         
         # Create or load the index
-        self.index = self._load_or_create_index()
         self.metadata = self._load_or_create_metadata()
+        self.tombstones = self._load_tombstones()
+        self.index = self._load_or_create_index()
+        self._load_or_create_lexical_index()
+        
+        self._replay_wal()
+    
+    def _lock_fileno(self) -> int:
+        """Get the lock file's descriptor, reopening it if the index was closed while in use."""
+        if self._lock_file.closed:
+            self._lock_file = open(self.lock_path, 'r+b')
+        return self._lock_file.fileno()
     
-    def _load_or_create_index(self) -> FAISS:
-        """Load existing index or create a new one."""
+    def _disk_version(self) -> int:
+        """Read the change counter shared by every process using the index."""
+        data = os.pread(self._lock_fileno(), 8, 0)
+        return int.from_bytes(data, 'little') if len(data) == 8 else 0
+    
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Hold the index against other threads and processes.
+        
+        Changes another process made since the index was last loaded are
+        loaded first. If the index is modified, the change counter is bumped
+        on release so other processes reload before they next use it.
+        """
+        with self._lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            
+            fcntl.flock(self._lock_fileno(), fcntl.LOCK_EX)
+            self._lock_depth = 1
+            try:
+                version = self._disk_version()
+                if version != self._version and self._loaded:
+                    logger.info(f"Reloading index {self.full_index_id} changed by another process")
+                    self._load_state()
+                    self._reloads += 1
+                self._version = version
+                self._modified = False
+                yield
+            finally:
+                try:
+                    if self._modified:
+                        self._version += 1
+                        os.pwrite(self._lock_fileno(), self._version.to_bytes(8, 'little'), 0)
+                        self._modified = False
+                finally:
+                    self._lock_depth = 0
+                    fcntl.flock(self._lock_fileno(), fcntl.LOCK_UN)
+    
+    def close(self):
+        """Release the index's lock file.
+        
+        A request or compaction still holding the index may keep using it;
+        the lock file is reopened if so.
+        """
+        with self._lock:
+            self._lock_file.close()
+    
+    def _refresh(self):
+        """Load changes another process made to the index, if there are any."""
+        if self._disk_version() != self._version:
+            with self._exclusive():
+                pass
+    
+    def _load_or_create_index(self) -> Optional[Any]:
+        """Load the existing index, rebuilding it from stored vectors if needed.
+        
+        The FAISS file and chunk store are memory-mapped, so loading does not
+        read the vectors or chunk texts into the heap.
+        
+        Returns:
+            The FAISS index, or None if nothing has been indexed yet
+        """
+        if not self.chunks.exists() and os.path.exists(self.docstore_path):
+            return self._load_legacy_index()
+        if not len(self.chunks):
+            logger.info("Creating new index")
+            return None
+            
         if os.path.exists(self.index_path):
             logger.info(f"Loading existing index from {self.index_path}")
             try:
-                index = FAISS.load_local(
-                    folder_path=str(self.index_path.parent),
-                    index_name=self.index_path.stem,
-                    embeddings=self.embeddings
-                )
+                index = faiss.read_index(str(self.index_path), _MMAP_FLAG)
+                if index.ntotal != len(self.chunks):
+                    raise ValueError("FAISS index and chunk store are out of sync")
+                self._index_mapped = bool(_MMAP_FLAG)
                 return index
             except Exception as e:
                 logger.error(f"Error loading index: {e}")
-                logger.info("Creating new index")
         
-        # Create new index with empty document list
-        return FAISS.from_texts([""], self.embeddings)
+        # Recover a missing or corrupt FAISS file from the vector store
+        try:
+            logger.info(f"Rebuilding index {self.full_index_id} from stored vectors")
+            self.index = self._rebuild_from_chunks()
+            self._save_state()
+            return self.index
+        except Exception as e:
+            logger.error(f"Error rebuilding index: {e}")
+            raise IndexError(f"Error loading index: {str(e)}")
+    
+    def _load_or_create_lexical_index(self):
+        """Build the lexical index from the chunk store if it is missing."""
+        if len(self.lexical) or not len(self.chunks):
+            return
+            
+        logger.info(f"Building lexical index for {self.full_index_id}")
+        chunk_ids = self.chunks.chunk_ids()
+        self.lexical.add(chunk_ids.tolist(), [self.chunks.text(pos) for pos in range(len(chunk_ids))])
+        self.lexical.save()
+    
+    def _rebuild_from_chunks(self) -> Optional[Any]:
+        """Rebuild the FAISS index over the chunk store from stored vectors.
+        
+        Returns:
+            The rebuilt FAISS index, or None if no live chunks remain
+        """
+        chunk_ids = self.chunks.chunk_ids()
+        live = np.array([
+            chunk_id not in self.tombstones and chunk_id in self.vector_store
+            for chunk_id in chunk_ids.tolist()
+        ], dtype=bool)
+        if not live.all():
+            self.chunks = self.chunks.select(np.flatnonzero(live))
+            chunk_ids = chunk_ids[live]
+            
+        if not len(chunk_ids):
+            return None
+        return backend.build_index(self.vector_store.get(chunk_ids), quantization=self.quantization)
+    
+    def _load_legacy_index(self) -> Optional[Any]:
+        """Convert an index saved as a pickled LangChain docstore to the chunk store.
+        
+        Returns:
+            The FAISS index, or None if the legacy index held no live chunks
+        """
+        logger.info(f"Converting index {self.full_index_id} to the chunk store")
+        try:
+            legacy = FAISS.load_local(
+                folder_path=str(self.index_path.parent),
+                index_name=self.index_path.stem,
+                embeddings=self.embeddings,
+                # The pickled docstore was written by this class only
+                allow_dangerous_deserialization=True
+            )
+            if not len(self.vector_store):
+                self._migrate_to_vector_store(legacy)
+            else:
+                docs = [
+                    legacy.docstore.search(doc_id)
+                    for _, doc_id in sorted(legacy.index_to_docstore_id.items())
+                ]
+                chunk_ids = [int(doc_id) for _, doc_id in sorted(legacy.index_to_docstore_id.items())]
+                self.chunks = self._chunks_from_documents(docs, chunk_ids)
+                self.index = legacy.index
+                
+            self._save_state()
+            Path(self.docstore_path).unlink(missing_ok=True)
+            return self.index
+        except Exception as e:
+            logger.error(f"Error converting legacy index: {e}")
+            raise IndexError(f"Error loading index: {str(e)}")
+    
+    def _chunks_from_documents(self, docs: List[Any], chunk_ids: List[int]) -> ChunkStore:
+        """Build a chunk store from LangChain documents in position order.
+        
+        Consecutive chunks of the same file version share one metadata entry.
+        """
+        store = ChunkStore(self.chunks.path_prefix, load=False)
+        chunk_fields = ('file_id', 'chunk_id', 'chunk_index', 'chunk_count')
+        group = None
+        for doc, chunk_id in zip(docs, chunk_ids):
+            file_id = doc.metadata.get('file_id')
+            chunk_index = doc.metadata.get('chunk_index', 0)
+            chunk_count = doc.metadata.get('chunk_count', 1)
+            metadata = {k: v for k, v in doc.metadata.items() if k not in chunk_fields}
+            
+            key = (file_id, chunk_count, json.dumps(metadata, sort_keys=True))
+            if group is None or group['key'] != key or chunk_index <= group['indexes'][-1]:
+                if group is not None:
+                    store.append(group['file_id'], group['metadata'], group['ids'], group['texts'],
+                                 group['indexes'], group['count'])
+                group = {'key': key, 'file_id': file_id, 'metadata': metadata, 'count': chunk_count,
+                         'ids': [], 'texts': [], 'indexes': []}
+            group['ids'].append(chunk_id)
+            group['texts'].append(doc.page_content)
+            group['indexes'].append(chunk_index)
+            
+        if group is not None:
+            store.append(group['file_id'], group['metadata'], group['ids'], group['texts'],
+                         group['indexes'], group['count'])
+        return store
+    
+    def _migrate_to_vector_store(self, legacy: FAISS):
+        """Move an index created before the vector store onto integer chunk IDs.
+        
+        Vectors are read back out of the flat FAISS index, so the migration
+        needs no embedding calls. Tombstoned chunks and the empty placeholder
+        document older indices were seeded with are dropped along the way.
+        
+        Args:
+            legacy: The loaded LangChain FAISS index
+        """
+        logger.info(f"Migrating index {self.full_index_id} to the vector store")
+        vectors = legacy.index.reconstruct_n(0, legacy.index.ntotal)
+        
+        docs, rows = [], []
+        file_chunks = defaultdict(list)
+        for position, doc_id in sorted(legacy.index_to_docstore_id.items()):
+            doc = legacy.docstore.search(doc_id)
+            file_id = doc.metadata.get('file_id')
+            if file_id not in self.metadata or doc_id in self.tombstones:
+                continue
+                
+            chunk_id = len(rows)
+            file_chunks[file_id].append((doc.metadata.get('chunk_index', 0), chunk_id))
+            docs.append(doc)
+            rows.append(position)
+            
+        for file_id, entry in self.metadata.items():
+            entry['chunk_ids'] = [chunk_id for _, chunk_id in sorted(file_chunks[file_id])]
+            
+        chunk_ids = list(range(len(rows)))
+        self.chunks = self._chunks_from_documents(docs, chunk_ids)
+        if rows:
+            self.vector_store.append(chunk_ids, vectors[rows])
+            self.index = backend.build_index(vectors[rows], quantization=self.quantization)
+        else:
+            self.index = None
+        self.tombstones.clear()
     
     def _load_or_create_metadata(self) -> Dict[str, Dict[str, Any]]:
         """Load existing metadata or create a new metadata store."""
@@ -86,28 +404,177 @@ class DocumentIndex:
         # Create new empty metadata store
         return {}
     
+    def _load_tombstones(self) -> Set[int]:
+        """Load the set of removed chunk IDs awaiting compaction."""
+        if os.path.exists(self.tombstones_path):
+            try:
+                with open(self.tombstones_path, 'r') as f:
+                    return set(json.load(f))
+            except Exception as e:
+                logger.error(f"Error loading tombstones: {e}")
+        
+        return set()
+    
+    def _replay_wal(self):
+        """Apply mutations logged since the last checkpoint.
+        
+        Records are keyed by chunk ID, so replaying a record whose effect
+        already reached the checkpoint is a no-op.
+        """
+        replayed = 0
+        for record in self.wal.replay():
+            chunk_ids = record['chunk_ids']
+            if record['op'] == 'add':
+                if not all(chunk_id in self.vector_store for chunk_id in chunk_ids):
+                    # Vectors were dropped by a compaction, so the chunks are dead
+                    continue
+                if chunk_ids[0] in self.chunks:
+                    # The checkpoint may have stopped before the lexical index
+                    if chunk_ids[0] not in self.lexical:
+                        self.lexical.add(chunk_ids, record['chunks'])
+                    continue
+                self._apply_add(
+                    record['file_id'],
+                    record['chunks'],
+                    chunk_ids,
+                    record['metadata']
+                )
+            elif record['op'] == 'remove':
+                self._apply_remove(record['file_id'], chunk_ids)
+            elif record['op'] == 'metadata':
+                self._apply_metadata(record['file_id'], chunk_ids, record['metadata'])
+            replayed += 1
+            
+        if replayed:
+            logger.info(f"Replayed {replayed} logged operations for index {self.full_index_id}")
+        self._ops_since_checkpoint = replayed
+    
+    def _write_json(self, path: Path, data: Any):
+        """Atomically replace a JSON file."""
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    
     def _save_metadata(self):
         """Save metadata to disk."""
-        with open(self.metadata_path, 'w') as f:
-            json.dump(self.metadata, f)
+        self._write_json(self.metadata_path, self.metadata)
+    
+    def _save_tombstones(self):
+        """Save tombstones to disk."""
+        self._write_json(self.tombstones_path, sorted(self.tombstones))
+    
+    def _save_index(self):
+        """Save the FAISS index and chunk store to disk."""
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        faiss.write_index(self.index, str(tmp_path))
+        os.replace(tmp_path, self.index_path)
+        self.chunks.save()
+    
+    def _ensure_writable(self):
+        """Copy a memory-mapped FAISS index onto the heap before mutating it."""
+        if self._index_mapped:
+            self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+            self._index_mapped = False
+    
+    def _save_state(self):
+        """Write the index, chunk store, metadata and tombstones to disk."""
+        if self.index is not None:
+            self._save_index()
+        else:
+            # Every chunk was compacted away
+            Path(self.index_path).unlink(missing_ok=True)
+            self.chunks.save()
+        self.lexical.save()
+        self._save_metadata()
+        self._save_tombstones()
+    
+    def checkpoint(self):
+        """Write the full index state to disk and truncate the write-ahead log."""
+        with self._exclusive():
+            self._modified = True
+            self._save_state()
+            self.wal.truncate()
+            self._ops_since_checkpoint = 0
+            self._last_checkpoint = time.time()
+    
+    def _maybe_checkpoint(self):
+        """Checkpoint once enough operations or time have accumulated in the log."""
+        self._ops_since_checkpoint += 1
+        if (
+            self._ops_since_checkpoint >= config.INDEX_CHECKPOINT_OPS
+            or time.time() - self._last_checkpoint >= config.INDEX_CHECKPOINT_INTERVAL
+        ):
+            self.checkpoint()
+    
+    def _get_chunk_ids(self, file_id: str) -> List[int]:
+        """Get the IDs of all chunks belonging to a file.
+        
+        Args:
+            file_id: Unique identifier for the file
+            
+        Returns:
+            List of chunk IDs
+        """
+        return self.metadata.get(file_id, {}).get('chunk_ids', [])
+    
+    def _get_reusable_vectors(self, file_id: str) -> Dict[str, np.ndarray]:
+        """Get stored vectors of a file's current chunks, keyed by chunk text.
+        
+        Args:
+            file_id: Unique identifier for the file
+            
+        Returns:
+            Dict mapping chunk text to its stored vector
+        """
+        chunk_ids = [
+            chunk_id for chunk_id in self._get_chunk_ids(file_id)
+            if chunk_id in self.vector_store
+        ]
+        positions = self.chunks.positions(chunk_ids)
+        vectors = self.vector_store.get(chunk_ids)
+        return {
+            self.chunks.text(position): vector
+            for position, vector in zip(positions, vectors) if position != -1
+        }
+    
+    def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed chunk or query texts in as few token-limited requests as possible, sent concurrently.
+        
+        OpenAI requests go through the engine, which applies the API key's
+        rate limits and retries throttled requests, for searches as well as
+        for ingest.
+        """
+        if self.engine is None:
+            return self.embeddings.embed_documents(texts)
+        return self.batcher.embed_concurrently(texts, self.engine)
     
     def add_document(
         self, 
         file_id: str, 
-        chunks: List[str],
+        chunks: Iterable[str],
         metadata: Optional[Dict[str, Any]] = None
-    ):
+    ) -> int:
         """Add a document to the index.
         
+        Re-adding a file that is already indexed supersedes its old chunks.
+        Chunks whose text is unchanged reuse their stored vectors, and chunks
+        embedded before by any index are served from the embedding cache,
+        instead of being embedded again.
+        
+        Chunks may be streamed, e.g. from :meth:`DocumentProcessor.iter_chunks`.
+        They are embedded in batches while the next batch is extracted, and
+        each batch's vectors go straight to the vector store. The file only
+        becomes searchable once all of its chunks are stored.
+        
         Args:
             file_id: Unique identifier for the file
-            chunks: List of text chunks to index
+            chunks: Text chunks to index, as a list or an iterator
             metadata: Optional metadata about the file
-        """
-        if not chunks:
-            logger.warning(f"No chunks to index for file {file_id}")
-            return
             
+        Returns:
+            int: Number of chunks indexed
+        """
         # Add metadata
         if not metadata:
             metadata = {}
@@ -116,85 +583,392 @@ class DocumentIndex:
         if self.tenant_id and 'tenant_id' not in metadata:
             metadata['tenant_id'] = self.tenant_id
             
-        self.metadata[file_id] = {
-            'chunk_count': len(chunks),
-            'metadata': metadata
-        }
-        
-        # Create document-specific metadata for each chunk
-        chunk_metadatas = []
-        for i, chunk in enumerate(chunks):
-            chunk_metadata = {
-                'file_id': file_id,
-                'chunk_index': i,
-                'chunk_count': len(chunks),
-                **metadata
-            }
-            chunk_metadatas.append(chunk_metadata)
-            
-        # Add chunks to index
+        texts: List[str] = []
+        chunk_ids: List[int] = []
+        staged: List[int] = []
         try:
-            self.index.add_texts(chunks, metadatas=chunk_metadatas)
-            logger.info(f"Added {len(chunks)} chunks for file {file_id} to the index")
+            self._refresh()
+            reusable = self._get_reusable_vectors(file_id)
+            # One batch is embedded while the caller extracts the next
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                pending = None
+                for batch in self._iter_batches(chunks):
+                    texts.extend(batch)
+                    stored = executor.submit(self._store_batch, batch, reusable, staged)
+                    if pending is not None:
+                        chunk_ids.extend(pending.result())
+                    pending = stored
+                if pending is not None:
+                    chunk_ids.extend(pending.result())
+        except Exception as e:
+            logger.error(f"Error embedding document: {e}")
+            with self._lock:
+                self._staged.difference_update(staged)
+                self._abandoned.update(staged)
+            raise IndexError(f"Error adding document to index: {str(e)}")
             
-            # Save metadata
-            self._save_metadata()
+        if not texts:
+            logger.warning(f"No chunks to index for file {file_id}")
+            return 0
             
-            # Save index
-            self.index.save_local(
-                folder_path=str(self.index_path.parent),
-                index_name=self.index_path.stem
+        # Add chunks to index
+        with self._exclusive():
+            try:
+                # The log record is durable before the in-memory update
+                self._modified = True
+                self.wal.append({
+                    'op': 'add',
+                    'file_id': file_id,
+                    'chunk_ids': chunk_ids,
+                    'chunks': texts,
+                    'metadata': metadata
+                })
+                self._apply_add(file_id, texts, chunk_ids, metadata)
+                logger.info(f"Added {len(texts)} chunks for file {file_id} to the index")
+                
+                self._maybe_checkpoint()
+            except Exception as e:
+                logger.error(f"Error adding document to index: {e}")
+                raise IndexError(f"Error adding document to index: {str(e)}")
+            finally:
+                self._staged.difference_update(staged)
+                
+        if self.needs_rebuild():
+            self.schedule_compaction(rebuild=True)
+        return len(texts)
+    
+    def _iter_batches(self, chunks: Iterable[str]) -> Iterator[List[str]]:
+        """Group chunks into lists of at most the configured stream batch size."""
+        chunks = iter(chunks)
+        while True:
+            batch = list(itertools.islice(chunks, config.INDEX_STREAM_BATCH_CHUNKS))
+            if not batch:
+                return
+            yield batch
+    
+    def _store_batch(
+        self,
+        chunks: List[str],
+        reusable: Dict[str, np.ndarray],
+        staged: List[int]
+    ) -> List[int]:
+        """Embed a batch of chunks and append their vectors to the vector store.
+        
+        Args:
+            chunks: Chunk texts
+            reusable: Stored vectors of the file's current chunks, keyed by text
+            staged: IDs staged by the current document, extended with the new ones
+            
+        Returns:
+            List[int]: IDs assigned to the chunks
+        """
+        # Embed only chunk texts that have no stored or cached vector yet
+        missing = list(dict.fromkeys(chunk for chunk in chunks if chunk not in reusable))
+        embedded = {}
+        if missing:
+            embedded = dict(zip(missing, embedding_cache.embed(
+                embedding_key(self.embeddings), missing, self._embed_documents
+            )))
+        vectors = np.stack([
+            reusable[chunk] if chunk in reusable else embedded[chunk] for chunk in chunks
+        ])
+        
+        # IDs are allocated under the inter-process lock, so they are unique
+        # across every process using the index
+        with self._exclusive():
+            self._modified = True
+            first_id = self.vector_store.next_id
+            chunk_ids = list(range(first_id, first_id + len(chunks)))
+            self.vector_store.append(chunk_ids, vectors)
+            # Compaction must keep these vectors until the document is committed
+            self._staged.update(chunk_ids)
+            staged.extend(chunk_ids)
+        return chunk_ids
+    
+    def _apply_add(
+        self,
+        file_id: str,
+        chunks: List[str],
+        chunk_ids: List[int],
+        metadata: Dict[str, Any]
+    ):
+        """Add chunks whose vectors are stored to the in-memory index and metadata."""
+        self.chunks.append(file_id, metadata, chunk_ids, chunks)
+        self.lexical.add(chunk_ids, chunks)
+        if self.index is None:
+            self.index = backend.build_index(
+                self.vector_store.get(chunk_ids), quantization=self.quantization
             )
-        except Exception as e:
-            logger.error(f"Error adding document to index: {e}")
-            raise IndexError(f"Error adding document to index: {str(e)}")
+        else:
+            self._ensure_writable()
+            for start in range(0, len(chunk_ids), config.INDEX_STREAM_BATCH_CHUNKS):
+                self.index.add(self.vector_store.get(
+                    chunk_ids[start:start + config.INDEX_STREAM_BATCH_CHUNKS]
+                ))
+            
+        # Chunks from a previous version of the same file are superseded
+        if file_id in self.metadata:
+            self.tombstones.update(self._get_chunk_ids(file_id))
+            
+        self.metadata[file_id] = {
+            'chunk_count': len(chunks),
+            'chunk_ids': chunk_ids,
+            'metadata': metadata
+        }
     
     def remove_document(self, file_id: str):
         """Remove a document from the index.
         
+        The document's chunks are tombstoned rather than deleted, so removal
+        never touches the FAISS index or the embedding API. Tombstoned chunks
+        are excluded from search and physically dropped by :meth:`compact`.
+        
         Args:
             file_id: Unique identifier for the file to remove
         """
-        if file_id not in self.metadata:
-            logger.warning(f"File {file_id} not found in index")
+        with self._exclusive():
+            if file_id not in self.metadata:
+                logger.warning(f"File {file_id} not found in index")
+                return
+                
+            chunk_ids = self._get_chunk_ids(file_id)
+            self._modified = True
+            self.wal.append({'op': 'remove', 'file_id': file_id, 'chunk_ids': chunk_ids})
+            self._apply_remove(file_id, chunk_ids)
+            self._maybe_checkpoint()
+        
+        logger.info(f"Removed file {file_id} from index")
+        
+        if self.needs_compaction():
+            self.schedule_compaction()
+    
+    def update_document_metadata(self, file_id: str, metadata: Dict[str, Any]) -> bool:
+        """Merge new metadata into an indexed document's metadata.
+        
+        Only the file's shared metadata entry changes, and only the patch is
+        logged, so updates need neither the document nor the embedding API.
+        Keys the index sets itself (tenant, file and chunk IDs) are ignored.
+        
+        Args:
+            file_id: Unique identifier for the file
+            metadata: Metadata keys to set
+            
+        Returns:
+            bool: True if the document is indexed
+        """
+        patch = {k: v for k, v in metadata.items() if k not in RESERVED_METADATA_KEYS}
+        with self._exclusive():
+            if file_id not in self.metadata:
+                logger.warning(f"File {file_id} not found in index")
+                return False
+                
+            chunk_ids = self._get_chunk_ids(file_id)
+            self._modified = True
+            self.wal.append({
+                'op': 'metadata',
+                'file_id': file_id,
+                'chunk_ids': chunk_ids,
+                'metadata': patch
+            })
+            self._apply_metadata(file_id, chunk_ids, patch)
+            self._maybe_checkpoint()
+            
+        logger.info(f"Updated metadata of file {file_id} in index")
+        return True
+    
+    def _apply_metadata(self, file_id: str, chunk_ids: List[int], patch: Dict[str, Any]):
+        """Merge a metadata patch into the file version owning the chunks."""
+        if file_id not in self.metadata or self._get_chunk_ids(file_id) != chunk_ids:
+            # The patched version was superseded or removed since
             return
+        entry = self.metadata[file_id]
+        entry['metadata'] = {**entry['metadata'], **patch}
+        if chunk_ids:
+            self.chunks.update_metadata(chunk_ids[0], entry['metadata'])
+    
+    def _apply_remove(self, file_id: str, chunk_ids: List[int]):
+        """Tombstone a file's chunks and drop its metadata."""
+        self.tombstones.update(chunk_ids)
+        
+        # A later re-add of the same file owns different chunks and stays
+        if file_id in self.metadata and self._get_chunk_ids(file_id) == chunk_ids:
+            del self.metadata[file_id]
+    
+    def needs_compaction(self) -> bool:
+        """Check whether tombstones make up enough of the index to compact it.
+        
+        Returns:
+            bool: True if the tombstone ratio exceeds the configured threshold
+        """
+        if not self.tombstones:
+            return False
+        total = max(self.index.ntotal if self.index is not None else 0, 1)
+        return len(self.tombstones) / total >= config.INDEX_COMPACTION_RATIO
+    
+    def needs_rebuild(self) -> bool:
+        """Check whether the index type or encoding no longer suits the index.
+        
+        Returns:
+            bool: True if the index should be rebuilt as a different type
+        """
+        if self.index is None:
+            return False
+        live = self.index.ntotal - len(self.tombstones)
+        return backend.needs_rebuild(self.index, live, self.quantization)
+    
+    def compact(self, rebuild: bool = False) -> int:
+        """Physically drop tombstoned chunks from the index.
+        
+        Flat indices delete vectors in place. HNSW and IVF indices, or any
+        index whose type no longer fits its size, are rebuilt from the vector
+        store instead. No embeddings are recomputed either way.
+        
+        Args:
+            rebuild: Rebuild the index even if it could be compacted in place
+        
+        Returns:
+            int: Number of chunks removed
+        """
+        with self._exclusive():
+            if not self.tombstones and not rebuild and not self.needs_rebuild():
+                return 0
+            if self.index is None or (
+                not rebuild and backend.supports_removal(self.index)
+                and not self.needs_rebuild()
+            ):
+                return self._compact_in_place()
+                
+            try:
+                reloads = self._reloads
+                dead = set(self.tombstones)
+                snapshot_size = len(self.chunks)
+                chunk_ids = self.chunks.chunk_ids()
+                live = np.flatnonzero(~np.isin(chunk_ids, list(dead)))
+                chunks = self.chunks.select(live)
+                vectors = self.vector_store.get(chunk_ids[live])
+            except Exception as e:
+                logger.error(f"Error compacting index: {e}")
+                raise IndexError(f"Error compacting index: {str(e)}")
+                
+        # Building a graph or training lists is slow, so searches keep
+        # using the current index until the new one is swapped in
+        try:
+            index = backend.build_index(vectors, quantization=self.quantization) if len(live) else None
+        except Exception as e:
+            logger.error(f"Error rebuilding index: {e}")
+            raise IndexError(f"Error compacting index: {str(e)}")
             
-        # Since FAISS doesn't support removal, we need to rebuild the index
-        # Get all documents except the one to remove
-        all_docs = []
-        all_metadatas = []
-        
-        # Find documents that are not the one to remove
-        for i, metadata in enumerate(self.index.docstore._dict.values()):
-            if metadata.metadata.get('file_id') != file_id:
-                all_docs.append(metadata.page_content)
-                all_metadatas.append(metadata.metadata)
-        
-        # Create new index with remaining documents
-        if all_docs:
-            new_index = FAISS.from_texts(all_docs, self.embeddings, metadatas=all_metadatas)
-            self.index = new_index
-        else:
-            # If no documents left, create an empty index
-            self.index = FAISS.from_texts([""], self.embeddings)
+        with self._exclusive():
+            if self._reloads != reloads:
+                # The snapshot predates another process's changes, so the
+                # tombstones are kept for the next compaction
+                logger.info(f"Abandoned compaction of index {self.full_index_id} changed by another process")
+                return 0
+                
+            try:
+                # Catch up with chunks added while the index was being built
+                added = np.arange(snapshot_size, len(self.chunks))
+                if len(added):
+                    chunks.extend(self.chunks, added)
+                    vectors = self.vector_store.get(self.chunks.chunk_ids(added))
+                    if index is None:
+                        index = backend.build_index(vectors, quantization=self.quantization)
+                    else:
+                        index.add(vectors)
+                        
+                # Carry over metadata patched after the snapshot was taken
+                for file_id, entry in self.metadata.items():
+                    if entry['chunk_ids']:
+                        chunks.update_metadata(entry['chunk_ids'][0], entry['metadata'])
+                        
+                self.index = index
+                self.chunks = chunks
+                self._index_mapped = False
+                self.tombstones -= dead
+                self._finish_compaction(dead)
+            except Exception as e:
+                logger.error(f"Error compacting index: {e}")
+                raise IndexError(f"Error compacting index: {str(e)}")
+                
+        removed = snapshot_size - len(live)
+        logger.info(f"Rebuilt index {self.full_index_id}: removed {removed} chunks")
+        return removed
+    
+    def _compact_in_place(self) -> int:
+        """Delete tombstoned chunks from a flat index without rebuilding it."""
+        dead = np.empty(0, dtype=np.int64)
+        if self.index is not None:
+            dead = self._dead_positions()
+        
+        try:
+            if len(dead):
+                # Deletion shifts later FAISS positions down, like the chunk rows
+                self._ensure_writable()
+                self.index.remove_ids(faiss.IDSelectorBatch(dead))
+                self.chunks = self.chunks.select(
+                    np.setdiff1d(np.arange(len(self.chunks)), dead)
+                )
+            removed = set(self.tombstones)
+            self.tombstones.clear()
+            self._finish_compaction(removed)
+        except Exception as e:
+            logger.error(f"Error compacting index: {e}")
+            raise IndexError(f"Error compacting index: {str(e)}")
             
-        # Remove from metadata
-        del self.metadata[file_id]
-        self._save_metadata()
+        logger.info(f"Compacted index {self.full_index_id}: removed {len(dead)} chunks")
+        return len(dead)
+    
+    def _finish_compaction(self, removed: Set[int]):
+        """Persist a compacted index and drop the vectors of removed chunks.
         
-        # Save index
-        self.index.save_local(
-            folder_path=str(self.index_path.parent),
-            index_name=self.index_path.stem
-        )
+        Only vectors known to be dead are dropped. Any other vector may
+        belong to a document another process is still streaming in.
         
-        logger.info(f"Removed file {file_id} from index")
+        Args:
+            removed: IDs of the chunks the compaction dropped
+        """
+        if self.index is not None and not self.index.ntotal:
+            self.index = None
+        self.lexical.retain(self.chunks.chunk_ids().tolist())
+        self.checkpoint()
+        dropped = (removed | self._abandoned) - self._staged
+        ids = self.vector_store.ids
+        self.vector_store.retain(ids[~np.isin(ids, list(dropped))].tolist())
+        self._abandoned.clear()
+    
+    def schedule_compaction(self, rebuild: bool = False):
+        """Run :meth:`compact` in a background thread unless one is already running.
+        
+        Args:
+            rebuild: Rebuild the index even if it could be compacted in place
+        """
+        with self._lock:
+            if self._compaction_thread and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(
+                target=self._run_compaction,
+                args=(rebuild,),
+                name=f"s4-compact-{self.full_index_id}",
+                daemon=True
+            )
+            self._compaction_thread.start()
+    
+    def _run_compaction(self, rebuild: bool = False):
+        """Background compaction entry point."""
+        try:
+            self.compact(rebuild=rebuild)
+        except IndexError:
+            # Tombstones are kept, so the next compaction will retry
+            pass
     
     def search(
         self, 
         query: str, 
         limit: int = 5,
-        filter_by_file_id: Optional[str] = None
+        filter_by_file_id: Optional[str] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        mode: str = "vector"
     ) -> List[Dict[str, Any]]:
         """Search the index for documents matching the query.
         
@@ -202,54 +976,336 @@ class DocumentIndex:
             query: The search query
             limit: Maximum number of results to return
             filter_by_file_id: Optional file ID to restrict search to
+            nprobe: Optional number of IVF lists to visit for this query
+            ef_search: Optional HNSW search beam width for this query
+            mode: ``"vector"`` for semantic search, ``"lexical"`` for BM25
+                keyword search without embedding the query, or ``"hybrid"``
+                to fuse both rankings by reciprocal rank
             
         Returns:
-            List of dictionaries with document chunks and metadata
+            List of dictionaries with document chunks and metadata. The score
+            is the vector distance, the BM25 score or the fused RRF score.
         """
-        # Define filter function based on criteria
-        filter_conditions = []
-        
-        # Add tenant filter if in multi-tenant mode
-        if self.tenant_id:
-            filter_conditions.append(lambda metadata: metadata.get('tenant_id') == self.tenant_id)
-            
-        # Add file ID filter if specified
-        if filter_by_file_id:
-            filter_conditions.append(lambda metadata: metadata.get('file_id') == filter_by_file_id)
-           
-        # Combine filters if needed
-        filter_fn = None
-        if filter_conditions:
-            if len(filter_conditions) == 1:
-                filter_fn = filter_conditions[0]
-            else:
-                # Apply all filters (logical AND)
-                filter_fn = lambda metadata: all(
-                    condition(metadata) for condition in filter_conditions
+        if mode not in SEARCH_MODES:
+            raise IndexError(f"Unknown search mode: {mode}")
+        self._refresh()
+        if self.index is None:
+            return []
+            
+        try:
+            vectors = None
+            if mode != "lexical":
+                vectors = np.asarray(
+                    query_cache.get_many(embedding_key(self.embeddings), [query], self._embed_documents),
+                    dtype=np.float32
                 )
+            return self._run_searches(
+                [query], vectors, [filter_by_file_id], limit, mode, nprobe, ef_search
+            )[0]
+        except Exception as e:
+            logger.error(f"Error searching index: {e}")
+            raise IndexError(f"Error searching index: {str(e)}")
+    
+    def search_batch(
+        self,
+        queries: List[Dict[str, Any]],
+        limit: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        mode: str = "vector"
+    ) -> List[List[Dict[str, Any]]]:
+        """Run many searches with one embedding request and one index scan.
+        
+        Queries sharing a file filter are answered by a single matrix search,
+        so latency grows far slower than the number of queries.
+        
+        Args:
+            queries: Dictionaries with a ``query`` and an optional ``file_id`` filter
+            limit: Maximum number of results per query
+            nprobe: Optional number of IVF lists to visit
+            ef_search: Optional HNSW search beam width
+            mode: ``"vector"``, ``"lexical"`` or ``"hybrid"``, as for :meth:`search`
+            
+        Returns:
+            One list of results per query, in the order of ``queries``
+        """
+        if mode not in SEARCH_MODES:
+            raise IndexError(f"Unknown search mode: {mode}")
+        self._refresh()
+        if self.index is None or not queries:
+            return [[] for _ in queries]
             
-        # Perform the search
         try:
-            results = self.index.similarity_search_with_score(
-                query, 
-                k=limit,
-                filter=filter_fn
+            texts = [query['query'] for query in queries]
+            vectors = None
+            if mode != "lexical":
+                vectors = np.asarray(
+                    query_cache.get_many(embedding_key(self.embeddings), texts, self._embed_documents),
+                    dtype=np.float32
+                )
+            return self._run_searches(
+                texts, vectors, [query.get('file_id') for query in queries],
+                limit, mode, nprobe, ef_search
             )
-            
-            # Format results
-            formatted_results = []
-            for doc, score in results:
-                formatted_results.append({
-                    'content': doc.page_content,
-                    'score': float(score),  # Convert numpy float to Python float
-                    'metadata': doc.metadata
-                })
-                
-            return formatted_results
         except Exception as e:
             logger.error(f"Error searching index: {e}")
             raise IndexError(f"Error searching index: {str(e)}")
     
+    def _run_searches(
+        self,
+        texts: List[str],
+        vectors: Optional[np.ndarray],
+        file_ids: List[Optional[str]],
+        limit: int,
+        mode: str,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Search for embedded queries, one matrix search per distinct file filter."""
+        groups: Dict[Optional[str], List[int]] = defaultdict(list)
+        for row, file_id in enumerate(file_ids):
+            groups[file_id].append(row)
+            
+        results: List[List[Dict[str, Any]]] = [[] for _ in texts]
+        fetch = max(limit, config.INDEX_HYBRID_CANDIDATES) if mode == "hybrid" else limit
+        with self._lock:
+            for file_id, rows in groups.items():
+                allowed = self._filter_positions(file_id)
+                if allowed is not None and not len(allowed):
+                    continue
+                    
+                if mode != "lexical":
+                    vector_results = self._search_vectors(
+                        vectors[rows], fetch, allowed,
+                        nprobe=nprobe if nprobe is not None else self.nprobe,
+                        ef_search=ef_search if ef_search is not None else self.ef_search
+                    )
+                for i, row in enumerate(rows):
+                    if mode == "vector":
+                        scores, positions = vector_results[i]
+                    else:
+                        scores, positions = self._search_lexical(texts[row], fetch, allowed)
+                        if mode == "hybrid":
+                            scores, positions = self._fuse_rankings(
+                                [vector_results[i][1], positions], limit
+                            )
+                            
+                    # Format results
+                    for score, position in zip(scores, positions):
+                        results[row].append({
+                            'content': self.chunks.text(position),
+                            'score': float(score),  # Convert numpy float to Python float
+                            'metadata': self.chunks.metadata(position)
+                        })
+        return results
+    
+    def _search_vectors(
+        self,
+        vectors: np.ndarray,
+        limit: int,
+        allowed: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Find the nearest live chunks to each of a batch of query vectors.
+        
+        All queries are answered by a single matrix search. Quantized indices
+        are over-fetched and the candidates re-ranked against the
+        full-precision vectors in the vector store, so returned scores are
+        always exact distances.
+        
+        Args:
+            vectors: Query vectors as an n x dim float32 matrix
+            limit: Maximum number of results per query
+            allowed: Optional positions from :meth:`_filter_positions`, shared by all queries
+            nprobe: Optional number of IVF lists to visit
+            ef_search: Optional HNSW search beam width
+            
+        Returns:
+            One tuple of (distances, FAISS positions) per query, nearest first
+        """
+        if allowed is not None and (
+            not backend.supports_selectors(self.index)
+            or (
+                backend.get_index_type(self.index) != backend.FLAT
+                and backend.select_index_type(len(allowed)) == backend.FLAT
+            )
+        ):
+            # Small filtered subsets are scanned exactly, since graph
+            # traversal or probed lists can miss most of them
+            all_scores, all_rows = faiss.knn(
+                vectors,
+                self.vector_store.get(self.chunks.chunk_ids(allowed)),
+                min(limit, len(allowed))
+            )
+            results = []
+            for scores, rows in zip(all_scores, all_rows):
+                rows = rows[rows != -1]
+                results.append((scores[:len(rows)], allowed[rows]))
+            return results
+            
+        quantized = backend.get_quantization(self.index) is not None
+        fetch = limit * config.INDEX_RERANK_FACTOR if quantized else limit
+        if backend.supports_selectors(self.index):
+            selector = self._build_selector(allowed)
+        else:
+            # Tombstoned chunks are dropped after the search instead
+            selector = None
+            fetch += len(self.tombstones)
+            
+        params = backend.search_parameters(self.index, selector, nprobe=nprobe, ef_search=ef_search)
+        fetch = max(min(fetch, self.index.ntotal), 1)
+        all_scores, all_positions = self.index.search(vectors, fetch, params=params)
+        dead = np.fromiter(self.tombstones, dtype=np.int64, count=len(self.tombstones))
+        
+        results = []
+        for vector, scores, positions in zip(vectors, all_scores, all_positions):
+            # Fewer matching chunks than requested come back as -1
+            found = positions != -1
+            scores, positions = scores[found], positions[found]
+            chunk_ids = self.chunks.chunk_ids(positions)
+            if len(dead):
+                live = ~np.isin(chunk_ids, dead)
+                scores, positions, chunk_ids = scores[live], positions[live], chunk_ids[live]
+            
+            if quantized and len(positions):
+                exact = vector - self.vector_store.get(chunk_ids)
+                scores = np.einsum('ij,ij->i', exact, exact)
+                order = np.argsort(scores, kind='stable')
+                scores, positions = scores[order], positions[order]
+                
+            results.append((scores[:limit], positions[:limit]))
+        return results
+    
+    def _search_lexical(
+        self,
+        query: str,
+        limit: int,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Rank live chunks by BM25 score for a query.
+        
+        Args:
+            query: The search query
+            limit: Maximum number of results to return
+            allowed: Optional positions from :meth:`_filter_positions`
+            
+        Returns:
+            Tuple of (BM25 scores, FAISS positions), best match first
+        """
+        allowed_ids = self.chunks.chunk_ids(allowed) if allowed is not None else None
+        chunk_ids, scores = self.lexical.search(query, limit, allowed=allowed_ids, excluded=self.tombstones)
+        positions = self.chunks.positions(chunk_ids)
+        found = positions != -1
+        return scores[found], positions[found]
+    
+    def _fuse_rankings(self, rankings: List[np.ndarray], limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Merge rankings of positions by reciprocal rank fusion.
+        
+        Args:
+            rankings: Positions ranked best first, one array per retriever
+            limit: Maximum number of results to return
+            
+        Returns:
+            Tuple of (fused scores, FAISS positions), best match first
+        """
+        fused: Dict[int, float] = defaultdict(float)
+        for ranking in rankings:
+            for rank, position in enumerate(ranking.tolist()):
+                fused[position] += 1.0 / (config.INDEX_RRF_K + rank + 1)
+                
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+        scores = np.array([score for _, score in ranked], dtype=np.float64)
+        positions = np.array([position for position, _ in ranked], dtype=np.int64)
+        return scores, positions
+    
+    def measure_recall(self, k: int = 10, num_queries: int = 100) -> float:
+        """Measure recall@k of the index against an exact full-precision scan.
+        
+        Queries are sampled from the stored vectors of live chunks, so this
+        needs no embedding calls. It reports how much search quality an ANN
+        index type or vector encoding gives up.
+        
+        Args:
+            k: Number of nearest neighbours compared per query
+            num_queries: Number of sampled query vectors
+            
+        Returns:
+            float: Share of exact top-k neighbours the index returns
+        """
+        self._refresh()
+        with self._lock:
+            if self.index is None:
+                return 1.0
+            live = np.setdiff1d(np.arange(len(self.chunks)), self._dead_positions())
+            if not len(live):
+                return 1.0
+            k = min(k, len(live))
+            vectors = self.vector_store.get(self.chunks.chunk_ids(live))
+            rng = np.random.default_rng(0)
+            queries = vectors[rng.choice(len(live), min(num_queries, len(live)), replace=False)]
+            _, exact_rows = faiss.knn(queries, vectors, k)
+            
+            results = self._search_vectors(queries, k, nprobe=self.nprobe, ef_search=self.ef_search)
+            found = 0
+            for rows, (_, positions) in zip(exact_rows, results):
+                found += len(np.intersect1d(live[rows], positions))
+        return found / (len(queries) * k)
+    
+    def _dead_positions(self) -> np.ndarray:
+        """Get the positions of tombstoned chunks that are still in the index."""
+        positions = self.chunks.positions(self.tombstones)
+        return positions[positions != -1]
+    
+    def _filter_positions(self, file_id: Optional[str] = None) -> Optional[np.ndarray]:
+        """Resolve the tenant and file filters to the positions a search may return.
+        
+        Args:
+            file_id: Optional file ID to restrict search to
+            
+        Returns:
+            np.ndarray of live positions, or None if every live chunk may match
+        """
+        # Tenant filter only matters if chunks of another tenant are present
+        tenant_positions = None
+        if self.tenant_id:
+            tenant_positions = self.chunks.positions_with_metadata('tenant_id', self.tenant_id)
+            if len(tenant_positions) == len(self.chunks):
+                tenant_positions = None
+                
+        if file_id is not None:
+            allowed = self.chunks.positions(self._get_chunk_ids(file_id))
+            allowed = allowed[allowed != -1]
+            if tenant_positions is not None:
+                allowed = allowed[np.isin(allowed, tenant_positions)]
+        elif tenant_positions is not None:
+            allowed = tenant_positions
+        else:
+            return None
+            
+        if self.tombstones:
+            allowed = allowed[~np.isin(allowed, self._dead_positions())]
+        return allowed
+    
+    def _build_selector(self, allowed: Optional[np.ndarray]) -> Optional[Any]:
+        """Build a FAISS ID selector from the positions a search may return.
+        
+        The selector is evaluated inside the FAISS scan, so filtered searches
+        return up to ``limit`` matching chunks without over-fetching.
+        
+        Args:
+            allowed: Positions from :meth:`_filter_positions`, or None for all live chunks
+            
+        Returns:
+            A FAISS ID selector, or None if every chunk may match
+        """
+        if allowed is not None:
+            return faiss.IDSelectorBatch(allowed)
+            
+        # Exclude removed chunks that have not been compacted yet
+        dead = self._dead_positions()
+        return faiss.IDSelectorNot(faiss.IDSelectorBatch(dead)) if len(dead) else None
+    
     def get_document_metadata(self, file_id: str) -> Optional[Dict[str, Any]]:
         """Get metadata for a document.
         
@@ -259,7 +1315,11 @@ class DocumentIndex:
         Returns:
             Metadata dictionary or None if not found
         """
-        return self.metadata.get(file_id)
+        self._refresh()
+        entry = self.metadata.get(file_id)
+        if entry is None:
+            return None
+        return {k: v for k, v in entry.items() if k != 'chunk_ids'}
         
     def get_document_count(self) -> int:
         """Get the number of documents in the index.
@@ -267,8 +1327,19 @@ class DocumentIndex:
         Returns:
             int: Number of documents
         """
+        self._refresh()
         return len(self.metadata)
         
+    def get_memory_usage(self) -> int:
+        """Estimate the memory held by the index.
+        
+        Returns:
+            int: Approximate size in bytes of the FAISS index
+        """
+        if self.index is None:
+            return 0
+        return backend.memory_usage(self.index)
+        
     def get_index_size(self) -> int:
         """Get the size of the index in bytes.
         
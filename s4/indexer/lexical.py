@@ -0,0 +1,325 @@
+"""BM25 inverted index for lexical search over S4 chunks."""
+
+import json
+import logging
+import math
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from s4.exceptions import IndexError
+
+logger = logging.getLogger(__name__)
+
+# BM25 term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Longer tokens are almost always noise such as base64 blobs
+MAX_TERM_BYTES = 64
+
+# Words joined by these characters also form one token, so identifiers
+# like INV-2024-0042 or sku_1234 can be matched exactly
+_TOKEN_RE = re.compile(r"\w+(?:[-./:#]\w+)*")
+_PART_RE = re.compile(r"[^\W_]+")
+
+POSTING_DTYPE = np.dtype([('chunk_id', '<i8'), ('tf', '<i4')])
+DOC_DTYPE = np.dtype([('chunk_id', '<i8'), ('length', '<i4')])
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase search terms.
+
+    Compound identifiers are kept whole and also split into their parts.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        List of terms, in order of occurrence
+    """
+    terms = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        parts = _PART_RE.findall(token)
+        if len(parts) != 1 or parts[0] != token:
+            terms.append(token)
+        terms.extend(parts)
+    return [term for term in terms if len(term.encode('utf-8')) <= MAX_TERM_BYTES]
+
+class LexicalIndex:
+    """BM25 inverted index keyed by integer chunk ID.
+
+    The index is stored next to the FAISS files as memory-mapped arrays:
+
+    - ``<prefix>.bm25.json``: manifest with the committed generation and corpus statistics
+    - ``<prefix>.bm25.<generation>.vocab.npy``: sorted UTF-8 terms
+    - ``<prefix>.bm25.<generation>.offsets.npy``: start of each term's postings
+    - ``<prefix>.bm25.<generation>.postings.npy``: (chunk ID, term frequency) pairs
+    - ``<prefix>.bm25.<generation>.docs.npy``: (chunk ID, length) of every chunk
+
+    Chunks added since the last save are held in memory and merged into a
+    new generation by :meth:`save`.
+    """
+
+    def __init__(self, path_prefix: Union[str, Path]):
+        """Initialize the lexical index.
+
+        Args:
+            path_prefix: Path prefix for the index files (usually the index path without suffix)
+        """
+        self.path_prefix = str(path_prefix)
+        self.manifest_path = Path(f"{self.path_prefix}.bm25.json")
+
+        self._generation = 0
+        self._vocab = np.empty(0, dtype='S1')
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._postings = np.empty(0, dtype=POSTING_DTYPE)
+        self._docs = np.empty(0, dtype=DOC_DTYPE)
+        self._total_length = 0
+
+        # Chunks added or dropped since the last save
+        self._tail_postings: Dict[str, Dict[int, int]] = {}
+        self._tail_docs: Dict[int, int] = {}
+        self._dropped: Set[int] = set()
+
+        self._load()
+
+    def _path(self, generation: int, name: str) -> Path:
+        return Path(f"{self.path_prefix}.bm25.{generation}.{name}.npy")
+
+    def exists(self) -> bool:
+        """Check whether a committed index exists on disk."""
+        return self.manifest_path.exists()
+
+    def _load(self):
+        """Map the committed index from disk."""
+        if not self.manifest_path.exists():
+            return
+
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            self._generation = manifest['generation']
+            self._total_length = manifest['total_length']
+
+            def load(name, count):
+                mmap_mode = 'r' if count else None
+                return np.load(self._path(self._generation, name), mmap_mode=mmap_mode, allow_pickle=False)
+
+            self._vocab = load('vocab', manifest['terms'])
+            self._offsets = load('offsets', manifest['terms'])
+            self._postings = load('postings', manifest['postings'])
+            self._docs = load('docs', manifest['docs'])
+        except Exception as e:
+            logger.error(f"Error loading lexical index {self.manifest_path}: {e}")
+            raise IndexError(f"Error loading lexical index: {str(e)}")
+
+    def __len__(self) -> int:
+        return len(self._docs) + len(self._tail_docs) - len(self._dropped)
+
+    def __contains__(self, chunk_id: int) -> bool:
+        chunk_id = int(chunk_id)
+        if chunk_id in self._dropped:
+            return False
+        return chunk_id in self._tail_docs or self._base_row(chunk_id) != -1
+
+    def _base_row(self, chunk_id: int) -> int:
+        row = int(np.searchsorted(self._docs['chunk_id'], chunk_id))
+        if row < len(self._docs) and self._docs['chunk_id'][row] == chunk_id:
+            return row
+        return -1
+
+    def add(self, chunk_ids: Sequence[int], texts: Sequence[str]):
+        """Index the text of new chunks.
+
+        Args:
+            chunk_ids: IDs of the chunks
+            texts: Text of each chunk
+        """
+        for chunk_id, text in zip(chunk_ids, texts):
+            chunk_id = int(chunk_id)
+            terms = tokenize(text)
+            self._tail_docs[chunk_id] = len(terms)
+            self._total_length += len(terms)
+            for term in terms:
+                postings = self._tail_postings.setdefault(term, {})
+                postings[chunk_id] = postings.get(chunk_id, 0) + 1
+
+    def retain(self, chunk_ids: Iterable[int]):
+        """Drop every chunk not in the given set of IDs.
+
+        Args:
+            chunk_ids: IDs of the chunks to keep
+        """
+        keep = set(int(chunk_id) for chunk_id in chunk_ids)
+        base_ids = self._docs['chunk_id']
+        dropped = base_ids[~np.isin(base_ids, np.fromiter(keep, dtype=np.int64))]
+        self._dropped.update(int(chunk_id) for chunk_id in dropped)
+
+        for chunk_id in [c for c in self._tail_docs if c not in keep]:
+            self._total_length -= self._tail_docs.pop(chunk_id)
+            for postings in self._tail_postings.values():
+                postings.pop(chunk_id, None)
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the chunk IDs and term frequencies of a term."""
+        ids, tfs = [], []
+        encoded = term.encode('utf-8')
+        row = int(np.searchsorted(self._vocab, encoded))
+        if row < len(self._vocab) and self._vocab[row] == encoded:
+            postings = self._postings[self._offsets[row]:self._offsets[row + 1]]
+            ids.append(postings['chunk_id'])
+            tfs.append(postings['tf'])
+
+        tail = self._tail_postings.get(term)
+        if tail:
+            ids.append(np.fromiter(tail.keys(), dtype=np.int64, count=len(tail)))
+            tfs.append(np.fromiter(tail.values(), dtype=np.int32, count=len(tail)))
+
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        return np.concatenate(ids), np.concatenate(tfs)
+
+    def _doc_lengths(self, chunk_ids: np.ndarray) -> np.ndarray:
+        """Get the token count of each chunk."""
+        base_ids = self._docs['chunk_id']
+        rows = np.minimum(np.searchsorted(base_ids, chunk_ids), max(len(base_ids) - 1, 0))
+        in_base = base_ids[rows] == chunk_ids if len(base_ids) else np.zeros(len(chunk_ids), dtype=bool)
+        lengths = np.zeros(len(chunk_ids), dtype=np.float64)
+        lengths[in_base] = self._docs['length'][rows[in_base]]
+        for i in np.flatnonzero(~in_base):
+            lengths[i] = self._tail_docs.get(int(chunk_ids[i]), 0)
+        return lengths
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        allowed: Optional[np.ndarray] = None,
+        excluded: Optional[Iterable[int]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Rank chunks by BM25 score for a query.
+
+        Args:
+            query: The search query
+            limit: Maximum number of results to return
+            allowed: Optional chunk IDs to restrict results to
+            excluded: Optional chunk IDs to leave out, e.g. tombstones
+
+        Returns:
+            Tuple of (chunk IDs, scores), best match first
+        """
+        num_docs = len(self)
+        if not num_docs:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        avg_length = max(self._total_length / num_docs, 1e-9)
+
+        all_ids, all_scores = [], []
+        for term in set(tokenize(query)):
+            ids, tfs = self._term_postings(term)
+            if not len(ids):
+                continue
+            df = len(ids)
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            lengths = self._doc_lengths(ids)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avg_length)
+            all_ids.append(ids)
+            all_scores.append(idf * tfs * (BM25_K1 + 1) / (tfs + norm))
+
+        if not all_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+
+        excluded = set(excluded or ()) | self._dropped
+        keep = np.ones(len(ids), dtype=bool)
+        if allowed is not None:
+            keep &= np.isin(ids, allowed)
+        if excluded:
+            keep &= ~np.isin(ids, np.fromiter(excluded, dtype=np.int64))
+        ids, scores = ids[keep], scores[keep]
+
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return ids[order], scores[order]
+
+    def save(self):
+        """Merge pending changes into a new generation and switch the manifest to it."""
+        if not self._tail_docs and not self._dropped and self.exists():
+            return
+
+        # Base postings with the term each one belongs to
+        base_terms = np.repeat(np.arange(len(self._vocab)), np.diff(self._offsets))
+        tail_vocab = sorted(self._tail_postings)
+        tail_postings = np.empty(sum(len(p) for p in self._tail_postings.values()), dtype=POSTING_DTYPE)
+        tail_counts = np.empty(len(tail_vocab), dtype=np.int64)
+        start = 0
+        for term_row, term in enumerate(tail_vocab):
+            postings = self._tail_postings[term]
+            end = start + len(postings)
+            tail_postings['chunk_id'][start:end] = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tail_postings['tf'][start:end] = np.fromiter(postings.values(), dtype=np.int32, count=len(postings))
+            tail_counts[term_row] = len(postings)
+            start = end
+        tail_terms = np.repeat(np.arange(len(tail_vocab)), tail_counts)
+
+        tail_vocab = np.array([t.encode('utf-8') for t in tail_vocab], dtype='S')
+        vocab = np.union1d(np.asarray(self._vocab), tail_vocab)
+        terms = np.concatenate([
+            np.searchsorted(vocab, np.asarray(self._vocab))[base_terms],
+            np.searchsorted(vocab, tail_vocab)[tail_terms],
+        ]).astype(np.int64)
+        postings = np.concatenate([
+            np.asarray(self._postings),
+            tail_postings,
+        ])
+        docs = np.concatenate([
+            np.asarray(self._docs),
+            np.fromiter(self._tail_docs.items(), dtype=DOC_DTYPE, count=len(self._tail_docs)),
+        ])
+
+        if self._dropped:
+            dropped = np.fromiter(self._dropped, dtype=np.int64)
+            live = ~np.isin(postings['chunk_id'], dropped)
+            terms, postings = terms[live], postings[live]
+            dropped_docs = np.isin(docs['chunk_id'], dropped)
+            self._total_length -= int(docs['length'][dropped_docs].sum())
+            docs = docs[~dropped_docs]
+
+        order = np.lexsort((postings['chunk_id'], terms))
+        terms, postings = terms[order], postings[order]
+        docs = docs[np.argsort(docs['chunk_id'], kind='stable')]
+
+        # Drop terms whose postings were all removed
+        used, terms = np.unique(terms, return_inverse=True)
+        vocab = vocab[used]
+        offsets = np.searchsorted(terms, np.arange(len(vocab) + 1)).astype(np.int64)
+
+        generation = self._generation + 1
+        for name, data in (('vocab', vocab), ('offsets', offsets), ('postings', postings), ('docs', docs)):
+            with open(self._path(generation, name), 'wb') as f:
+                np.save(f, data, allow_pickle=False)
+                f.flush()
+                os.fsync(f.fileno())
+
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'generation': generation,
+                'terms': len(vocab),
+                'postings': len(postings),
+                'docs': len(docs),
+                'total_length': self._total_length
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+        for name in ('vocab', 'offsets', 'postings', 'docs'):
+            self._path(self._generation, name).unlink(missing_ok=True)
+
+        self._tail_postings, self._tail_docs, self._dropped = {}, {}, set()
+        self._load()
@@ -0,0 +1,202 @@
+"""Durable on-disk store of chunk embeddings for S4 indices."""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from s4.exceptions import IndexError
+
+logger = logging.getLogger(__name__)
+
+class VectorStore:
+    """Append-only float32 vector segment keyed by integer chunk ID.
+
+    The store keeps every chunk embedding outside of FAISS so indices can be
+    rebuilt, retrained or migrated from local disk without calling the
+    embedding API. It consists of three files sharing a common prefix:
+
+    - ``<prefix>.vec``: raw float32 rows, one per chunk
+    - ``<prefix>.vecids``: raw int64 chunk IDs, parallel to the rows
+    - ``<prefix>.vec.json``: manifest with the dimension, committed row count
+      and next free chunk ID
+
+    Rows are appended and flushed before the manifest is atomically replaced,
+    so a crash mid-append leaves at most an ignored, uncommitted tail. The
+    vector file is memory-mapped read-only, so full-precision vectors are
+    paged in from disk on demand instead of living on the heap.
+    """
+
+    def __init__(self, path_prefix: Union[str, Path]):
+        """Initialize the vector store.
+
+        Args:
+            path_prefix: Path prefix for the store files (usually the index path without suffix)
+        """
+        path_prefix = str(path_prefix)
+        self.vectors_path = Path(f"{path_prefix}.vec")
+        self.ids_path = Path(f"{path_prefix}.vecids")
+        self.manifest_path = Path(f"{path_prefix}.vec.json")
+
+        self.dim: Optional[int] = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self._rows: Dict[int, int] = {}
+        self._next_id = 0
+
+        self._load()
+
+    def _load(self):
+        """Load committed rows from disk, discarding any uncommitted tail."""
+        if not self.manifest_path.exists():
+            return
+
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            self.dim = manifest['dim']
+            count = manifest['count']
+
+            self.ids = np.fromfile(self.ids_path, dtype=np.int64, count=count)
+
+            # Drop bytes from an append that never reached the manifest
+            self._truncate(count)
+            self._map_vectors(count)
+            self._next_id = manifest.get('next_id', int(self.ids.max()) + 1 if count else 0)
+        except Exception as e:
+            logger.error(f"Error loading vector store {self.manifest_path}: {e}")
+            raise IndexError(f"Error loading vector store: {str(e)}")
+
+        self._rows = {int(chunk_id): row for row, chunk_id in enumerate(self.ids)}
+
+    def _truncate(self, count: int):
+        """Truncate the segment files to the given number of rows."""
+        for path, row_bytes in ((self.ids_path, 8), (self.vectors_path, 4 * self.dim)):
+            if path.exists() and path.stat().st_size > count * row_bytes:
+                with open(path, 'r+b') as f:
+                    f.truncate(count * row_bytes)
+
+    def _map_vectors(self, count: int):
+        """Memory-map the first ``count`` committed rows of the vector file."""
+        if count:
+            self.vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode='r', shape=(count, self.dim)
+            )
+        else:
+            self.vectors = np.empty((0, self.dim), dtype=np.float32)
+
+    def _write_manifest(self):
+        """Atomically record the committed dimension and row count."""
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({'dim': self.dim, 'count': len(self.ids), 'next_id': self._next_id}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return int(chunk_id) in self._rows
+
+    @property
+    def next_id(self) -> int:
+        """Next unused chunk ID; IDs are never reused, even after compaction."""
+        return self._next_id
+
+    def append(self, chunk_ids: Sequence[int], vectors: Union[np.ndarray, List[List[float]]]):
+        """Append vectors for new chunks.
+
+        Args:
+            chunk_ids: IDs of the chunks, which must not already be stored
+            vectors: One embedding per chunk ID
+        """
+        ids = np.asarray(chunk_ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise IndexError("Vector store append needs one vector per chunk ID")
+
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self.vectors = np.empty((0, self.dim), dtype=np.float32)
+        elif vectors.shape[1] != self.dim:
+            raise IndexError(
+                f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dim}"
+            )
+
+        with open(self.vectors_path, 'ab') as f:
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.ids_path, 'ab') as f:
+            f.write(ids.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        start = len(self.ids)
+        self.ids = np.concatenate([self.ids, ids])
+        self._map_vectors(len(self.ids))
+        for offset, chunk_id in enumerate(ids):
+            self._rows[int(chunk_id)] = start + offset
+        if len(ids):
+            self._next_id = max(self._next_id, int(ids.max()) + 1)
+
+        self._write_manifest()
+
+    def get(self, chunk_ids: Iterable[int]) -> np.ndarray:
+        """Get the stored vectors for the given chunk IDs.
+
+        Args:
+            chunk_ids: IDs of the chunks
+
+        Returns:
+            np.ndarray: float32 matrix with one row per chunk ID
+        """
+        rows = [self._rows[int(chunk_id)] for chunk_id in chunk_ids]
+        if self.dim is None:
+            return np.empty((len(rows), 0), dtype=np.float32)
+        return np.asarray(self.vectors[rows])
+
+    def items(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Get all stored chunk IDs and vectors.
+
+        Returns:
+            Tuple of (chunk IDs, vectors)
+        """
+        return self.ids, self.vectors
+
+    def retain(self, chunk_ids: Iterable[int]) -> int:
+        """Rewrite the store keeping only the given chunk IDs.
+
+        Args:
+            chunk_ids: IDs of the chunks to keep
+
+        Returns:
+            int: Number of vectors dropped
+        """
+        keep = np.isin(self.ids, np.fromiter(chunk_ids, dtype=np.int64))
+        dropped = int((~keep).sum())
+        if not dropped:
+            return 0
+
+        ids = self.ids[keep]
+        vectors = np.asarray(self.vectors[keep])
+
+        # Write the new segment beside the old one and swap it in
+        for path, data in ((self.vectors_path, vectors), (self.ids_path, ids)):
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+        self.ids = ids
+        self._map_vectors(len(ids))
+        self._rows = {int(chunk_id): row for row, chunk_id in enumerate(self.ids)}
+        self._write_manifest()
+        return dropped
@@ -0,0 +1,73 @@
+"""Write-ahead log for incremental S4 index updates."""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, Union
+
+logger = logging.getLogger(__name__)
+
+class WriteAheadLog:
+    """Append-only JSON-lines log of index mutations.
+
+    Each mutation is appended and fsynced before it is applied in memory, so
+    the on-disk index only needs to be rewritten at checkpoints. On load the
+    log is replayed on top of the last checkpoint. A torn final record from a
+    crash mid-write is discarded.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """Initialize the write-ahead log.
+
+        Args:
+            path: Path to the log file
+        """
+        self.path = Path(path)
+
+    def append(self, record: Dict[str, Any]):
+        """Durably append a record to the log.
+
+        Args:
+            record: JSON-serializable mutation record
+        """
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over the committed records in the log.
+
+        Yields:
+            Dict: Mutation records in the order they were appended
+        """
+        if not self.path.exists():
+            return
+
+        good_bytes = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                good_bytes += len(line)
+                yield record
+
+        # Cut off a torn tail so later appends start on a record boundary
+        if self.path.stat().st_size > good_bytes:
+            logger.warning(f"Discarding torn record at end of {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_bytes)
+
+    def truncate(self):
+        """Discard all records, typically after a checkpoint."""
+        if self.path.exists():
+            with open(self.path, 'r+b') as f:
+                f.truncate(0)
+                f.flush()
+                os.fsync(f.fileno())
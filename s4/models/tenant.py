@@ -55,6 +55,8 @@ class Tenant(BaseModel):
     s3_bucket: Optional[str] = None
     s3_region: Optional[str] = None
     openai_api_key: Optional[str] = None
+    openai_requests_per_minute: Optional[int] = None  # Rate limits of the custom OpenAI API key
+    openai_tokens_per_minute: Optional[int] = None
     custom_bucket_name: Optional[str] = None  # Legacy field, keeping for compatibility
     aws_access_key_id: Optional[str] = None
     aws_secret_access_key: Optional[str] = None
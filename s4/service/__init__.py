@@ -1,5 +1,9 @@
 """Service module for S4."""
 
 from s4.service.s4_service import S4Service
+from s4.service.pool import ServicePool
 
-__all__ = ['S4Service'] 
\ No newline at end of file
+__all__ = ['S4Service', 'ServicePool', 'service_pool']
+
+# Global pool of per-tenant services
+service_pool = ServicePool() 
\ No newline at end of file
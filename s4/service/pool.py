@@ -0,0 +1,150 @@
+"""Process-wide pool of per-tenant S4 services."""
+
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from s4 import config
+
+logger = logging.getLogger(__name__)
+
+def _create_service(tenant_id: Optional[str]) -> Any:
+    """Default pool factory."""
+    from s4.service.s4_service import S4Service
+    return S4Service(tenant_id=tenant_id)
+
+class ServicePool:
+    """LRU pool of S4Service instances keyed by tenant.
+
+    Building a service creates S3 and OpenAI clients and loads the tenant's
+    index from disk, so services are kept warm across requests. Concurrent
+    requests for a tenant that is not loaded yet wait for a single load.
+    The least recently used services are evicted once the pool exceeds its
+    size or its estimated index memory budget.
+    """
+
+    def __init__(
+        self,
+        factory: Optional[Callable[[Optional[str]], Any]] = None,
+        max_size: Optional[int] = None,
+        memory_budget: Optional[int] = None
+    ):
+        """Initialize the pool.
+
+        Args:
+            factory: Optional callable building a service for a tenant ID
+            max_size: Optional maximum number of pooled services
+            memory_budget: Optional budget in bytes for the pooled indices (0 for none)
+        """
+        self._factory = factory or _create_service
+        self.max_size = max_size if max_size is not None else config.SERVICE_POOL_SIZE
+        self.memory_budget = (
+            memory_budget if memory_budget is not None
+            else config.SERVICE_POOL_MEMORY_MB * 1024 * 1024
+        )
+
+        self._lock = threading.Lock()
+        self._services: "OrderedDict[Optional[str], Any]" = OrderedDict()
+        self._loading: Dict[Optional[str], Future] = {}
+
+    def get(self, tenant_id: Optional[str] = None) -> Any:
+        """Get the service for a tenant, loading it on first use.
+
+        Args:
+            tenant_id: Tenant ID, or None for the single-tenant service
+
+        Returns:
+            The pooled service
+        """
+        with self._lock:
+            service = self._services.get(tenant_id)
+            if service is not None:
+                self._services.move_to_end(tenant_id)
+                return service
+
+            pending = self._loading.get(tenant_id)
+            owner = pending is None
+            if owner:
+                pending = Future()
+                self._loading[tenant_id] = pending
+
+        if not owner:
+            return pending.result()
+
+        try:
+            service = self._factory(tenant_id)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[tenant_id]
+            pending.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._loading[tenant_id]
+            self._services[tenant_id] = service
+            evicted = self._evict()
+        pending.set_result(service)
+        self._close(evicted)
+        return service
+
+    def _memory_usage(self) -> int:
+        """Estimate the memory held by the pooled indices."""
+        total = 0
+        for service in self._services.values():
+            index = getattr(service, 'index', None)
+            if index is not None and hasattr(index, 'get_memory_usage'):
+                total += index.get_memory_usage()
+        return total
+
+    def _evict(self) -> List[Any]:
+        """Drop least recently used services until the pool fits its limits.
+
+        Returns:
+            The dropped services, to be closed once the pool lock is released
+        """
+        evicted = []
+        while len(self._services) > 1 and (
+            len(self._services) > self.max_size
+            or (self.memory_budget and self._memory_usage() > self.memory_budget)
+        ):
+            tenant_id, service = self._services.popitem(last=False)
+            evicted.append(service)
+            logger.info(f"Evicted service for tenant {tenant_id} from the pool")
+        return evicted
+
+    @staticmethod
+    def _close(services: List[Any]):
+        """Close dropped services, releasing the files their indices hold open."""
+        for service in services:
+            close = getattr(service, 'close', None)
+            if close is None:
+                continue
+            try:
+                close()
+            except Exception as e:
+                logger.warning(f"Error closing evicted service: {e}")
+
+    def evict(self, tenant_id: Optional[str] = None):
+        """Drop a tenant's service, e.g. after its configuration changed.
+
+        Args:
+            tenant_id: Tenant ID, or None for the single-tenant service
+        """
+        with self._lock:
+            service = self._services.pop(tenant_id, None)
+        self._close([service] if service is not None else [])
+
+    def clear(self):
+        """Drop all pooled services."""
+        with self._lock:
+            services = list(self._services.values())
+            self._services.clear()
+        self._close(services)
+
+    def __len__(self) -> int:
+        return len(self._services)
+
+    def __contains__(self, tenant_id: Optional[str]) -> bool:
+        return tenant_id in self._services
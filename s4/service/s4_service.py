@@ -8,21 +8,103 @@ from typing import Dict, List, Optional, Union, BinaryIO, Any, Tuple
 
 from s4.storage import S3Storage
 from s4.indexer import DocumentProcessor, DocumentIndex
+from s4.embedding.engine import get_rate_limiter
+from s4.db import tenant_manager
+from s4.exceptions import LimitExceededError, S4Error, ValidationError
 
 logger = logging.getLogger(__name__)
 
 class S4Service:
     """S4 service for intelligent file storage and retrieval."""
     
-    def __init__(self, index_id: str = "default"):
+    def __init__(self, index_id: str = "default", tenant_id: Optional[str] = None):
         """Initialize the S4 service.
         
         Args:
             index_id: ID for the document index
+            tenant_id: Optional tenant ID for multi-tenant mode
+            
+        Raises:
+            ValidationError: If the tenant does not exist or is inactive
         """
-        self.storage = S3Storage()
+        self.tenant_id = tenant_id
+        
+        # Get tenant info if in multi-tenant mode
+        self.tenant = None
+        openai_api_key = None
+        if tenant_id:
+            self.tenant = tenant_manager.get_tenant(tenant_id)
+            if not self.tenant:
+                raise ValidationError(f"Tenant {tenant_id} not found")
+            if not self.tenant.active:
+                raise ValidationError(f"Tenant {tenant_id} is not active")
+            
+            # Tenants bringing their own key also bring its rate limits
+            openai_api_key = self.tenant.openai_api_key
+            if openai_api_key:
+                get_rate_limiter(
+                    openai_api_key,
+                    self.tenant.openai_requests_per_minute,
+                    self.tenant.openai_tokens_per_minute
+                )
+        
+        s3_config = self.tenant.get_s3_config() if self.tenant else {}
+        self.storage = S3Storage(tenant_id=tenant_id, **s3_config)
         self.processor = DocumentProcessor()
-        self.index = DocumentIndex(index_id)
+        self.index = DocumentIndex(index_id, tenant_id=tenant_id, openai_api_key=openai_api_key)
+        
+    def _check_tenant_limits(self, file_size: Optional[int] = None):
+        """Check the tenant's plan limits before an operation in multi-tenant mode.
+        
+        Args:
+            file_size: Size in bytes of a file being added, if any
+            
+        Raises:
+            LimitExceededError: If the operation would exceed the tenant's plan
+        """
+        if not self.tenant:
+            return
+        
+        plan = self.tenant.get_plan_object()
+        if file_size:
+            if not self.tenant.check_file_size_limit(file_size):
+                raise LimitExceededError(
+                    f"File size exceeds tenant's plan limit of {plan.max_file_size_mb}MB"
+                )
+            if not self.tenant.check_storage_limit(file_size):
+                raise LimitExceededError(
+                    f"Storage use would exceed tenant's plan limit of {plan.storage_limit_gb}GB"
+                )
+        if not self.tenant.check_api_limit():
+            raise LimitExceededError(
+                f"API request count would exceed tenant's plan limit of {plan.monthly_requests}"
+            )
+    
+    def _track_usage(self, file_size: int = 0):
+        """Count an API request, and any stored bytes, against the tenant's plan.
+        
+        Args:
+            file_size: Size in bytes of a file that was added
+        """
+        if self.tenant_id:
+            tenant_manager.increment_tenant_usage(self.tenant_id, file_size=file_size)
+    
+    @staticmethod
+    def _file_info(
+        file_id: str,
+        size: int,
+        metadata: Dict[str, str],
+        content_type: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Describe a stored file in the shape of the API's file metadata."""
+        return {
+            'file_id': file_id,
+            'filename': metadata.get('original_filename', file_id),
+            'size': size,
+            'content_type': metadata.get('content_type') or content_type,
+            'uploaded_at': metadata.get('uploaded-at'),
+            'metadata': metadata
+        }
         
     def upload_file(
         self, 
@@ -44,78 +126,40 @@ class S4Service:
         Returns:
             Dict with file information
         """
-        # Create a copy of the file for indexing if needed
-        if index and isinstance(file_obj, (io.BytesIO, bytes)):
-            # Copy the bytes for indexing
-            if isinstance(file_obj, io.BytesIO):
-                # Get bytes and reset the original file pointer
-                file_bytes = file_obj.getvalue()
-                file_obj.seek(0)
-                indexing_file = io.BytesIO(file_bytes)
-            else:
-                file_bytes = file_obj
-                indexing_file = io.BytesIO(file_bytes)
-        elif index and isinstance(file_obj, str):
-            # It's a file path, we'll read it for indexing after upload
-            indexing_path = file_obj
-            indexing_file = None
-        else:
-            indexing_file = None
+        # One buffer is uploaded and then rewound for indexing, never copied
+        if isinstance(file_obj, bytes):
+            file_obj = io.BytesIO(file_obj)
+        rewind_to = None
+        if not isinstance(file_obj, str) and file_obj.seekable():
+            rewind_to = file_obj.tell()
         
         # Upload the file to S3
         file_id = self.storage.upload_file(
             file_obj=file_obj,
             file_name=file_name,
             content_type=content_type,
-            metadata=metadata
+            metadata=metadata,
+            generate_embedding=False
         )
         
         # Index the file if requested
         if index:
-            if indexing_file is None and isinstance(file_obj, str):
-                # Read the file from the provided path
-                with open(indexing_path, 'rb') as f:
-                    indexing_file = io.BytesIO(f.read())
-            
-            if indexing_file is not None:
-                # Process and index the document
-                chunks = self.processor.process_document(
-                    file_obj=indexing_file,
-                    file_name=file_name,
-                    mime_type=content_type
-                )
-                
-                # Add document to index
-                if chunks:
-                    self.index.add_document(
-                        file_id=file_id,
-                        chunks=chunks,
-                        metadata={
-                            'file_name': file_name or "unknown",
-                            'content_type': content_type or "unknown",
-                            **(metadata or {})
-                        }
-                    )
+            index_metadata = {
+                'file_name': file_name or "unknown",
+                'content_type': content_type or "unknown",
+                **(metadata or {})
+            }
+            if isinstance(file_obj, str):
+                # Stream the file from the provided path
+                with open(file_obj, 'rb') as f:
+                    self._index_file(file_id, f, file_name, content_type, index_metadata)
+            elif rewind_to is not None:
+                file_obj.seek(rewind_to)
+                self._index_file(file_id, file_obj, file_name, content_type, index_metadata)
             else:
-                # If we couldn't get a file for indexing, download it from S3
-                downloaded_file, _ = self.storage.download_file(file_id)
-                chunks = self.processor.process_document(
-                    file_obj=downloaded_file,
-                    file_name=file_name,
-                    mime_type=content_type
-                )
-                
-                # Add document to index
-                if chunks:
-                    self.index.add_document(
-                        file_id=file_id,
-                        chunks=chunks,
-                        metadata={
-                            'file_name': file_name or "unknown",
-                            'content_type': content_type or "unknown",
-                            **(metadata or {})
-                        }
-                    )
+                # A one-shot stream was consumed by the upload, so read it back from S3
+                indexing_file, _ = self.storage.download_file(file_id)
+                self._index_file(file_id, indexing_file, file_name, content_type, index_metadata)
         
         # Return file information
         return {
@@ -126,7 +170,204 @@ class S4Service:
             'metadata': metadata or {}
         }
     
-    def download_file(self, file_id: str) -> Tuple[io.BytesIO, Dict[str, str]]:
+    def upload_file_object(
+        self,
+        file_obj: BinaryIO,
+        filename: str,
+        content_type: Optional[str] = None,
+        file_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Upload a seekable file object to S3 and index it.
+        
+        The same buffer, e.g. a request's spooled upload, is sent to S3 and
+        then rewound and streamed through text extraction into the index,
+        so the content is never copied in memory or to disk.
+        
+        Args:
+            file_obj: Seekable file-like object to upload
+            filename: Name of the file
+            content_type: Optional MIME type, guessed from the name if not given
+            file_id: Optional file ID (generated if not provided)
+            metadata: Optional metadata to attach to the file
+            
+        Returns:
+            Dict with file information
+        """
+        start = file_obj.tell()
+        file_size = file_obj.seek(0, io.SEEK_END) - start
+        file_obj.seek(start)
+        self._check_tenant_limits(file_size)
+        
+        content_type = content_type or mimetypes.guess_type(filename)[0]
+        metadata = dict(metadata or {})
+        metadata['original_filename'] = filename
+        if content_type:
+            metadata['content_type'] = content_type
+        
+        file_id = self.storage.upload_file(
+            file_obj,
+            file_name=filename,
+            content_type=content_type,
+            metadata=metadata,
+            generate_embedding=False,
+            file_id=file_id
+        )
+        
+        file_obj.seek(start)
+        index_metadata = {'file_name': filename, 'content_type': content_type or "unknown", **metadata}
+        self._index_file(file_id, file_obj, filename, content_type, index_metadata)
+        self._track_usage(file_size)
+        
+        return {**self._file_info(file_id, file_size, metadata), 'indexed': True}
+    
+    def _index_file(
+        self,
+        file_id: str,
+        file_obj: BinaryIO,
+        file_name: Optional[str],
+        content_type: Optional[str],
+        metadata: Dict[str, Any]
+    ) -> int:
+        """Stream a file's chunks into the index as they are extracted.
+        
+        Args:
+            file_id: ID of the file
+            file_obj: File contents
+            file_name: Optional name of the file
+            content_type: Optional MIME type
+            metadata: Metadata stored with the chunks
+            
+        Returns:
+            int: Number of chunks indexed
+        """
+        chunks = self.processor.iter_chunks(
+            file_obj=file_obj,
+            file_name=file_name,
+            mime_type=content_type
+        )
+        return self.index.add_document(file_id=file_id, chunks=chunks, metadata=metadata)
+    
+    def create_upload(
+        self,
+        file_name: str,
+        size: int,
+        content_type: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """Start an upload the client sends straight to S3 in presigned parts.
+        
+        Args:
+            file_name: Name of the file
+            size: Size of the file in bytes
+            content_type: Optional MIME type
+            metadata: Optional metadata to attach to the file
+            
+        Returns:
+            Dict with the file ID, upload ID, part size and presigned part URLs
+            
+        Raises:
+            LimitExceededError: If the file would exceed the tenant's plan
+        """
+        self._check_tenant_limits(size)
+        
+        content_type = content_type or mimetypes.guess_type(file_name)[0]
+        metadata = dict(metadata or {})
+        metadata['original_filename'] = file_name
+        if content_type:
+            metadata['content_type'] = content_type
+        upload = self.storage.create_presigned_upload(file_name, size, content_type, metadata)
+        
+        # Stored bytes are counted once the upload completes
+        self._track_usage()
+        return upload
+    
+    def complete_upload(
+        self,
+        file_id: str,
+        upload_id: str,
+        parts: List[Dict[str, Any]],
+        index: bool = True
+    ) -> Dict[str, Any]:
+        """Finish a presigned upload and optionally index the file.
+        
+        Args:
+            file_id: ID returned when the upload started
+            upload_id: Multipart upload ID
+            parts: Part number and ETag of every uploaded part
+            index: Whether to index the file for search
+            
+        Returns:
+            Dict with file information
+            
+        Raises:
+            LimitExceededError: If the uploaded file exceeds the tenant's plan,
+                in which case it is deleted
+        """
+        self._check_tenant_limits()
+        self.storage.complete_presigned_upload(file_id, upload_id, parts)
+        
+        file_obj, metadata = self.storage.download_file(file_id)
+        with file_obj:
+            # The client may upload more than it announced when the upload started
+            file_size = file_obj.seek(0, io.SEEK_END)
+            file_obj.seek(0)
+            try:
+                self._check_tenant_limits(file_size)
+            except LimitExceededError:
+                self.storage.delete_file(file_id)
+                raise
+            
+            file_name = metadata.get('original_filename')
+            content_type = metadata.get('content_type')
+            if index:
+                index_metadata = {
+                    'file_name': file_name or "unknown",
+                    'content_type': content_type or "unknown",
+                    **metadata
+                }
+                self._index_file(file_id, file_obj, file_name, content_type, index_metadata)
+        
+        self._track_usage(file_size)
+        return {**self._file_info(file_id, file_size, metadata), 'indexed': index}
+    
+    def abort_upload(self, file_id: str, upload_id: str) -> bool:
+        """Abandon a presigned upload.
+        
+        Args:
+            file_id: ID returned when the upload started
+            upload_id: Multipart upload ID
+            
+        Returns:
+            bool: True if aborted successfully
+        """
+        self._check_tenant_limits()
+        aborted = self.storage.abort_presigned_upload(file_id, upload_id)
+        self._track_usage()
+        return aborted
+    
+    def get_download_url(
+        self,
+        file_id: str,
+        file_name: Optional[str] = None,
+        disposition: str = "attachment"
+    ) -> str:
+        """Get a presigned URL the client downloads a file from directly.
+        
+        Args:
+            file_id: ID of the file to download
+            file_name: Optional file name for the Content-Disposition header
+            disposition: attachment or inline
+            
+        Returns:
+            str: Presigned GET URL
+        """
+        self._check_tenant_limits()
+        url = self.storage.generate_download_url(file_id, file_name, disposition)
+        self._track_usage()
+        return url
+    
+    def download_file(self, file_id: str) -> Tuple[BinaryIO, Dict[str, str]]:
         """Download a file from S3.
         
         Args:
@@ -134,11 +375,47 @@ class S4Service:
             
         Returns:
             Tuple containing:
-                io.BytesIO: File contents
+                BinaryIO: File contents
                 Dict[str, str]: File metadata
         """
         return self.storage.download_file(file_id)
     
+    def stream_file(
+        self,
+        file_id: str,
+        byte_range: Optional[str] = None,
+        if_none_match: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Open a file for streaming from S3 with a single GET request.
+        
+        Args:
+            file_id: ID of the file to download
+            byte_range: Optional HTTP Range header value
+            if_none_match: Optional HTTP If-None-Match header value
+            
+        Returns:
+            Dict with the HTTP status, headers, file metadata and body iterator
+        """
+        self._check_tenant_limits()
+        download = self.storage.stream_file(file_id, byte_range, if_none_match)
+        self._track_usage()
+        return download
+    
+    def get_file_metadata(self, file_id: str) -> Dict[str, Any]:
+        """Get information about a stored file.
+        
+        Args:
+            file_id: ID of the file
+            
+        Returns:
+            Dict with the file's name, size, content type and metadata
+        """
+        self._check_tenant_limits()
+        info = self.storage.get_file_info(file_id)
+        self._track_usage()
+        
+        return self._file_info(file_id, info['size'], info['metadata'], info['content_type'])
+    
     def delete_file(self, file_id: str, remove_from_index: bool = True) -> bool:
         """Delete a file from S3 and optionally from the index.
         
@@ -149,32 +426,84 @@ class S4Service:
         Returns:
             bool: True if deletion was successful
         """
+        self._check_tenant_limits()
+        
         # Delete from S3
         success = self.storage.delete_file(file_id)
         
         # Remove from index if requested
         if success and remove_from_index:
             self.index.remove_document(file_id)
-            
+        
+        self._track_usage()
         return success
     
     def search(
         self, 
         query: str, 
         limit: int = 5,
-        file_id: Optional[str] = None
+        file_id: Optional[str] = None,
+        mode: str = "vector"
     ) -> List[Dict[str, Any]]:
-        """Search indexed documents using semantic search.
+        """Search indexed documents.
         
         Args:
             query: Search query
             limit: Maximum number of results
             file_id: Optional file ID to restrict search to
+            mode: ``"vector"``, ``"lexical"`` or ``"hybrid"``
             
         Returns:
             List of search results with content and metadata
         """
-        return self.index.search(query, limit, filter_by_file_id=file_id)
+        self._check_tenant_limits()
+        results = self.index.search(query, limit, filter_by_file_id=file_id, mode=mode)
+        self._add_file_metadata([results])
+        self._track_usage()
+        return results
+    
+    def search_batch(
+        self,
+        queries: List[Dict[str, Any]],
+        limit: int = 5,
+        mode: str = "vector"
+    ) -> List[List[Dict[str, Any]]]:
+        """Run many searches with a single embedding request.
+        
+        Args:
+            queries: Dictionaries with a ``query`` and an optional ``file_id`` filter
+            limit: Maximum number of results per query
+            mode: ``"vector"``, ``"lexical"`` or ``"hybrid"``
+            
+        Returns:
+            One list of search results per query
+        """
+        self._check_tenant_limits()
+        batches = self.index.search_batch(queries, limit, mode=mode)
+        self._add_file_metadata(batches)
+        self._track_usage()
+        return batches
+    
+    def _add_file_metadata(self, batches: List[List[Dict[str, Any]]]):
+        """Attach each result's file metadata, fetched once per file.
+        
+        Args:
+            batches: Lists of search results, updated in place
+        """
+        file_metadata: Dict[str, Optional[Dict[str, str]]] = {}
+        for results in batches:
+            for result in results:
+                file_id = result.get('metadata', {}).get('file_id')
+                if not file_id:
+                    continue
+                if file_id not in file_metadata:
+                    try:
+                        file_metadata[file_id] = self.storage.get_file_metadata(file_id)
+                    except S4Error as e:
+                        logger.warning(f"Error getting file metadata for search result: {e}")
+                        file_metadata[file_id] = None
+                if file_metadata[file_id] is not None:
+                    result['file_metadata'] = file_metadata[file_id]
     
     def list_files(self, prefix: Optional[str] = None, max_files: int = 100) -> List[Dict[str, Any]]:
         """List files stored in S3.
@@ -186,7 +515,9 @@ class S4Service:
         Returns:
             List of file information dictionaries
         """
+        self._check_tenant_limits()
         files = self.storage.list_files(prefix, max_files)
+        self._track_usage()
         
         # Enrich with index metadata if available
         for file in files:
@@ -200,44 +531,53 @@ class S4Service:
                 
         return files
     
-    def update_metadata(self, file_id: str, metadata: Dict[str, str]) -> bool:
+    def update_metadata(self, file_id: str, metadata: Dict[str, str]) -> Dict[str, Any]:
         """Update metadata for a file in S3 and the index.
         
+        The index patches the file's stored metadata in place; the file is
+        neither downloaded nor re-embedded.
+        
         Args:
             file_id: ID of the file
             metadata: New metadata to merge with existing
             
         Returns:
-            bool: True if update was successful
+            Dict with the file's name, size, content type and merged metadata
         """
+        self._check_tenant_limits()
+        
         # Update in S3
-        s3_success = self.storage.update_file_metadata(file_id, metadata)
+        info = self.storage.update_file_metadata(file_id, metadata)
         
         # Update in index if the file is indexed
-        index_metadata = self.index.get_document_metadata(file_id)
-        if index_metadata:
-            # Get existing chunks
-            file_content, _ = self.storage.download_file(file_id)
-            
-            # Re-process the document
-            chunks = self.processor.process_document(
-                file_obj=file_content,
-                file_name=metadata.get('file_name') or index_metadata.get('metadata', {}).get('file_name'),
-                mime_type=metadata.get('content_type') or index_metadata.get('metadata', {}).get('content_type')
-            )
-            
-            # Remove old document from index
-            self.index.remove_document(file_id)
-            
-            # Add updated document to index
-            if chunks:
-                self.index.add_document(
-                    file_id=file_id,
-                    chunks=chunks,
-                    metadata={
-                        **(index_metadata.get('metadata', {})),
-                        **metadata
-                    }
-                )
-                
-        return s3_success 
\ No newline at end of file
+        if self.index.get_document_metadata(file_id):
+            self.index.update_document_metadata(file_id, metadata)
+        
+        self._track_usage()
+        return self._file_info(file_id, info['size'], info['metadata'], info['content_type'])
+    
+    def close(self):
+        """Release the files held open by the service's index."""
+        self.index.close()
+    
+    def get_tenant_usage(self) -> Optional[Dict[str, Any]]:
+        """Get the tenant's usage against its plan.
+        
+        Returns:
+            Dictionary with usage statistics, or None if not in multi-tenant mode
+        """
+        if not self.tenant:
+            return None
+        
+        plan = self.tenant.get_plan_object()
+        storage_limit_bytes = int(plan.storage_limit_gb * 1024 * 1024 * 1024)
+        return {
+            "storage_used_bytes": self.tenant.storage_used_bytes,
+            "storage_limit_bytes": storage_limit_bytes,
+            "storage_used_percentage": round(self.tenant.storage_used_bytes / storage_limit_bytes * 100, 2),
+            "api_requests_count": self.tenant.api_requests_count,
+            "api_requests_limit": plan.monthly_requests,
+            "api_requests_percentage": round(self.tenant.api_requests_count / plan.monthly_requests * 100, 2),
+            "file_count": self.tenant.file_count,
+            "plan": plan.dict()
+        } 
\ No newline at end of file
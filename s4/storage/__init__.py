@@ -1,5 +1,6 @@
 """Storage module for S4."""
 
 from s4.storage.s3 import S3Storage
+from s4.storage.transfer import UploadProgress, get_transfer_config
 
-__all__ = ['S3Storage'] 
\ No newline at end of file
+__all__ = ['S3Storage', 'UploadProgress', 'get_transfer_config'] 
\ No newline at end of file
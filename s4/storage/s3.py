@@ -2,19 +2,28 @@
 
 import io
 import logging
+import math
+import shutil
+import tempfile
 import uuid
 from datetime import datetime
-from typing import Dict, List, Optional, Union, BinaryIO, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union, BinaryIO, Tuple
 
 import boto3
 from botocore.exceptions import ClientError
 
 from s4 import config
-from s4.exceptions import StorageError, FileNotFoundError
+from s4.exceptions import StorageError, FileNotFoundError, ValidationError
 from s4.embedding.document_processor import DocumentProcessor
+from s4.storage.transfer import MB, UploadProgress, get_client_config, get_transfer_config
 
 logger = logging.getLogger(__name__)
 
+# S3 multipart upload limits
+MAX_UPLOAD_PARTS = 10000
+MIN_PART_SIZE = 5 * MB
+MAX_OBJECT_SIZE = 5 * 1024 * 1024 * MB
+
 class S3Storage:
     """Interface for S3 storage operations."""
     
@@ -52,7 +61,9 @@ class S3Storage:
             aws_access_key_id=self.aws_access_key_id,
             aws_secret_access_key=self.aws_secret_access_key,
             region_name=self.aws_region,
+            config=get_client_config()
         )
+        self.transfer_config = get_transfer_config()
         
         self._ensure_bucket_exists()
         
@@ -106,22 +117,61 @@ class S3Storage:
             return object_key[len(f"{self.tenant_id}/"):]
         return object_key
     
+    def _new_file_id(self, file_name: Optional[str] = None) -> str:
+        """Generate a unique file ID, ending in the file name if there is one.
+        
+        Args:
+            file_name: Optional name for the file
+            
+        Returns:
+            str: The file ID
+        """
+        # Generate a unique ID for the file
+        file_id = str(uuid.uuid4())
+        
+        # Use provided filename or generate one
+        if file_name:
+            # Ensure filename is safe
+            safe_name = file_name.replace(' ', '_').lower()
+            file_id = f"{file_id}/{safe_name}"
+        return file_id
+    
+    def _object_metadata(self, metadata: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Build the S3 metadata of a new object, stamped with the upload time.
+        
+        Args:
+            metadata: Optional metadata dictionary
+            
+        Returns:
+            Dict[str, str]: S3 metadata; values must be strings
+        """
+        s3_metadata = {k: str(v) for k, v in (metadata or {}).items()}
+        s3_metadata['uploaded-at'] = datetime.utcnow().isoformat()
+        return s3_metadata
+    
     def upload_file(
         self, 
         file_obj: Union[BinaryIO, bytes, str], 
         file_name: Optional[str] = None,
         content_type: Optional[str] = None,
         metadata: Optional[Dict[str, str]] = None,
-        generate_embedding: bool = True
+        generate_embedding: bool = True,
+        progress: Optional[Callable[[int, Optional[int]], None]] = None,
+        file_id: Optional[str] = None
     ) -> str:
         """Upload a file to S3.
         
+        Files over the multipart threshold are read from the file object
+        part by part and the parts are sent in parallel.
+        
         Args:
             file_obj: File-like object, bytes, or path to file
             file_name: Optional name for the file (will be used in S3 key)
             content_type: Optional MIME type
             metadata: Optional metadata dictionary
             generate_embedding: Whether to generate embeddings for the file
+            progress: Optional function called with (bytes sent, total bytes) after each part
+            file_id: Optional file ID (generated if not provided)
             
         Returns:
             str: The file ID (not the full S3 key)
@@ -129,69 +179,50 @@ class S3Storage:
         if isinstance(file_obj, str):
             # Assume it's a file path
             with open(file_obj, 'rb') as f:
-                return self.upload_file(f, file_name or file_obj.split('/')[-1], content_type, metadata, generate_embedding)
-        
-        # Generate a unique ID for the file
-        file_id = str(uuid.uuid4())
+                return self.upload_file(
+                    f, file_name or file_obj.split('/')[-1], content_type, metadata,
+                    generate_embedding, progress, file_id
+                )
         
-        # Use provided filename or generate one
-        if file_name:
-            # Ensure filename is safe
-            safe_name = file_name.replace(' ', '_').lower()
-            file_id = f"{file_id}/{safe_name}"
+        file_id = file_id or self._new_file_id(file_name)
         
         # Get full S3 key (may include tenant prefix)
         key = self._get_object_key(file_id)
             
         # Prepare the upload parameters
-        upload_args = {
-            'Bucket': self.bucket_name,
-            'Key': key,
-        }
+        extra_args = {'Metadata': self._object_metadata(metadata)}
         
         # Add content type if provided
         if content_type:
-            upload_args['ContentType'] = content_type
-            
-        # Add metadata if provided
-        if metadata:
-            # S3 metadata keys must be prefixed with 'x-amz-meta-'
-            # and values must be strings
-            s3_metadata = {k: str(v) for k, v in metadata.items()}
-            upload_args['Metadata'] = s3_metadata
-            
-        # Add timestamp metadata
-        timestamp = datetime.utcnow().isoformat()
-        if 'Metadata' not in upload_args:
-            upload_args['Metadata'] = {}
-        upload_args['Metadata']['uploaded-at'] = timestamp
-        
-        if generate_embedding:
-            if isinstance(file_obj, bytes):
-                file_content_copy = io.BytesIO(file_obj)
-                upload_args['Body'] = io.BytesIO(file_obj)
-            else:
-                current_pos = file_obj.tell()
-                file_obj.seek(0)
-                content = file_obj.read()
-                file_content_copy = io.BytesIO(content)
-                upload_args['Body'] = io.BytesIO(content)
-                file_obj.seek(current_pos)
-        else:
-            if isinstance(file_obj, bytes):
-                upload_args['Body'] = io.BytesIO(file_obj)
-            else:
-                # Assume it's a file-like object
-                upload_args['Body'] = file_obj
+            extra_args['ContentType'] = content_type
+        
+        # The same buffer is uploaded and then rewound for text extraction,
+        # so the content is never copied
+        if isinstance(file_obj, bytes):
+            file_obj = io.BytesIO(file_obj)
+        start = total = None
+        if file_obj.seekable():
+            start = file_obj.tell()
+            total = file_obj.seek(0, io.SEEK_END) - start
+            file_obj.seek(start)
             
         try:
-            self.s3.upload_fileobj(**upload_args)
+            # Parts are read from the file object as they are sent
+            self.s3.upload_fileobj(
+                file_obj,
+                self.bucket_name,
+                key,
+                ExtraArgs=extra_args,
+                Callback=UploadProgress(key, total, callback=progress),
+                Config=self.transfer_config
+            )
             logger.info(f"Uploaded file to S3: {key}")
             
             if generate_embedding:
                 try:
+                    file_obj.seek(start)
                     doc_info = self.document_processor.process_document(
-                        file_content_copy, 
+                        file_obj, 
                         file_name or "unknown", 
                         content_type
                     )
@@ -215,15 +246,169 @@ class S3Storage:
             logger.error(f"Error uploading file to S3: {e}")
             raise StorageError(f"Error uploading file: {str(e)}")
     
-    def download_file(self, file_id: str) -> Tuple[io.BytesIO, Dict[str, str]]:
+    def create_presigned_upload(
+        self,
+        file_name: str,
+        size: int,
+        content_type: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None,
+        expires_in: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Start a multipart upload that the client sends straight to S3.
+        
+        Every part gets a presigned PUT URL. The client uploads the parts,
+        in parallel if it likes, then reports their ETags to
+        :meth:`complete_presigned_upload`.
+        
+        Args:
+            file_name: Name of the file
+            size: Size of the file in bytes
+            content_type: Optional MIME type
+            metadata: Optional metadata dictionary
+            expires_in: Optional seconds the part URLs stay valid
+            
+        Returns:
+            Dict with the ``file_id``, ``upload_id``, ``part_size``,
+            ``expires_in`` and a ``parts`` list of ``part_number`` and ``url``
+        """
+        if not 0 <= size <= MAX_OBJECT_SIZE:
+            raise ValidationError(f"File size must be between 0 and {MAX_OBJECT_SIZE} bytes")
+        expires_in = expires_in or config.PRESIGNED_URL_EXPIRES
+        
+        # Parts grow past the configured size if S3's part count limit requires it
+        part_size = max(config.S3_PART_SIZE_MB * MB, MIN_PART_SIZE, math.ceil(size / MAX_UPLOAD_PARTS))
+        part_count = max(math.ceil(size / part_size), 1)
+        
+        file_id = self._new_file_id(file_name)
+        key = self._get_object_key(file_id)
+        upload_args = {
+            'Bucket': self.bucket_name,
+            'Key': key,
+            'Metadata': self._object_metadata(metadata)
+        }
+        if content_type:
+            upload_args['ContentType'] = content_type
+            
+        try:
+            upload_id = self.s3.create_multipart_upload(**upload_args)['UploadId']
+            parts = [
+                {
+                    'part_number': part_number,
+                    'url': self.s3.generate_presigned_url(
+                        'upload_part',
+                        Params={
+                            'Bucket': self.bucket_name,
+                            'Key': key,
+                            'UploadId': upload_id,
+                            'PartNumber': part_number
+                        },
+                        ExpiresIn=expires_in
+                    )
+                }
+                for part_number in range(1, part_count + 1)
+            ]
+            logger.info(f"Started presigned upload of {part_count} parts to S3: {key}")
+            return {
+                'file_id': file_id,
+                'upload_id': upload_id,
+                'part_size': part_size,
+                'expires_in': expires_in,
+                'parts': parts
+            }
+        except ClientError as e:
+            logger.error(f"Error starting presigned upload to S3: {e}")
+            raise StorageError(f"Error starting upload: {str(e)}")
+    
+    def complete_presigned_upload(self, file_id: str, upload_id: str, parts: List[Dict[str, Any]]):
+        """Assemble the parts of a presigned upload into the file.
+        
+        Args:
+            file_id: The file ID returned when the upload started
+            upload_id: The multipart upload ID
+            parts: ``part_number`` and ``etag`` of every uploaded part
+        """
+        key = self._get_object_key(file_id)
+        try:
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': [
+                    {'PartNumber': part['part_number'], 'ETag': part['etag']}
+                    for part in sorted(parts, key=lambda part: part['part_number'])
+                ]}
+            )
+            logger.info(f"Completed presigned upload to S3: {key}")
+        except ClientError as e:
+            logger.error(f"Error completing presigned upload to S3: {e}")
+            raise StorageError(f"Error completing upload: {str(e)}")
+    
+    def abort_presigned_upload(self, file_id: str, upload_id: str) -> bool:
+        """Abandon a presigned upload, discarding any uploaded parts.
+        
+        Args:
+            file_id: The file ID returned when the upload started
+            upload_id: The multipart upload ID
+            
+        Returns:
+            bool: True if successful
+        """
+        key = self._get_object_key(file_id)
+        try:
+            self.s3.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+            logger.info(f"Aborted presigned upload to S3: {key}")
+            return True
+        except ClientError as e:
+            logger.error(f"Error aborting presigned upload to S3: {e}")
+            return False
+    
+    def generate_download_url(
+        self,
+        file_id: str,
+        file_name: Optional[str] = None,
+        disposition: str = "attachment",
+        expires_in: Optional[int] = None
+    ) -> str:
+        """Create a presigned URL the client downloads a file from directly.
+        
+        S3 then serves the bytes, including Range and conditional requests.
+        
+        Args:
+            file_id: The file ID (not the full S3 key)
+            file_name: Optional file name for the Content-Disposition header
+            disposition: ``attachment`` or ``inline``
+            expires_in: Optional seconds the URL stays valid
+            
+        Returns:
+            str: Presigned GET URL
+        """
+        params = {
+            'Bucket': self.bucket_name,
+            'Key': self._get_object_key(file_id),
+            'ResponseContentDisposition': f"{disposition}; filename=\"{file_name}\"" if file_name else disposition
+        }
+        try:
+            return self.s3.generate_presigned_url(
+                'get_object',
+                Params=params,
+                ExpiresIn=expires_in or config.PRESIGNED_URL_EXPIRES
+            )
+        except ClientError as e:
+            logger.error(f"Error presigning download from S3: {e}")
+            raise StorageError(f"Error creating download URL: {str(e)}")
+    
+    def download_file(self, file_id: str) -> Tuple[BinaryIO, Dict[str, str]]:
         """Download a file from S3.
         
+        The body is copied in pieces into a spooled temporary file, which
+        moves to disk once it outgrows the configured size.
+        
         Args:
             file_id: The file ID (not the full S3 key)
             
         Returns:
             Tuple containing:
-                io.BytesIO: File contents as bytes
+                BinaryIO: File contents, positioned at the start
                 Dict[str, str]: File metadata
         """
         # Get full S3 key (may include tenant prefix)
@@ -231,7 +416,12 @@ class S3Storage:
         
         try:
             response = self.s3.get_object(Bucket=self.bucket_name, Key=key)
-            file_content = io.BytesIO(response['Body'].read())
+            file_content = tempfile.SpooledTemporaryFile(
+                max_size=config.S3_DOWNLOAD_SPOOL_MB * 1024 * 1024, dir=config.TEMP_DIR
+            )
+            with response['Body'] as body:
+                shutil.copyfileobj(body, file_content, config.S3_STREAM_CHUNK_KB * 1024)
+            file_content.seek(0)
             metadata = response.get('Metadata', {})
             return file_content, metadata
         except ClientError as e:
@@ -241,6 +431,78 @@ class S3Storage:
             logger.error(f"Error downloading file from S3: {e}")
             raise StorageError(f"Error downloading file: {str(e)}")
     
+    def stream_file(
+        self,
+        file_id: str,
+        byte_range: Optional[str] = None,
+        if_none_match: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Open a file for streaming with a single GET request.
+        
+        The status, headers and metadata all come from the GET response,
+        and the body is yielded in pieces as it arrives from S3, so neither
+        the time to the first byte nor memory use grows with the file.
+        
+        Args:
+            file_id: The file ID (not the full S3 key)
+            byte_range: Optional HTTP Range header value, e.g. ``bytes=0-1023``
+            if_none_match: Optional HTTP If-None-Match header value
+            
+        Returns:
+            Dict with the HTTP ``status`` (200, 206, 304 or 416), response
+            ``headers``, the file's ``metadata`` and a ``body`` iterator of
+            bytes (None unless the status is 200 or 206)
+        """
+        # Get full S3 key (may include tenant prefix)
+        key = self._get_object_key(file_id)
+        
+        request = {'Bucket': self.bucket_name, 'Key': key}
+        # S3 serves one range per request; other range requests get the whole file
+        if byte_range and byte_range.startswith('bytes=') and ',' not in byte_range:
+            request['Range'] = byte_range
+        if if_none_match:
+            request['IfNoneMatch'] = if_none_match
+            
+        try:
+            response = self.s3.get_object(**request)
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code in ('304', 'NotModified'):
+                return {'status': 304, 'headers': {'ETag': if_none_match}, 'metadata': {}, 'body': None}
+            if code == 'InvalidRange':
+                return {'status': 416, 'headers': {'Accept-Ranges': 'bytes'}, 'metadata': {}, 'body': None}
+            if code in ('NoSuchKey', '404'):
+                logger.error(f"File not found: {key}")
+                raise FileNotFoundError(file_id)
+            logger.error(f"Error downloading file from S3: {e}")
+            raise StorageError(f"Error downloading file: {str(e)}")
+            
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Content-Length': str(response['ContentLength']),
+            'Content-Type': response.get('ContentType') or 'application/octet-stream'
+        }
+        if response.get('ContentRange'):
+            headers['Content-Range'] = response['ContentRange']
+        if response.get('ETag'):
+            headers['ETag'] = response['ETag']
+        if response.get('LastModified'):
+            headers['Last-Modified'] = response['LastModified'].strftime('%a, %d %b %Y %H:%M:%S GMT')
+            
+        return {
+            'status': 206 if 'Content-Range' in headers else 200,
+            'headers': headers,
+            'metadata': response.get('Metadata', {}),
+            'body': self._iter_body(response['Body'])
+        }
+    
+    def _iter_body(self, body: Any) -> Iterator[bytes]:
+        """Yield an S3 response body in pieces, closing it when done."""
+        try:
+            yield from body.iter_chunks(config.S3_STREAM_CHUNK_KB * 1024)
+        finally:
+            body.close()
+    
     def delete_file(self, file_id: str) -> bool:
         """Delete a file from S3.
         
@@ -335,12 +597,27 @@ class S3Storage:
         Returns:
             Dict[str, str]: File metadata
         """
+        return self.get_file_info(file_id)['metadata']
+    
+    def get_file_info(self, file_id: str) -> Dict[str, Any]:
+        """Get the size, content type and metadata of a file with one HEAD request.
+        
+        Args:
+            file_id: The file ID (not the full S3 key)
+            
+        Returns:
+            Dict with the file's ``size``, ``content_type`` and ``metadata``
+        """
         # Get full S3 key (may include tenant prefix)
         key = self._get_object_key(file_id)
         
         try:
             response = self.s3.head_object(Bucket=self.bucket_name, Key=key)
-            return response.get('Metadata', {})
+            return {
+                'size': response.get('ContentLength', 0),
+                'content_type': response.get('ContentType'),
+                'metadata': response.get('Metadata', {})
+            }
         except ClientError as e:
             if e.response['Error']['Code'] == 'NoSuchKey' or e.response['Error']['Code'] == '404':
                 logger.error(f"File not found: {key}")
@@ -348,7 +625,7 @@ class S3Storage:
             logger.error(f"Error getting file metadata from S3: {e}")
             raise StorageError(f"Error getting file metadata: {str(e)}")
             
-    def update_file_metadata(self, file_id: str, metadata: Dict[str, str]) -> bool:
+    def update_file_metadata(self, file_id: str, metadata: Dict[str, str]) -> Dict[str, Any]:
         """Update metadata for a file.
         
         Args:
@@ -356,17 +633,17 @@ class S3Storage:
             metadata: New metadata dictionary
             
         Returns:
-            bool: True if update was successful
+            Dict with the file's ``size``, ``content_type`` and merged ``metadata``
         """
         # Get full S3 key (may include tenant prefix)
         key = self._get_object_key(file_id)
         
         try:
             # Get existing metadata
-            existing_metadata = self.get_file_metadata(file_id)
+            info = self.get_file_info(file_id)
             
             # Merge with new metadata
-            merged_metadata = {**existing_metadata, **metadata}
+            merged_metadata = {**info['metadata'], **metadata}
             
             # Copy object to itself with new metadata
             copy_source = {'Bucket': self.bucket_name, 'Key': key}
@@ -379,7 +656,7 @@ class S3Storage:
             )
             
             logger.info(f"Updated metadata for file: {key}")
-            return True
+            return {**info, 'metadata': merged_metadata}
         except ClientError as e:
             logger.error(f"Error updating file metadata in S3: {e}")
             raise StorageError(f"Error updating file metadata: {str(e)}")  
\ No newline at end of file
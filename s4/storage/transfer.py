@@ -0,0 +1,85 @@
+"""Multipart transfer settings and progress reporting for S3 uploads."""
+
+import logging
+import threading
+from typing import Callable, Optional
+
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+from s4 import config
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+def get_transfer_config() -> TransferConfig:
+    """Build the multipart settings used for every upload.
+
+    Large uploads are split into parts sent over parallel connections, so
+    one upload can fill the link instead of a single TCP stream. Memory
+    used per upload is bounded by roughly the part size times the
+    concurrency.
+
+    Returns:
+        TransferConfig: Transfer settings for ``upload_fileobj``
+    """
+    return TransferConfig(
+        multipart_threshold=config.S3_MULTIPART_THRESHOLD_MB * MB,
+        multipart_chunksize=config.S3_PART_SIZE_MB * MB,
+        max_concurrency=config.S3_MAX_CONCURRENCY,
+        use_threads=config.S3_MAX_CONCURRENCY > 1
+    )
+
+def get_client_config() -> Config:
+    """Build a client config with a connection for every concurrent part."""
+    return Config(max_pool_connections=max(config.S3_MAX_CONCURRENCY, 10))
+
+class UploadProgress:
+    """Reports an upload's progress once per part.
+
+    boto3 calls this from its transfer threads with the bytes sent since
+    the previous call. The bytes are summed, and each time another part's
+    worth has been sent the optional callback gets the bytes sent so far
+    and the total size (None if unknown).
+    """
+
+    def __init__(
+        self,
+        key: str,
+        total: Optional[int] = None,
+        part_size: Optional[int] = None,
+        callback: Optional[Callable[[int, Optional[int]], None]] = None
+    ):
+        """Initialize the progress tracker.
+
+        Args:
+            key: S3 key of the upload, for logging
+            total: Optional size of the upload in bytes
+            part_size: Optional bytes per reported part; defaults to the configured part size
+            callback: Optional function called with (bytes sent, total bytes)
+        """
+        self.key = key
+        self.total = total
+        self.part_size = part_size or config.S3_PART_SIZE_MB * MB
+        self.callback = callback
+        self.sent = 0
+        self.parts = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, bytes_amount: int):
+        with self._lock:
+            self.sent += bytes_amount
+            parts = self.sent // self.part_size
+            finished = self.total is not None and self.sent >= self.total
+            if parts == self.parts and not finished:
+                return
+            self.parts = parts
+            sent = self.sent
+
+        if self.total:
+            logger.debug(f"Uploaded {sent}/{self.total} bytes of {self.key}")
+        else:
+            logger.debug(f"Uploaded {sent} bytes of {self.key}")
+        if self.callback is not None:
+            self.callback(sent, self.total)
@@ -12,11 +12,13 @@ import requests
 import random
 import boto3
 import math
+import threading
 from datetime import datetime
 from fastapi import FastAPI, Depends, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
-from fastapi.responses import JSONResponse, RedirectResponse, Response
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.base import BaseHTTPMiddleware
 
 # Configure logging
@@ -494,12 +496,25 @@ logging.info(f"Local document storage directory: {DOCS_DIR}")
 S3_BUCKET_NAME = os.getenv("S4_S3_BUCKET", "s4-storage-prod")
 S3_REGION = os.getenv("S4_S3_REGION", "us-east-1")
 
+# Multipart upload tuning: large files go up in parts over parallel connections
+S3_PART_SIZE = int(os.getenv("S4_S3_PART_SIZE_MB", "16")) * 1024 * 1024
+S3_MAX_CONCURRENCY = int(os.getenv("S4_S3_MAX_CONCURRENCY", "16"))
+
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
 s3_client = boto3.client(
     's3',
     region_name=S3_REGION,
     aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
+    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    config=BotoConfig(max_pool_connections=max(S3_MAX_CONCURRENCY, 10))
+)
+s3_transfer_config = TransferConfig(
+    multipart_threshold=int(os.getenv("S4_S3_MULTIPART_THRESHOLD_MB", "8")) * 1024 * 1024,
+    multipart_chunksize=S3_PART_SIZE,
+    max_concurrency=S3_MAX_CONCURRENCY
 )
 logging.info(f"Using S3 storage for document uploads: bucket={S3_BUCKET_NAME}, region={S3_REGION}")
 
@@ -514,10 +529,10 @@ async def upload_document(request: Request):
         if not file:
             return JSONResponse(status_code=400, content={"error": "No file provided"})
         
-        # Get file content and metadata
-        content = await file.read()
+        # Get file metadata; the content stays in the spooled upload file
         filename = file.filename
-        file_size = len(content)
+        file_size = file.file.seek(0, os.SEEK_END)
+        file.file.seek(0)
         file_type = file.content_type or "application/octet-stream"
         
         # Generate a unique document ID
@@ -544,11 +559,26 @@ async def upload_document(request: Request):
         s3_key = f"{user_folder}/{doc_id}/{filename}"
         
         try:
-            s3_client.put_object(
-                Bucket=S3_BUCKET_NAME,
-                Key=s3_key,
-                Body=content,
-                ContentType=file_type
+            progress_lock = threading.Lock()
+            sent = 0
+            def report_progress(bytes_amount):
+                # Called from the transfer threads with the bytes sent since the last call
+                nonlocal sent
+                with progress_lock:
+                    previous, sent = sent, sent + bytes_amount
+                    current = sent
+                if current // S3_PART_SIZE > previous // S3_PART_SIZE or current >= file_size:
+                    logging.debug(f"Uploaded {current}/{file_size} bytes of {s3_key}")
+            
+            # Parts are read from the upload file and sent in parallel
+            await run_in_threadpool(
+                s3_client.upload_fileobj,
+                file.file,
+                S3_BUCKET_NAME,
+                s3_key,
+                ExtraArgs={"ContentType": file_type},
+                Callback=report_progress,
+                Config=s3_transfer_config
             )
             logging.info(f"Uploaded file to S3: {s3_key}")
         except Exception as e:
@@ -734,81 +764,99 @@ async def delete_document(doc_id: str, request: Request):
         logging.error(f"Error deleting document: {str(e)}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+# Size of the pieces document bodies are streamed to clients in
+S3_STREAM_CHUNK_SIZE = int(os.getenv("S4_S3_STREAM_CHUNK_KB", "64")) * 1024
+
+def stream_s3_object(request: Request, s3_key: str, media_type: str, disposition: str):
+    """Stream an S3 object to the client from a single GET.
+    
+    A single byte range and If-None-Match are passed through to S3, and
+    the body is relayed in pieces as it arrives.
+    """
+    get_args = {"Bucket": S3_BUCKET_NAME, "Key": s3_key}
+    byte_range = request.headers.get("range")
+    # S3 serves one range per request; other range requests get the whole object
+    if byte_range and byte_range.startswith("bytes=") and "," not in byte_range:
+        get_args["Range"] = byte_range
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        get_args["IfNoneMatch"] = if_none_match
+        
+    try:
+        response = s3_client.get_object(**get_args)
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code in ("304", "NotModified"):
+            return Response(status_code=304, headers={"ETag": if_none_match})
+        if code == "InvalidRange":
+            return Response(status_code=416, headers={"Accept-Ranges": "bytes"})
+        logging.error(f"Error retrieving document from S3: {str(e)}")
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Document not found"}
+        )
+        
+    headers = {
+        "Content-Disposition": disposition,
+        "Content-Length": str(response["ContentLength"]),
+        "Accept-Ranges": "bytes",
+        "Access-Control-Allow-Origin": "*"
+    }
+    if response.get("ContentRange"):
+        headers["Content-Range"] = response["ContentRange"]
+    if response.get("ETag"):
+        headers["ETag"] = response["ETag"]
+        
+    def iter_body():
+        try:
+            yield from response["Body"].iter_chunks(S3_STREAM_CHUNK_SIZE)
+        finally:
+            response["Body"].close()
+            
+    return StreamingResponse(
+        iter_body(),
+        status_code=206 if "Content-Range" in headers else 200,
+        media_type=media_type,
+        headers=headers
+    )
+
 # Document view endpoint
 @app.get("/documents/view/{user_id}/{doc_id}/{filename}")
-async def view_document(user_id: str, doc_id: str, filename: str):
+async def view_document(user_id: str, doc_id: str, filename: str, request: Request):
     try:
         user_folder = user_id.replace("@", "-at-").replace(".", "-dot-")
         s3_key = f"{user_folder}/{doc_id}/{filename}"
         
-        try:
-            response = s3_client.get_object(
-                Bucket=S3_BUCKET_NAME,
-                Key=s3_key
-            )
+        # Determine content type based on file extension
+        content_type = "application/octet-stream"  # Default
+        if filename.lower().endswith(".pdf"):
+            content_type = "application/pdf"
+        elif filename.lower().endswith(".txt"):
+            content_type = "text/plain"
+        elif filename.lower().endswith(".docx"):
+            content_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        elif filename.lower().endswith(".md"):
+            content_type = "text/markdown"
             
-            # Determine content type based on file extension
-            content_type = "application/octet-stream"  # Default
-            if filename.lower().endswith(".pdf"):
-                content_type = "application/pdf"
-            elif filename.lower().endswith(".txt"):
-                content_type = "text/plain"
-            elif filename.lower().endswith(".docx"):
-                content_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            elif filename.lower().endswith(".md"):
-                content_type = "text/markdown"
-            
-            content = response['Body'].read()
-            
-            # Return file content with appropriate headers for viewing
-            return Response(
-                content=content,
-                media_type=content_type,
-                headers={
-                    "Content-Disposition": f"inline; filename={filename}",
-                    "Access-Control-Allow-Origin": "*"
-                }
-            )
-        except Exception as e:
-            logging.error(f"Error retrieving document from S3: {str(e)}")
-            return JSONResponse(
-                status_code=404,
-                content={"error": "Document not found"}
-            )
+        # Stream file content with appropriate headers for viewing
+        return await run_in_threadpool(
+            stream_s3_object, request, s3_key, content_type, f"inline; filename={filename}"
+        )
     except Exception as e:
         logging.error(f"Error viewing document: {str(e)}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 # Document download endpoint
 @app.get("/documents/download/{user_id}/{doc_id}/{filename}")
-async def download_document(user_id: str, doc_id: str, filename: str):
+async def download_document(user_id: str, doc_id: str, filename: str, request: Request):
     try:
         user_folder = user_id.replace("@", "-at-").replace(".", "-dot-")
         s3_key = f"{user_folder}/{doc_id}/{filename}"
         
-        try:
-            response = s3_client.get_object(
-                Bucket=S3_BUCKET_NAME,
-                Key=s3_key
-            )
-            
-            content = response['Body'].read()
-            
-            # Return file content with appropriate headers for download
-            return Response(
-                content=content,
-                media_type="application/octet-stream",
-                headers={
-                    "Content-Disposition": f"attachment; filename={filename}",
-                    "Access-Control-Allow-Origin": "*"
-                }
-            )
-        except Exception as e:
-            logging.error(f"Error retrieving document from S3: {str(e)}")
-            return JSONResponse(
-                status_code=404,
-                content={"error": "Document not found"}
-            )
+        # Stream file content with appropriate headers for download
+        return await run_in_threadpool(
+            stream_s3_object, request, s3_key, "application/octet-stream", f"attachment; filename={filename}"
+        )
     except Exception as e:
         logging.error(f"Error downloading document: {str(e)}")
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -0,0 +1,56 @@
+"""Tests for token-aware embedding request packing."""
+
+import unittest
+
+import numpy as np
+
+from s4.embedding.batching import TokenBatcher
+
+class WordEncoding:
+    """Encoding with one token per word."""
+
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+class TestTokenBatcher(unittest.TestCase):
+    """Test cases for TokenBatcher."""
+
+    def _batcher(self, **kwargs):
+        options = dict(max_input_tokens=4, max_batch_tokens=6, max_batch_size=3, encoding=WordEncoding())
+        options.update(kwargs)
+        return TokenBatcher(model="test", **options)
+
+    def test_requests_respect_token_and_item_limits(self):
+        """Texts are packed in order into the fewest requests the limits allow."""
+        batches = self._batcher().pack(["a b", "c d", "e", "f", "g h i", "j"])
+
+        self.assertEqual([b.texts for b in batches], [["a b", "c d", "e"], ["f", "g h i", "j"]])
+        self.assertEqual([b.tokens for b in batches], [5, 5])
+
+    def test_oversize_texts_are_truncated(self):
+        """Truncation keeps the first tokens of an oversize text."""
+        batches = self._batcher(oversize="truncate").pack(["a b c d e f"])
+
+        self.assertEqual(batches[0].texts, ["a b c d"])
+
+    def test_split_texts_are_averaged_into_one_vector(self):
+        """Split pieces are embedded separately and averaged by token count."""
+        requests = []
+
+        def embed_many(texts):
+            requests.append(list(texts))
+            return [[1.0, 0.0] if text.startswith("a") else [0.0, 1.0] for text in texts]
+
+        batcher = self._batcher(oversize="split")
+        vectors = batcher.embed(["x", "a b c d e f"], embed_many)
+
+        self.assertEqual(requests, [["x", "a b c d"], ["e f"]])
+        self.assertEqual(vectors[0], [0.0, 1.0])
+        np.testing.assert_allclose(vectors[1], np.array([2.0, 1.0]) / np.sqrt(5))
+        self.assertEqual((batcher.requests, batcher.tokens), (2, 7))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""Tests for the indexer's document processor."""
+
+import io
+import time
+import unittest
+from typing import List
+from unittest.mock import patch
+
+from s4.exceptions import ProcessingError
+from s4.embedding.batching import _ByteEncoding
+from s4.indexer import DocumentProcessor, ExtractionPool, TokenChunker
+
+def make_pdf(pages: List[str]) -> bytes:
+    """Build a minimal PDF with one line of text per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(
+            f"{4 + 2 * i} 0 R".encode() for i in range(len(pages))
+        ) + b"] /Count " + str(len(pages)).encode() + b" >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 712 Td ({text}) Tj ET".encode()
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents " + f"{5 + 2 * i} 0 R".encode() + b" >>"
+        )
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return pdf
+
+class TestDocumentProcessor(unittest.TestCase):
+    """Test cases for DocumentProcessor."""
+
+    def setUp(self):
+        """Set up a processor with small chunks."""
+        self.processor = DocumentProcessor(chunk_size=100, chunk_overlap=20)
+        self.text = " ".join(f"word{i}" for i in range(5000))
+
+    def test_streamed_chunks_cover_text_within_size(self):
+        """Streaming chunks stay within the token limit and cover every word."""
+        chunks = list(self.processor.iter_chunks(self.text.encode("utf-8"), mime_type="text/plain"))
+
+        encoding = self.processor.chunker.encoding
+        self.assertTrue(all(len(encoding.encode(chunk)) <= 100 for chunk in chunks))
+        words = {word for chunk in chunks for word in chunk.split()}
+        self.assertEqual(words, set(self.text.split()))
+        self.assertEqual(chunks, self.processor.process_document(io.BytesIO(self.text.encode("utf-8"))))
+
+    def test_chunks_are_yielded_before_extraction_finishes(self):
+        """The first chunks arrive after only a few pages have been extracted."""
+        pages = iter([self.text[i:i + 500] for i in range(0, len(self.text), 500)])
+        extracted = []
+
+        def iter_text(file_obj, mime_type):
+            for page in pages:
+                extracted.append(page)
+                yield page
+
+        self.processor.iter_text = iter_text
+        next(self.processor.iter_chunks(b"", mime_type="application/pdf"))
+        self.assertLess(len(extracted), 10)
+
+    def test_invalid_utf8_falls_back_to_latin1(self):
+        """Text files that are not UTF-8 are still decoded."""
+        text = self.processor._extract_text("caf\xe9 cr\xe8me".encode("latin-1"), "text/plain")
+        self.assertEqual(text, "caf\xe9 cr\xe8me")
+
+class TestTokenChunker(unittest.TestCase):
+    """Test cases for TokenChunker."""
+
+    def setUp(self):
+        """Set up a chunker counting one token per byte."""
+        self.chunker = TokenChunker(chunk_tokens=64, overlap_tokens=8, encoding=_ByteEncoding())
+        self.text = " ".join(f"mot{i} é" for i in range(2000))
+
+    def test_offsets_locate_chunks_in_text(self):
+        """Character and token offsets point back at each chunk's text."""
+        chunks = self.chunker.split(self.text)
+        encoded = self.text.encode("utf-8")
+
+        for chunk in chunks:
+            self.assertEqual(self.text[chunk.char_start:chunk.char_end], chunk.text)
+            self.assertEqual(encoded[chunk.token_start:chunk.token_end], chunk.text.encode("utf-8"))
+            self.assertLessEqual(chunk.tokens, 64)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertTrue(previous.token_end - 16 <= chunk.token_start <= previous.token_end - 8)
+        self.assertEqual((chunks[0].char_start, chunks[-1].char_end), (0, len(self.text)))
+
+    def test_chunks_break_between_words(self):
+        """Windows start and end at word boundaries when one is near."""
+        chunks = self.chunker.split(self.text)
+        self.assertTrue(all(self.text[chunk.char_end] == " " for chunk in chunks[:-1]))
+        self.assertTrue(all(chunk.text[0] == " " for chunk in chunks[1:]))
+
+    def test_segments_chunk_like_whole_text(self):
+        """Chunking streamed pages gives the same chunks and offsets as one pass."""
+        pages = [self.text[i:i + 700] for i in range(0, len(self.text), 700)]
+        spans = lambda chunks: [(c.text, c.char_start, c.char_end, c.token_start, c.token_end) for c in chunks]
+
+        self.assertEqual(spans(self.chunker.iter_chunks(pages)), spans(self.chunker.split(self.text)))
+
+class TestExtractionPool(unittest.TestCase):
+    """Test cases for ExtractionPool."""
+
+    def setUp(self):
+        """Set up a small multi-page PDF."""
+        self.pages = [f"page number {i}" for i in range(7)]
+        self.pdf = make_pdf(self.pages)
+
+    def _extract(self, pool: ExtractionPool) -> str:
+        with patch('s4.indexer.document_processor.extraction_pool', pool):
+            return DocumentProcessor()._extract_text(self.pdf, "application/pdf")
+
+    def test_pdf_pages_are_extracted_in_order(self):
+        """Page ranges extracted by several workers come back in page order."""
+        pool = ExtractionPool(workers=2, pages_per_task=2)
+        self.addCleanup(pool.shutdown)
+
+        text = self._extract(pool)
+
+        self.assertEqual([line.strip() for line in text.splitlines()], self.pages)
+        self.assertEqual(text, self._extract(ExtractionPool(workers=0, pages_per_task=2)))
+
+    def test_tasks_past_their_deadline_are_interrupted(self):
+        """A worker stops a task once the job's timeout has passed."""
+        pool = ExtractionPool(workers=1, timeout=0.5)
+        self.addCleanup(pool.shutdown)
+
+        started = time.monotonic()
+        with self.assertRaises(ProcessingError):
+            pool.run(time.sleep, 30)
+        self.assertLess(time.monotonic() - started, 10)
+        # The worker survives and takes further jobs
+        self.assertEqual(pool.run(len, "abc"), 3)
+
+if __name__ == "__main__":
+    unittest.main()
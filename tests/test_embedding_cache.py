@@ -0,0 +1,75 @@
+"""Tests for the persistent chunk embedding cache."""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from s4.embedding.base import embedding_key
+from s4.embedding.chunk_cache import EmbeddingCache
+from s4.embedding.local import HashingEmbeddings
+
+class TestEmbeddingCache(unittest.TestCase):
+    """Test cases for EmbeddingCache."""
+
+    def setUp(self):
+        """Set up a temporary cache file and a counting embedding function."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.path = Path(self.temp_dir) / "embeddings.sqlite"
+        self.embedded = []
+
+    def _embed_many(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def test_cached_vectors_survive_reopening(self):
+        """Embeddings are persisted and keyed by model and content."""
+        cache = EmbeddingCache(self.path, max_entries=10)
+        first = cache.embed("m", ["a", "bb", "a"], self._embed_many)
+        cache.close()
+
+        cache = EmbeddingCache(self.path, max_entries=10)
+        second = cache.embed("m", ["bb", "a"], self._embed_many)
+        cache.embed("other", ["a"], self._embed_many)
+
+        np.testing.assert_array_equal(first[[1, 0]], second)
+        self.assertEqual(self.embedded, ["a", "bb", "a"])
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (2, 1, 3))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """The cache stays within its size by dropping the oldest entries."""
+        cache = EmbeddingCache(self.path, max_entries=2)
+        cache.embed("m", ["a"], self._embed_many)
+        cache.embed("m", ["b"], self._embed_many)
+        cache.embed("m", ["a"], self._embed_many)
+        cache.embed("m", ["c"], self._embed_many)
+
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertEqual(set(cache.get_many("m", ["a", "b", "c"])), {"a", "c"})
+
+    def test_size_is_bounded_across_processes(self):
+        """Caches sharing one file, like two server workers, keep it within its size together."""
+        first = EmbeddingCache(self.path, max_entries=3)
+        second = EmbeddingCache(self.path, max_entries=3)
+        for cache, text in ((first, "a"), (first, "b"), (second, "c"), (second, "d"), (first, "e")):
+            cache.embed("m", [text], self._embed_many)
+
+        self.assertEqual(first.stats()['size'], 3)
+        self.assertEqual(set(second.get_many("m", ["a", "b", "c", "d", "e"])), {"c", "d", "e"})
+
+    def test_key_separates_dimensions(self):
+        """Vectors of a model at one width are never served at another."""
+        narrow, wide = HashingEmbeddings(dimension=8), HashingEmbeddings(dimension=16)
+        self.assertNotEqual(embedding_key(narrow), embedding_key(wide))
+
+        cache = EmbeddingCache(self.path, max_entries=10)
+        cache.embed(embedding_key(narrow), ["text"], narrow.embed_batch)
+        vectors = cache.embed(embedding_key(wide), ["text"], wide.embed_batch)
+        self.assertEqual(vectors.shape, (1, 16))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Tests for the rate-limited embedding engine."""
+
+import asyncio
+import time
+import unittest
+import uuid
+from unittest.mock import patch
+
+import httpx
+import openai
+
+from s4 import config
+from s4.embedding.batching import EmbeddingBatch
+from s4.embedding.engine import EmbeddingEngine, TokenBucket, get_rate_limiter
+
+def _batch(texts, tokens=1):
+    batch = EmbeddingBatch()
+    batch.texts = list(texts)
+    batch.tokens = tokens
+    return batch
+
+class TestEmbeddingEngine(unittest.TestCase):
+    """Test cases for EmbeddingEngine."""
+
+    def setUp(self):
+        """Use a fresh API key so every test gets its own limiter."""
+        self.api_key = f"test-{uuid.uuid4()}"
+
+    def test_token_bucket_throttles_to_rate(self):
+        """Requests beyond the bucket's capacity wait for it to refill."""
+        bucket = TokenBucket(per_minute=600)
+
+        async def take():
+            for _ in range(612):
+                await bucket.acquire(1)
+
+        start = time.monotonic()
+        asyncio.run(take())
+        self.assertGreaterEqual(time.monotonic() - start, 1.0)
+
+    def test_requests_run_concurrently_within_bound(self):
+        """Batches are sent concurrently, at most the limiter's concurrency at once."""
+        in_flight = []
+        peak = []
+
+        async def send(texts):
+            in_flight.append(1)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.05)
+            in_flight.pop()
+            return [[float(len(text))] for text in texts]
+
+        with patch.object(config, 'EMBEDDING_CONCURRENCY', 3):
+            engine = EmbeddingEngine(send, api_key=self.api_key)
+            start = time.monotonic()
+            results = engine.embed_batches([_batch([str(i) * i]) for i in range(1, 10)])
+
+        self.assertEqual(results, [[[float(i)]] for i in range(1, 10)])
+        self.assertEqual(max(peak), 3)
+        self.assertLess(time.monotonic() - start, 0.4)
+
+    def test_throttled_requests_honour_retry_after(self):
+        """429 responses are retried after the delay the server asks for."""
+        attempts = []
+        response = httpx.Response(
+            429, headers={"retry-after-ms": "20"}, request=httpx.Request("POST", "https://example.com")
+        )
+
+        async def send(texts):
+            attempts.append(time.monotonic())
+            if len(attempts) < 3:
+                raise openai.RateLimitError("slow down", response=response, body=None)
+            return [[1.0]]
+
+        engine = EmbeddingEngine(send, api_key=self.api_key, max_retries=3)
+
+        self.assertEqual(engine.embed_batches([_batch(["a"])]), [[[1.0]]])
+        self.assertEqual(len(attempts), 3)
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.02)
+
+    def test_other_errors_are_not_retried(self):
+        """Errors that retrying cannot fix are raised at once."""
+        attempts = []
+
+        async def send(texts):
+            attempts.append(1)
+            raise ValueError("bad input")
+
+        engine = EmbeddingEngine(send, api_key=self.api_key)
+        with self.assertRaises(ValueError):
+            engine.embed_batches([_batch(["a"])])
+        self.assertEqual(len(attempts), 1)
+
+    def test_limits_are_shared_and_configurable_per_key(self):
+        """Clients with the same key share one limiter whose limits can be set."""
+        limiter = get_rate_limiter(self.api_key)
+        self.assertIs(get_rate_limiter(self.api_key, 100, 5000), limiter)
+        self.assertEqual((limiter.requests.per_minute, limiter.tokens.per_minute), (100, 5000))
+        self.assertIsNot(get_rate_limiter(f"{self.api_key}-other"), limiter)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,628 @@
+"""Tests for the document index."""
+
+import hashlib
+import shutil
+import threading
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+import httpx
+import openai
+from langchain.vectorstores.faiss import FAISS
+from langchain_core.embeddings import Embeddings
+
+from s4 import config, exceptions
+from s4.embedding import EmbeddingCache, query_cache
+from s4.indexer import DocumentIndex, backend
+from s4.indexer.chunk_store import ChunkStore
+from s4.indexer.lexical import LexicalIndex, tokenize
+from s4.indexer.vector_store import VectorStore
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic embeddings that count calls instead of hitting the API."""
+
+    def __init__(self, dim: int = 16):
+        self.dim = dim
+        self.embedded_texts = 0
+
+    def _embed(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b / 255.0 for b in digest[:self.dim]]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded_texts += len(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+class TestDocumentIndex(unittest.TestCase):
+    """Test cases for DocumentIndex."""
+
+    def setUp(self):
+        """Set up a temporary index directory and fake embeddings."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.embeddings = FakeEmbeddings()
+
+        patches = [
+            patch.object(config, 'INDEX_STORAGE_PATH', Path(self.temp_dir)),
+            # Compaction is exercised explicitly rather than in the background
+            patch.object(config, 'INDEX_COMPACTION_RATIO', 2.0),
+            patch('s4.indexer.index.OpenAIEmbeddings', return_value=self.embeddings),
+            patch('s4.indexer.index.embedding_cache', EmbeddingCache(Path(self.temp_dir) / "embeddings.sqlite")),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        query_cache.clear()
+
+    def _new_index(self) -> DocumentIndex:
+        return DocumentIndex("test")
+
+    def test_remove_document_does_not_embed(self):
+        """Removing a document tombstones its chunks without re-embedding."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one", "alpha two"])
+        index.add_document("b.txt", ["beta one"])
+        embedded_before = self.embeddings.embedded_texts
+
+        index.remove_document("a.txt")
+
+        self.assertEqual(self.embeddings.embedded_texts, embedded_before)
+        self.assertIsNone(index.get_document_metadata("a.txt"))
+        self.assertEqual(len(index.tombstones), 2)
+        results = index.search("alpha one", limit=5)
+        self.assertTrue(all(r['metadata'].get('file_id') != "a.txt" for r in results))
+
+    def test_compact_drops_tombstoned_chunks(self):
+        """Compaction removes tombstoned vectors and persists the result."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one", "alpha two"])
+        index.add_document("b.txt", ["beta one"])
+        index.remove_document("a.txt")
+        index.compact()
+
+        self.assertEqual(index.tombstones, set())
+        reloaded = self._new_index()
+        file_ids = {
+            reloaded.chunks.metadata(position)['file_id']
+            for position in range(len(reloaded.chunks))
+        }
+        self.assertNotIn("a.txt", file_ids)
+        self.assertIn("b.txt", file_ids)
+
+    def test_readding_document_supersedes_old_chunks(self):
+        """Adding a file that is already indexed hides its previous chunks."""
+        index = self._new_index()
+        index.add_document("a.txt", ["old text"])
+        index.add_document("a.txt", ["new text"])
+
+        results = index.search("old text", limit=5)
+        contents = [r['content'] for r in results]
+        self.assertNotIn("old text", contents)
+        self.assertIn("new text", contents)
+
+    def test_rebuild_from_vector_store_does_not_embed(self):
+        """A lost FAISS file is rebuilt from stored vectors, not re-embedded."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one", "alpha two"])
+        index.checkpoint()
+        embedded_before = self.embeddings.embedded_texts
+        index.index_path.unlink()
+
+        rebuilt = self._new_index()
+
+        self.assertEqual(self.embeddings.embedded_texts, embedded_before)
+        self.assertEqual(rebuilt.index.ntotal, 2)
+        self.assertEqual(rebuilt.search("alpha one", limit=1)[0]['content'], "alpha one")
+
+    def test_readding_unchanged_chunks_reuses_vectors(self):
+        """Re-indexing a file only embeds chunks whose text changed."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one", "alpha two"])
+        embedded_before = self.embeddings.embedded_texts
+
+        index.add_document("a.txt", ["alpha one", "alpha three"], {"tag": "x"})
+
+        self.assertEqual(self.embeddings.embedded_texts, embedded_before + 1)
+
+    def test_legacy_index_is_migrated_without_embedding(self):
+        """Indices saved before the vector store are migrated from FAISS itself."""
+        legacy = FAISS.from_texts(
+            ["", "alpha one"], self.embeddings,
+            metadatas=[{}, {'file_id': "a.txt", 'chunk_index': 0}]
+        )
+        legacy.save_local(self.temp_dir, "test")
+        with open(Path(self.temp_dir) / "test.json", 'w') as f:
+            f.write('{"a.txt": {"chunk_count": 1, "metadata": {}}}')
+        embedded_before = self.embeddings.embedded_texts
+
+        index = self._new_index()
+
+        self.assertEqual(self.embeddings.embedded_texts, embedded_before)
+        self.assertEqual(len(index.vector_store), 1)
+        self.assertEqual(index.metadata["a.txt"]['chunk_ids'], [0])
+        self.assertEqual(index.index.ntotal, 1)
+
+    def test_uncheckpointed_operations_are_replayed(self):
+        """Adds and removes logged since the last checkpoint survive a reload."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one"])
+        index.add_document("b.txt", ["beta one"])
+        index.remove_document("a.txt")
+        self.assertFalse(index.index_path.exists())
+
+        reloaded = self._new_index()
+
+        self.assertIsNone(reloaded.get_document_metadata("a.txt"))
+        self.assertIsNotNone(reloaded.get_document_metadata("b.txt"))
+        contents = [r['content'] for r in reloaded.search("alpha one", limit=5)]
+        self.assertEqual(contents, ["beta one"])
+
+    def test_replay_after_checkpoint_is_idempotent(self):
+        """A log left behind by a crash after checkpointing does not duplicate chunks."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one"])
+        index.remove_document("a.txt")
+        index.add_document("a.txt", ["alpha two"])
+        with patch.object(index.wal, 'truncate'):
+            index.checkpoint()
+
+        reloaded = self._new_index()
+
+        self.assertEqual(reloaded.index.ntotal, 2)
+        self.assertEqual(reloaded.metadata["a.txt"]['chunk_ids'], [1])
+        contents = [r['content'] for r in reloaded.search("alpha one", limit=5)]
+        self.assertEqual(contents, ["alpha two"])
+
+    def test_metadata_update_patches_chunks_without_embedding(self):
+        """Metadata edits apply in place, survive replay and checkpoints, and never embed."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one", "alpha two"], {"tag": "draft", "owner": "x"})
+        index.add_document("b.txt", ["beta one"], {"tag": "draft"})
+        embedded_before = self.embeddings.embedded_texts
+        
+        self.assertTrue(index.update_document_metadata("a.txt", {"tag": "final", "file_id": "b.txt"}))
+        self.assertFalse(index.update_document_metadata("missing.txt", {"tag": "final"}))
+        
+        self.assertEqual(self.embeddings.embedded_texts, embedded_before)
+        for searched in (index, self._new_index()):
+            self.assertEqual(
+                searched.get_document_metadata("a.txt")['metadata'], {"tag": "final", "owner": "x"}
+            )
+            for result in searched.search("alpha one", limit=3):
+                expected = "final" if result['metadata']['file_id'] == "a.txt" else "draft"
+                self.assertEqual(result['metadata']['tag'], expected)
+        
+        index.checkpoint()
+        index.remove_document("b.txt")
+        index.compact(rebuild=True)
+        result = self._new_index().search("alpha two", limit=1)[0]
+        self.assertEqual((result['metadata']['file_id'], result['metadata']['tag']), ("a.txt", "final"))
+
+    def test_checkpoint_after_configured_operations(self):
+        """The full index is written once the operation threshold is reached."""
+        with patch.object(config, 'INDEX_CHECKPOINT_OPS', 2):
+            index = self._new_index()
+            index.add_document("a.txt", ["alpha one"])
+            self.assertFalse(index.index_path.exists())
+            index.add_document("b.txt", ["beta one"])
+
+        self.assertTrue(index.index_path.exists())
+        self.assertEqual(index.wal_path.stat().st_size, 0)
+
+    def test_file_filter_returns_limit_results(self):
+        """Filtering by file returns every match even when other files rank higher."""
+        index = self._new_index()
+        index.add_document("big.txt", [f"common text {i}" for i in range(50)])
+        index.add_document("small.txt", ["rare one", "rare two", "rare three"])
+
+        results = index.search("common text 1", limit=3, filter_by_file_id="small.txt")
+
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(r['metadata']['file_id'] == "small.txt" for r in results))
+        self.assertEqual(index.search("x", limit=3, filter_by_file_id="missing.txt"), [])
+
+    def test_filters_exclude_tombstones_and_other_tenants(self):
+        """Posting-list filters drop removed chunks and chunks of other tenants."""
+        index = DocumentIndex("test", tenant_id="t1")
+        index.add_document("a.txt", ["alpha one"])
+        index.add_document("b.txt", ["beta one"], {"tenant_id": "t2"})
+        index.add_document("c.txt", ["gamma one"])
+        index.remove_document("c.txt")
+
+        contents = [r['content'] for r in index.search("gamma one", limit=5)]
+
+        self.assertEqual(contents, ["alpha one"])
+        
+    def test_index_type_follows_corpus_size(self):
+        """Crossing a size threshold rebuilds the index as an ANN index."""
+        with patch.object(config, 'INDEX_HNSW_THRESHOLD', 10), \
+                patch.object(config, 'INDEX_IVF_THRESHOLD', 0):
+            index = self._new_index()
+            index.add_document("a.txt", [f"alpha {i}" for i in range(5)])
+            self.assertEqual(backend.get_index_type(index.index), backend.FLAT)
+            
+            embedded_before = self.embeddings.embedded_texts
+            index.add_document("b.txt", [f"beta {i}" for i in range(10)])
+            index._compaction_thread.join()
+            
+            self.assertEqual(backend.get_index_type(index.index), backend.HNSW)
+            self.assertEqual(self.embeddings.embedded_texts, embedded_before + 10)
+            self.assertEqual(index.search("beta 3", limit=1, ef_search=32)[0]['content'], "beta 3")
+            
+            reloaded = self._new_index()
+            self.assertEqual(backend.get_index_type(reloaded.index), backend.HNSW)
+            
+    def test_ann_index_compaction_and_filters(self):
+        """IVF indices are compacted by rebuilding and filter small subsets exactly."""
+        with patch.object(config, 'INDEX_IVF_THRESHOLD', 40):
+            index = self._new_index()
+            index.add_document("big.txt", [f"common text {i}" for i in range(50)])
+            index.add_document("small.txt", ["rare one", "rare two", "rare three"])
+            index.add_document("gone.txt", ["gone one"])
+            self.assertEqual(backend.get_index_type(index.index), backend.IVF)
+            
+            results = index.search("common text 1", limit=3, filter_by_file_id="small.txt")
+            self.assertEqual({r['content'] for r in results}, {"rare one", "rare two", "rare three"})
+            
+            index.remove_document("gone.txt")
+            self.assertEqual(index.compact(), 1)
+            self.assertEqual(backend.get_index_type(index.index), backend.IVF)
+            self.assertEqual(index.index.ntotal, 53)
+            contents = [r['content'] for r in index.search("gone one", limit=60, nprobe=1)]
+            self.assertNotIn("gone one", contents)
+
+    def test_quantized_index_reranks_at_full_precision(self):
+        """Compressed indices return exact distances and keep recall high."""
+        for quantization in ("int8", "pq"):
+            with self.subTest(quantization=quantization):
+                index = DocumentIndex(f"test-{quantization}", quantization=quantization)
+                index.add_document("a.txt", [f"chunk {i}" for i in range(300)])
+                index.add_document("b.txt", ["removed"])
+                index.remove_document("b.txt")
+                self.assertEqual(backend.get_quantization(index.index), quantization)
+                
+                results = index.search("chunk 7", limit=3)
+                
+                self.assertEqual(results[0]['content'], "chunk 7")
+                self.assertAlmostEqual(results[0]['score'], 0.0, places=5)
+                self.assertNotIn("removed", [r['content'] for r in index.search("removed", limit=5)])
+                self.assertGreaterEqual(index.measure_recall(k=5, num_queries=20), 0.9)
+
+    def test_checkpointed_index_reloads_without_pickle(self):
+        """Checkpoints write the native format, which reloads mapped and stays writable."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one", "alpha two"], {"tag": "x"})
+        index.checkpoint()
+        
+        reloaded = self._new_index()
+        
+        self.assertFalse(reloaded.docstore_path.exists())
+        self.assertEqual(len(reloaded.chunks), 2)
+        result = reloaded.search("alpha two", limit=1)[0]
+        self.assertEqual(result['content'], "alpha two")
+        self.assertEqual(result['metadata']['tag'], "x")
+        self.assertEqual(result['metadata']['chunk_index'], 1)
+        
+        reloaded.add_document("b.txt", ["beta one"])
+        self.assertEqual(reloaded.index.ntotal, 3)
+        self.assertEqual(reloaded.search("beta one", limit=1)[0]['content'], "beta one")
+
+    def test_lexical_search_matches_identifiers_without_embedding(self):
+        """Lexical search finds exact identifiers and never embeds the query."""
+        index = self._new_index()
+        index.add_document("a.txt", ["invoice INV-2024-0042 was paid", "shipping policy"])
+        index.add_document("b.txt", ["invoice INV-2024-0043 is overdue"])
+        
+        with patch.object(self.embeddings, 'embed_query', side_effect=AssertionError):
+            results = index.search("INV-2024-0042", limit=5, mode="lexical")
+            
+        self.assertEqual(results[0]['content'], "invoice INV-2024-0042 was paid")
+        self.assertGreater(results[0]['score'], results[-1]['score'])
+        with self.assertRaises(exceptions.IndexError):
+            index.search("INV-2024-0042", mode="fuzzy")
+        
+    def test_hybrid_search_fuses_rankings(self):
+        """Hybrid search ranks chunks found by both retrievers first."""
+        index = self._new_index()
+        index.add_document("a.txt", ["error code E1234 in parser", "unrelated text"])
+        index.add_document("b.txt", ["another E1234 mention"])
+        
+        results = index.search("error code E1234 in parser", limit=3, mode="hybrid")
+        
+        self.assertEqual(results[0]['content'], "error code E1234 in parser")
+        self.assertEqual(len(results), 3)
+        
+    def test_lexical_index_follows_removal_and_reload(self):
+        """Removed chunks leave lexical results, and the index reloads from disk."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha SKU_991"])
+        index.add_document("b.txt", ["beta SKU_991"])
+        index.remove_document("a.txt")
+        
+        results = index.search("sku_991", mode="lexical")
+        self.assertEqual([r['metadata']['file_id'] for r in results], ["b.txt"])
+        
+        index.compact()
+        index.add_document("c.txt", ["gamma SKU_991"])
+        reloaded = self._new_index()
+        results = reloaded.search("sku_991", mode="lexical", filter_by_file_id="c.txt")
+        self.assertEqual([r['content'] for r in results], ["gamma SKU_991"])
+        self.assertEqual(len(reloaded.lexical), 2)
+
+    def test_batch_search_matches_single_searches(self):
+        """A batch embeds all queries in one request and answers each like search()."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one", "alpha two"])
+        index.add_document("b.txt", ["beta one", "beta two"])
+        queries = [
+            {"query": "alpha one"},
+            {"query": "beta two", "file_id": "b.txt"},
+            {"query": "beta one"},
+            {"query": "alpha two", "file_id": "missing.txt"},
+        ]
+        
+        with patch.object(self.embeddings, 'embed_documents', wraps=self.embeddings.embed_documents) as embed:
+            batches = index.search_batch(queries, limit=2)
+            
+        embed.assert_called_once()
+        self.assertEqual(len(batches), 4)
+        self.assertEqual(batches[3], [])
+        for query, results in zip(queries[:3], batches):
+            expected = index.search(query["query"], limit=2, filter_by_file_id=query.get("file_id"))
+            self.assertEqual([r['content'] for r in results], [r['content'] for r in expected])
+        lexical = index.search_batch(queries[:2], limit=1, mode="lexical")
+        self.assertEqual([r[0]['content'] for r in lexical], ["alpha one", "beta two"])
+
+    def test_repeated_queries_skip_embedding(self):
+        """Repeated searches are answered from the query embedding cache."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one", "alpha two"])
+        embedded_before = self.embeddings.embedded_texts
+        
+        first = index.search("alpha  one", limit=1)
+        second = index.search(" alpha one", limit=1)
+            
+        self.assertEqual(self.embeddings.embedded_texts, embedded_before + 1)
+        self.assertEqual(first, second)
+        self.assertEqual(query_cache.stats()['hits'], 1)
+        
+    def test_throttled_query_embedding_is_retried(self):
+        """Query embeddings go through the engine, which retries failed requests."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one", "alpha two"])
+        send = index.engine.send
+        attempts = []
+        
+        async def flaky_send(texts):
+            attempts.append(texts)
+            if len(attempts) == 1:
+                raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+            return await send(texts)
+        index.engine.send = flaky_send
+        
+        with patch('s4.embedding.engine._backoff', return_value=0):
+            results = index.search("alpha one", limit=1)
+            batch = index.search_batch([{'query': "alpha two"}], limit=1)
+            
+        self.assertEqual(results[0]['content'], "alpha one")
+        self.assertEqual(batch[0][0]['content'], "alpha two")
+        self.assertEqual(attempts, [["alpha one"], ["alpha one"], ["alpha two"]])
+
+    def test_identical_chunks_are_embedded_once_across_tenants(self):
+        """Chunks embedded by one tenant's index are served from the cache for another."""
+        DocumentIndex("test", tenant_id="t1").add_document("a.txt", ["boilerplate", "terms"])
+        embedded_before = self.embeddings.embedded_texts
+        
+        index = DocumentIndex("test", tenant_id="t2")
+        index.add_document("a.txt", ["terms", "boilerplate", "new text"])
+        
+        self.assertEqual(self.embeddings.embedded_texts, embedded_before + 1)
+        self.assertEqual(index.search("terms", limit=1)[0]['content'], "terms")
+        
+    def test_streamed_chunks_are_indexed_in_batches(self):
+        """A chunk generator is embedded batch by batch and committed as one file."""
+        index = self._new_index()
+        chunks = [f"streamed chunk {i}" for i in range(10)]
+        
+        with patch.object(config, 'INDEX_STREAM_BATCH_CHUNKS', 3):
+            count = index.add_document("big.pdf", (chunk for chunk in chunks))
+            
+        self.assertEqual(count, 10)
+        self.assertEqual(index.get_document_metadata("big.pdf")['chunk_count'], 10)
+        self.assertEqual(index._staged, set())
+        results = index.search("streamed chunk 7", limit=1)
+        self.assertEqual(results[0]['content'], "streamed chunk 7")
+        self.assertEqual(self._new_index().index.ntotal, 10)
+        
+    def test_failed_stream_leaves_previous_version(self):
+        """A stream failing midway indexes nothing and keeps the old chunks."""
+        index = self._new_index()
+        index.add_document("big.pdf", ["old text"])
+        
+        def chunks():
+            yield from ["new one", "new two", "new three"]
+            raise ValueError("truncated file")
+            
+        with patch.object(config, 'INDEX_STREAM_BATCH_CHUNKS', 2):
+            with self.assertRaises(exceptions.IndexError):
+                index.add_document("big.pdf", chunks())
+                
+        self.assertEqual(index.get_document_metadata("big.pdf")['chunk_count'], 1)
+        self.assertEqual(index._staged, set())
+        self.assertEqual(index.search("old text", limit=1)[0]['content'], "old text")
+        
+    def test_instances_sharing_an_index_keep_each_others_writes(self):
+        """Two instances on one index, like two server workers, neither lose writes nor reuse IDs."""
+        first, second = self._new_index(), self._new_index()
+        first.add_document("a.txt", ["alpha one"])
+        second.add_document("b.txt", ["beta one"])
+        second.checkpoint()
+        first.add_document("c.txt", ["gamma one"])
+        
+        for index in (first, second, self._new_index()):
+            self.assertEqual(index.get_document_count(), 3)
+            chunk_ids = [index.metadata[f]['chunk_ids'][0] for f in ("a.txt", "b.txt", "c.txt")]
+            self.assertEqual(len(set(chunk_ids)), 3)
+            for text, file_id in (("alpha one", "a.txt"), ("beta one", "b.txt"), ("gamma one", "c.txt")):
+                self.assertEqual(index.search(text, limit=1)[0]['metadata']['file_id'], file_id)
+                
+        first.remove_document("a.txt")
+        first.compact()
+        self.assertIsNone(second.get_document_metadata("a.txt"))
+        self.assertEqual(
+            {r['metadata']['file_id'] for r in second.search("beta one", limit=5)},
+            {"b.txt", "c.txt"}
+        )
+        
+    def test_concurrent_writers_on_one_index(self):
+        """Writes from several instances at once all reach the shared index."""
+        indices = [self._new_index(), self._new_index()]
+        
+        def add(worker, index):
+            for n in range(10):
+                index.add_document(f"w{worker}-{n}.txt", [f"worker {worker} document {n}"])
+                
+        threads = [threading.Thread(target=add, args=(i, index)) for i, index in enumerate(indices)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+            
+        reloaded = self._new_index()
+        self.assertEqual(reloaded.get_document_count(), 20)
+        chunk_ids = [entry['chunk_ids'][0] for entry in reloaded.metadata.values()]
+        self.assertEqual(len(set(chunk_ids)), 20)
+        self.assertEqual(reloaded.index.ntotal, 20)
+        
+    def test_close_releases_the_lock_file(self):
+        """Closing an index releases its lock file, which a request still using it reopens."""
+        index = self._new_index()
+        index.add_document("a.txt", ["alpha one"])
+        
+        index.close()
+        self.assertTrue(index._lock_file.closed)
+        
+        index.add_document("b.txt", ["beta one"])
+        self.assertEqual(self._new_index().get_document_count(), 2)
+        index.close()
+        
+class TestLexicalIndex(unittest.TestCase):
+    """Test cases for LexicalIndex."""
+    
+    def setUp(self):
+        """Set up a temporary index location."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.prefix = Path(self.temp_dir) / "store"
+        
+    def test_tokenize_keeps_compound_identifiers(self):
+        """Identifiers are indexed whole and by their parts."""
+        self.assertEqual(
+            tokenize("See INV-2024-0042, sku_7."),
+            ["see", "inv-2024-0042", "inv", "2024", "0042", "sku_7", "sku", "7"]
+        )
+        
+    def test_saved_generations_merge_and_drop(self):
+        """Saves merge new postings into the mapped base and apply retains."""
+        lexical = LexicalIndex(self.prefix)
+        lexical.add([0, 1], ["red apple", "green apple"])
+        lexical.save()
+        lexical = LexicalIndex(self.prefix)
+        lexical.add([2], ["red pepper"])
+        lexical.retain([1, 2])
+        
+        ids, _ = lexical.search("red", 10)
+        self.assertEqual(ids.tolist(), [2])
+        lexical.save()
+        
+        reloaded = LexicalIndex(self.prefix)
+        self.assertEqual(len(reloaded), 2)
+        self.assertNotIn(0, reloaded)
+        self.assertEqual(sorted(reloaded.search("apple pepper", 10)[0].tolist()), [1, 2])
+        self.assertEqual(len(list(Path(self.temp_dir).glob("store.bm25.*.npy"))), 4)
+
+class TestChunkStore(unittest.TestCase):
+    """Test cases for ChunkStore."""
+    
+    def setUp(self):
+        """Set up a temporary store location."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.prefix = Path(self.temp_dir) / "store"
+        
+    def test_saved_rows_are_mapped_back(self):
+        """Saved chunks reload with their texts and file metadata."""
+        store = ChunkStore(self.prefix)
+        store.append("a.txt", {"tenant_id": "t1"}, [0, 1], ["héllo", "world"])
+        store.save()
+        store.append("b.txt", {}, [5], ["later"])
+        store.save()
+        
+        reloaded = ChunkStore(self.prefix)
+        
+        self.assertEqual(len(reloaded), 3)
+        self.assertEqual(reloaded.text(0), "héllo")
+        self.assertEqual(reloaded.text(2), "later")
+        self.assertEqual(reloaded.metadata(1)['tenant_id'], "t1")
+        self.assertEqual(reloaded.positions([5, 1, 3]).tolist(), [2, 1, -1])
+        self.assertEqual(reloaded.positions_with_metadata('tenant_id', "t1").tolist(), [0, 1])
+        
+    def test_select_drops_rows_and_unused_files(self):
+        """Selecting rows rewrites the store without the dropped chunks."""
+        store = ChunkStore(self.prefix)
+        store.append("a.txt", {}, [0], ["alpha"])
+        store.append("b.txt", {}, [1, 2], ["beta", "gamma"])
+        store.save()
+        
+        store.select([1, 2]).save()
+        reloaded = ChunkStore(self.prefix)
+        
+        self.assertEqual(reloaded.chunk_ids().tolist(), [1, 2])
+        self.assertEqual(reloaded.text(1), "gamma")
+        self.assertEqual(len(reloaded._files), 1)
+        with self.assertRaises(exceptions.IndexError):
+            reloaded.append("c.txt", {}, [2], ["stale id"])
+
+class TestVectorStore(unittest.TestCase):
+    """Test cases for VectorStore."""
+
+    def setUp(self):
+        """Set up a temporary store location."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.prefix = Path(self.temp_dir) / "store"
+
+    def test_uncommitted_tail_is_ignored(self):
+        """Rows written after the last manifest update are discarded on load."""
+        store = VectorStore(self.prefix)
+        store.append([0, 1], [[1.0, 0.0], [0.0, 1.0]])
+        with open(store.vectors_path, 'ab') as f:
+            f.write(b"\x00" * 6)
+
+        reloaded = VectorStore(self.prefix)
+
+        self.assertEqual(len(reloaded), 2)
+        self.assertEqual(reloaded.get([1]).tolist(), [[0.0, 1.0]])
+        self.assertEqual(reloaded.vectors_path.stat().st_size, 16)
+
+    def test_retain_keeps_ids_stable(self):
+        """Retaining a subset keeps chunk IDs and never reuses them."""
+        store = VectorStore(self.prefix)
+        store.append([0, 1, 2], [[1.0], [2.0], [3.0]])
+
+        dropped = store.retain([0, 1])
+        reloaded = VectorStore(self.prefix)
+
+        self.assertEqual(dropped, 1)
+        self.assertEqual(reloaded.get([1]).tolist(), [[2.0]])
+        self.assertNotIn(2, reloaded)
+        self.assertEqual(reloaded.next_id, 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Tests for local embedding providers."""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+from s4 import config
+from s4.embedding import HashingEmbeddings, get_embeddings_provider, query_cache
+from s4.embedding.search import SearchIndex
+from s4.indexer import DocumentIndex
+
+class TestHashingEmbeddings(unittest.TestCase):
+    """Test cases for HashingEmbeddings."""
+
+    def test_embeddings_are_deterministic_and_normalized(self):
+        """The same text always maps to the same unit vector."""
+        embeddings = HashingEmbeddings(dimension=64)
+        first, second = embeddings.embed_batch(["Quarterly revenue report", "Quarterly revenue report"])
+
+        self.assertEqual(len(first), 64)
+        self.assertEqual(first, second)
+        self.assertAlmostEqual(float(np.linalg.norm(first)), 1.0)
+        self.assertEqual(embeddings.embed_text(""), [0.0] * 64)
+
+    def test_related_texts_are_closer(self):
+        """Texts sharing vocabulary are more similar than unrelated ones."""
+        embeddings = HashingEmbeddings()
+        query = embeddings.embed_query("revenue report for the quarter")
+        related, unrelated = embeddings.embed_documents([
+            "the quarterly revenue report", "hiking boots and tents"
+        ])
+
+        self.assertGreater(embeddings.similarity(query, related), embeddings.similarity(query, unrelated))
+
+class TestLocalEmbeddingSelection(unittest.TestCase):
+    """Test cases for selecting local embeddings through the configured model."""
+
+    def setUp(self):
+        """Configure the local model and a temporary data directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        patches = [
+            patch.object(config, 'EMBEDDING_MODEL', "local-hash"),
+            patch.object(config, 'INDEX_STORAGE_PATH', Path(self.temp_dir)),
+            patch('s4.indexer.index.embedding_cache.max_entries', 0),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        query_cache.clear()
+
+    def test_provider_factory_selects_local_model(self):
+        """Models named local-* are served without OpenAI."""
+        self.assertIsInstance(get_embeddings_provider(), HashingEmbeddings)
+        with self.assertRaises(ValueError):
+            get_embeddings_provider("local-unknown")
+
+    def test_document_index_searches_offline(self):
+        """DocumentIndex indexes and searches with the local model."""
+        index = DocumentIndex("local")
+        index.add_document("a.txt", ["invoice payment terms", "hiking boots and tents"])
+
+        results = index.search("payment terms of the invoice", limit=1, mode="vector")
+
+        self.assertIsInstance(index.embeddings, HashingEmbeddings)
+        self.assertEqual(results[0]['content'], "invoice payment terms")
+
+    def test_search_index_uses_local_model(self):
+        """SearchIndex embeds documents and queries with the local model."""
+        search = SearchIndex(index_path=str(Path(self.temp_dir) / "search_index.json"))
+        search.add_document("a", "invoice payment terms", {})
+        search.add_document("b", "hiking boots and tents", {})
+
+        results = search.search("invoice payment", limit=1, threshold=0.0)
+
+        self.assertEqual(results[0]['id'], "a")
+
+if __name__ == "__main__":
+    unittest.main()
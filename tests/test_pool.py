@@ -0,0 +1,120 @@
+"""Tests for the per-tenant service pool."""
+
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from s4.service.pool import ServicePool
+
+class FakeIndex:
+    """Index stand-in reporting a fixed memory usage."""
+
+    def __init__(self, memory: int):
+        self.memory = memory
+
+    def get_memory_usage(self) -> int:
+        return self.memory
+
+class FakeService(SimpleNamespace):
+    """Service stand-in recording whether it was closed."""
+
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+class TestServicePool(unittest.TestCase):
+    """Test cases for ServicePool."""
+
+    def setUp(self):
+        """Set up a factory that counts loads."""
+        self.loads = []
+        self.memory = 0
+
+    def _factory(self, tenant_id):
+        self.loads.append(tenant_id)
+        time.sleep(0.05)
+        return FakeService(tenant_id=tenant_id, index=FakeIndex(self.memory))
+
+    def test_warm_requests_reuse_service(self):
+        """A tenant's service is built once and then served from the pool."""
+        pool = ServicePool(self._factory, max_size=4, memory_budget=0)
+
+        first = pool.get("t1")
+        second = pool.get("t1")
+
+        self.assertIs(first, second)
+        self.assertEqual(self.loads, ["t1"])
+
+    def test_concurrent_cold_requests_share_one_load(self):
+        """Concurrent first requests for a tenant wait for a single load."""
+        pool = ServicePool(self._factory, max_size=4, memory_budget=0)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(pool.get("t1")))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.loads, ["t1"])
+        self.assertEqual(len({id(service) for service in results}), 1)
+
+    def test_least_recently_used_service_is_evicted(self):
+        """The pool drops its least recently used tenant when full."""
+        pool = ServicePool(self._factory, max_size=2, memory_budget=0)
+        pool.get("t1")
+        pool.get("t2")
+        pool.get("t1")
+        pool.get("t3")
+
+        self.assertIn("t1", pool)
+        self.assertNotIn("t2", pool)
+        self.assertIn("t3", pool)
+
+    def test_memory_budget_evicts_services(self):
+        """Services are evicted once their indices exceed the memory budget."""
+        self.memory = 600
+        pool = ServicePool(self._factory, max_size=10, memory_budget=1000)
+        pool.get("t1")
+        pool.get("t2")
+
+        self.assertEqual(len(pool), 1)
+        self.assertIn("t2", pool)
+
+    def test_dropped_services_are_closed(self):
+        """Services leaving the pool, by eviction or explicitly, are closed."""
+        pool = ServicePool(self._factory, max_size=1, memory_budget=0)
+        first = pool.get("t1")
+        second = pool.get("t2")
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+
+        pool.evict("t2")
+        self.assertTrue(second.closed)
+
+        third = pool.get("t3")
+        pool.clear()
+        self.assertTrue(third.closed)
+
+    def test_failed_load_is_retried(self):
+        """A failed load is reported to its waiters and not cached."""
+        calls = []
+
+        def failing_factory(tenant_id):
+            calls.append(tenant_id)
+            if len(calls) == 1:
+                raise ValueError("boom")
+            return SimpleNamespace(tenant_id=tenant_id)
+
+        pool = ServicePool(failing_factory, max_size=2, memory_budget=0)
+        with self.assertRaises(ValueError):
+            pool.get("t1")
+
+        self.assertEqual(pool.get("t1").tenant_id, "t1")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Tests for the query embedding cache."""
+
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from s4.embedding.base import embedding_key
+from s4.embedding.local import HashingEmbeddings
+from s4.embedding.query_cache import QueryEmbeddingCache
+
+class TestQueryEmbeddingCache(unittest.TestCase):
+    """Test cases for QueryEmbeddingCache."""
+
+    def setUp(self):
+        """Set up an embedding function that counts calls."""
+        self.calls = []
+
+    def _embed_many(self, texts):
+        self.calls.append(list(texts))
+        time.sleep(0.05)
+        return [[float(len(text))] for text in texts]
+
+    def test_hits_are_keyed_by_model_and_normalized_text(self):
+        """Whitespace variants share an entry, other models do not."""
+        cache = QueryEmbeddingCache(max_size=10, ttl=0)
+
+        cache.get_many("m1", ["hello  world"], self._embed_many)
+        cache.get_many("m1", ["hello world "], self._embed_many)
+        cache.get_many("m2", ["hello world"], self._embed_many)
+
+        self.assertEqual(len(self.calls), 2)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3)
+
+    def test_dimension_change_misses(self):
+        """A model reconfigured to another width does not get old vectors."""
+        cache = QueryEmbeddingCache(max_size=10, ttl=60)
+        narrow, wide = HashingEmbeddings(dimension=8), HashingEmbeddings(dimension=16)
+
+        cache.get(embedding_key(narrow), "hello", narrow.embed_text)
+        vector = cache.get(embedding_key(wide), "hello", wide.embed_text)
+
+        self.assertEqual(len(vector), 16)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_batch_embeds_only_misses(self):
+        """A batch sends only uncached, distinct queries to the model."""
+        cache = QueryEmbeddingCache(max_size=10, ttl=0)
+        cache.get_many("m", ["a"], self._embed_many)
+
+        vectors = cache.get_many("m", ["a", "bb", "bb", "ccc"], self._embed_many)
+
+        self.assertEqual(vectors, [[1.0], [2.0], [2.0], [3.0]])
+        self.assertEqual(self.calls[-1], ["bb", "ccc"])
+
+    def test_lru_and_ttl_eviction(self):
+        """Entries are dropped when the cache is full or they expire."""
+        cache = QueryEmbeddingCache(max_size=2, ttl=60)
+        for text in ["a", "b", "a", "c"]:
+            cache.get_many("m", [text], self._embed_many)
+        self.assertEqual(len(cache), 2)
+        cache.get_many("m", ["b"], self._embed_many)
+        self.assertEqual(self.calls[-1], ["b"])
+
+        with patch("s4.embedding.query_cache.time.monotonic", return_value=time.monotonic() + 120):
+            cache.get_many("m", ["b"], self._embed_many)
+        self.assertEqual(len(self.calls), 5)
+
+    def test_concurrent_identical_queries_are_coalesced(self):
+        """Concurrent misses for one query wait for a single embedding call."""
+        cache = QueryEmbeddingCache(max_size=10, ttl=0)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get("m", "q", lambda t: self._embed_many([t])[0])))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(results, [[1.0]] * 8)
+
+    def test_failed_embedding_is_not_cached(self):
+        """A failed call is reported and retried on the next request."""
+        cache = QueryEmbeddingCache(max_size=10, ttl=0)
+
+        def failing(texts):
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            cache.get_many("m", ["q"], failing)
+        self.assertEqual(cache.get_many("m", ["q"], self._embed_many), [[1.0]])
+
+if __name__ == "__main__":
+    unittest.main()
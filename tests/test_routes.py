@@ -0,0 +1,249 @@
+"""Tests for the API routes."""
+
+import asyncio
+import io
+import unittest
+from unittest.mock import create_autospec, patch
+from urllib.parse import parse_qs, urlparse
+
+from botocore.response import StreamingBody
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from s4.api import routes
+from s4.exceptions import LimitExceededError
+from s4.models import Tenant
+from s4.service import S4Service
+from s4.storage.transfer import MB
+from tests.test_storage import make_storage
+
+def make_client(service) -> TestClient:
+    """Create a client for the API routes, served by the given service."""
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/api")
+    app.dependency_overrides[routes.get_s4_service_combined] = lambda: service
+    return TestClient(app)
+
+class MemoryS3:
+    """Stub S3 client keeping multipart uploads and objects in memory."""
+
+    def __init__(self):
+        self.uploads = {}
+        self.objects = {}
+
+    def create_multipart_upload(self, Bucket, Key, Metadata, ContentType=None):
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {"key": Key, "metadata": Metadata, "parts": {}}
+        return {"UploadId": upload_id}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.test/{Params['Key']}?uploadId={Params['UploadId']}&partNumber={Params['PartNumber']}"
+
+    def put(self, url: str, data: bytes) -> str:
+        """Receive a part the way S3 would from a client PUT, returning its ETag."""
+        query = parse_qs(urlparse(url).query)
+        parts = self.uploads[query["uploadId"][0]]["parts"]
+        part_number = int(query["partNumber"][0])
+        parts[part_number] = data
+        return f'"etag-{part_number}"'
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        upload = self.uploads.pop(UploadId)
+        data = b"".join(upload["parts"][part["PartNumber"]] for part in MultipartUpload["Parts"])
+        self.objects[Key] = (data, upload["metadata"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        del self.uploads[UploadId]
+
+    def get_object(self, Bucket, Key):
+        data, metadata = self.objects[Key]
+        return {"Body": StreamingBody(io.BytesIO(data), len(data)), "Metadata": metadata}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+class TestRoutes(unittest.TestCase):
+    """Test cases for the API routes against the pooled service's interface."""
+
+    def setUp(self):
+        """Set up an app whose routes get a service stub with S4Service's methods only."""
+        self.service = create_autospec(S4Service, instance=True)
+        self.client = make_client(self.service)
+
+    def test_batch_search_returns_results_per_query(self):
+        """Batch search runs all queries through one service call."""
+        result = {"content": "revenue grew", "score": 0.9, "metadata": {"file_id": "f1"}}
+        self.service.search_batch.return_value = [[result], []]
+
+        response = self.client.post("/api/search/batch", json={
+            "queries": [{"query": "revenue"}, {"query": "churn", "file_id": "f2"}],
+            "limit": 3,
+            "mode": "hybrid"
+        })
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([item["query"] for item in body], ["revenue", "churn"])
+        self.assertEqual(body[0]["results"][0]["content"], "revenue grew")
+        self.assertEqual(body[1]["results"], [])
+        self.service.search_batch.assert_called_once_with(
+            [{"query": "revenue", "file_id": None}, {"query": "churn", "file_id": "f2"}],
+            3,
+            mode="hybrid"
+        )
+
+    def test_search_calls_service(self):
+        """Single searches use the same service interface."""
+        self.service.search.return_value = []
+
+        response = self.client.get("/api/search", params={"query": "revenue", "mode": "lexical"})
+
+        self.assertEqual(response.status_code, 200)
+        self.service.search.assert_called_once_with("revenue", 5, None, mode="lexical")
+
+    def test_upload_hands_over_the_spooled_file(self):
+        """Uploads pass the request's file object to the service and return its description."""
+        received = []
+
+        def upload_file_object(file_obj, **kwargs):
+            received.append(file_obj.read())
+            return {"file_id": "f1", "filename": "a.txt", "size": 5, "content_type": "text/plain", "metadata": {}}
+        self.service.upload_file_object.side_effect = upload_file_object
+
+        response = self.client.post(
+            "/api/files",
+            files={"file": ("a.txt", b"hello", "text/plain")},
+            data={"metadata_json": '{"team": "finance"}'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["file_id"], "f1")
+        self.assertEqual(received, [b"hello"])
+        self.assertEqual(self.service.upload_file_object.call_args.kwargs["metadata"], {"team": "finance"})
+
+    def test_download_passes_the_range_header_through(self):
+        """The client's Range header reaches the service and the partial body is streamed back."""
+        self.service.stream_file.return_value = {
+            "status": 206,
+            "headers": {"Content-Type": "text/plain", "Content-Range": "bytes 0-1/5"},
+            "metadata": {"original_filename": "a.txt"},
+            "body": iter([b"he"])
+        }
+
+        response = self.client.get("/api/files/f1", headers={"Range": "bytes=0-1"})
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, b"he")
+        self.service.stream_file.assert_called_once_with("f1", byte_range="bytes=0-1", if_none_match=None)
+
+    def test_metadata_update_returns_the_merged_metadata(self):
+        """Metadata updates are answered from the update itself, without a second lookup."""
+        self.service.update_metadata.return_value = {
+            "file_id": "f1", "filename": "a.txt", "size": 5, "content_type": "text/plain",
+            "metadata": {"original_filename": "a.txt", "team": "finance"}
+        }
+
+        response = self.client.put("/api/files/f1/metadata", json={"team": "finance"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["metadata"]["team"], "finance")
+        self.service.update_metadata.assert_called_once_with("f1", {"team": "finance"})
+        self.service.get_file_metadata.assert_not_called()
+
+    def test_service_calls_run_off_the_event_loop(self):
+        """Handlers calling the blocking service are plain functions, run in the threadpool."""
+        blocking = [
+            route.name for route in routes.router.routes
+            if asyncio.iscoroutinefunction(route.endpoint)
+        ]
+        self.assertEqual(blocking, [])
+
+class TestPresignedUploadRoutes(unittest.TestCase):
+    """Test cases for presigned uploads through the routes and the pooled service."""
+
+    def setUp(self):
+        """Set up a tenant's service over an in-memory S3 and a recording index."""
+        for target in ('S3Storage', 'DocumentIndex'):
+            patcher = patch(f's4.service.s4_service.{target}')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('s4.service.s4_service.tenant_manager')
+        self.tenant_manager = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tenant_manager.get_tenant.return_value = Tenant(id="t1", name="One", email="one@example.com")
+
+        self.s3 = MemoryS3()
+        self.service = S4Service(tenant_id="t1")
+        self.service.storage = make_storage(self.s3)
+        self.indexed = []
+        self.service.index.add_document.side_effect = (
+            lambda file_id, chunks, metadata: self.indexed.extend(chunks) or len(self.indexed)
+        )
+        self.client = make_client(self.service)
+
+    def test_create_put_complete(self):
+        """An upload sent straight to S3 is indexed, counted and described on completion."""
+        data = b"the presigned upload reached the index" * 1000
+
+        response = self.client.post("/api/files/uploads", json={
+            "filename": "notes.txt",
+            "size": len(data),
+            "metadata": {"team": "finance"}
+        })
+        self.assertEqual(response.status_code, 200)
+        upload = response.json()
+
+        parts = []
+        for part in upload["parts"]:
+            start = (part["part_number"] - 1) * upload["part_size"]
+            etag = self.s3.put(part["url"], data[start:start + upload["part_size"]])
+            parts.append({"part_number": part["part_number"], "etag": etag})
+
+        response = self.client.post(
+            f"/api/files/uploads/{upload['upload_id']}/complete",
+            json={"file_id": upload["file_id"], "parts": parts}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["file_id"], upload["file_id"])
+        self.assertEqual((body["filename"], body["size"], body["content_type"]), ("notes.txt", len(data), "text/plain"))
+        self.assertEqual(body["metadata"]["team"], "finance")
+        self.assertIn("presigned upload reached the index", self.indexed[0])
+        self.tenant_manager.increment_tenant_usage.assert_called_with("t1", file_size=len(data))
+
+    def test_upload_over_plan_is_rejected_before_urls_are_issued(self):
+        """Tenants cannot start an upload their plan's file size limit forbids."""
+        response = self.client.post("/api/files/uploads", json={
+            "filename": "huge.bin",
+            "size": 1024 * 1024 * MB
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.s3.uploads, {})
+
+    def test_abort_discards_the_parts_and_counts_the_request(self):
+        """Aborting an upload drops it from S3 and counts against the tenant's usage."""
+        response = self.client.post("/api/files/uploads", json={"filename": "notes.txt", "size": 10})
+        upload = response.json()
+        self.tenant_manager.increment_tenant_usage.reset_mock()
+
+        response = self.client.delete(
+            f"/api/files/uploads/{upload['upload_id']}",
+            params={"file_id": upload["file_id"]}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.s3.uploads, {})
+        self.tenant_manager.increment_tenant_usage.assert_called_once_with("t1", file_size=0)
+
+    def test_abort_over_plan_is_rejected(self):
+        """Tenants over their plan's limits cannot abort uploads either."""
+        with patch.object(self.service, '_check_tenant_limits', side_effect=LimitExceededError("over")):
+            response = self.client.delete("/api/files/uploads/upload-1", params={"file_id": "f1"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "over")
+
+if __name__ == "__main__":
+    unittest.main()
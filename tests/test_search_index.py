@@ -0,0 +1,161 @@
+"""Tests for the embedding search index."""
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+import numpy as np
+
+from s4.embedding import embedding_cache, query_cache
+from s4.embedding.base import EmbeddingProvider
+from s4.embedding import search
+from s4.embedding.search import SearchIndex
+
+class VectorEmbeddings(EmbeddingProvider):
+    """Provider returning preset vectors for known texts."""
+
+    model = "test-vectors"
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[text] for text in texts]
+
+class TestSearchIndex(unittest.TestCase):
+    """Test cases for SearchIndex."""
+
+    def setUp(self):
+        """Set up a temporary index file and deterministic vectors."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.path = str(Path(self.temp_dir) / "search_index.json")
+        patcher = patch.object(embedding_cache, 'max_entries', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        query_cache.clear()
+
+        rng = np.random.default_rng(0)
+        self.texts = [f"doc {i}" for i in range(50)]
+        self.vectors = {text: rng.normal(size=8).tolist() for text in self.texts}
+        self.vectors["query"] = rng.normal(size=8).tolist()
+        self.provider = VectorEmbeddings(self.vectors)
+
+    def _index(self) -> SearchIndex:
+        return SearchIndex(self.provider, index_path=self.path)
+
+    def _expected(self, ids, limit, threshold):
+        query = np.array(self.vectors["query"])
+        scores = {
+            doc_id: float(np.dot(query, self.vectors[doc_id]) / (
+                np.linalg.norm(query) * np.linalg.norm(self.vectors[doc_id])
+            ))
+            for doc_id in ids
+        }
+        ranked = sorted((d for d in ids if scores[d] >= threshold), key=scores.get, reverse=True)
+        return ranked[:limit], scores
+
+    def test_search_matches_exact_cosine_ranking(self):
+        """Matrix scoring returns the same top-k and scores as pairwise cosine."""
+        index = self._index()
+        for text in self.texts:
+            index.add_document(text, text, {"n": text})
+
+        results = index.search("query", limit=5, threshold=0.1)
+
+        expected, scores = self._expected(self.texts, 5, 0.1)
+        self.assertEqual([r["id"] for r in results], expected)
+        for result in results:
+            self.assertAlmostEqual(result["score"], scores[result["id"]], places=5)
+        self.assertEqual(results[0]["metadata"], {"n": results[0]["id"]})
+
+    def test_removed_documents_leave_results_and_reload(self):
+        """Removal and re-adding keep rows consistent across a reload."""
+        index = self._index()
+        for text in self.texts:
+            index.add_document(text, text, {})
+        for text in self.texts[::3]:
+            index.remove_document(text)
+        index.add_document(self.texts[0], self.texts[0], {})
+        remaining = [t for t in self.texts if t not in self.texts[::3]] + [self.texts[0]]
+
+        for searched in (index, self._index()):
+            results = searched.search("query", limit=10, threshold=-1.0)
+            expected, _ = self._expected(remaining, 10, -1.0)
+            self.assertEqual([r["id"] for r in results], expected)
+
+    def test_uncommitted_tail_is_ignored(self):
+        """Bytes appended after the last manifest write are dropped on load."""
+        index = self._index()
+        for text in self.texts[:10]:
+            index.add_document(text, text, {})
+        # Simulate a crash after appending text and log bytes
+        with open(index._path(index._generation, 'text'), 'ab') as f:
+            f.write(b"partial text")
+        with open(index._path(index._generation, 'log'), 'ab') as f:
+            f.write(b'{"op": "add", "id": "half')
+
+        reloaded = self._index()
+        self.assertEqual(len(reloaded), 10)
+        reloaded.add_document(self.texts[10], self.texts[10], {})
+        results = reloaded.search("query", limit=11, threshold=-1.0)
+        self.assertEqual({r["id"]: r["text"] for r in results}, {t: t for t in self.texts[:11]})
+
+    def test_compaction_keeps_live_documents(self):
+        """Compaction drops superseded entries without changing results."""
+        index = self._index()
+        for text in self.texts:
+            index.add_document(text, text, {"n": text})
+        for text in self.texts[:30]:
+            index.remove_document(text)
+        before = index.search("query", limit=10, threshold=-1.0)
+
+        with patch.object(search, 'COMPACTION_MIN_DEAD', 0):
+            index.add_document(self.texts[-1], self.texts[-1], {"n": self.texts[-1]})
+        self.assertEqual(index._generation, 1)
+        self.assertEqual(len(index.vector_store), 20)
+
+        for searched in (index, self._index()):
+            self.assertEqual(searched.search("query", limit=10, threshold=-1.0), before)
+
+    def test_failed_compaction_leaves_index_unchanged(self):
+        """A compaction that fails part way keeps using the old generation."""
+        index = self._index()
+        for text in self.texts[:20]:
+            index.add_document(text, text, {})
+        for text in self.texts[:10]:
+            index.remove_document(text)
+        before = index.search("query", limit=10, threshold=-1.0)
+
+        with patch.object(index, '_write_manifest', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                index.compact()
+        self.assertEqual(index._generation, 0)
+        self.assertFalse(index._path(1, 'text').exists())
+
+        index.add_document(self.texts[20], self.texts[20], {})
+        after = index.search("query", limit=11, threshold=-1.0)
+        self.assertEqual({r["id"] for r in after}, set(self.texts[10:21]))
+        for searched in (index, self._index()):
+            self.assertEqual(searched.search("query", limit=11, threshold=-1.0), after)
+        self.assertTrue(all(r in after for r in before))
+
+    def test_legacy_json_index_is_migrated(self):
+        """An index saved as one JSON file is loaded into the binary files."""
+        with open(self.path, 'w') as f:
+            json.dump({"documents": {
+                text: {"text": text, "metadata": {}, "embedding": self.vectors[text]}
+                for text in self.texts
+            }}, f)
+
+        results = self._index().search("query", limit=5, threshold=-1.0)
+        expected, _ = self._expected(self.texts, 5, -1.0)
+        self.assertEqual([r["id"] for r in results], expected)
+        self.assertTrue(Path(self.temp_dir, "search_index.manifest.json").exists())
+
+if __name__ == "__main__":
+    unittest.main()
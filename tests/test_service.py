@@ -5,6 +5,9 @@ import os
 import unittest
 from unittest.mock import patch, MagicMock
 
+from s4.embedding.engine import get_rate_limiter
+from s4.exceptions import LimitExceededError, ValidationError
+from s4.models import Tenant
 from s4.service import S4Service
 from s4.storage import S3Storage
 from s4.indexer import DocumentProcessor, DocumentIndex
@@ -144,5 +147,80 @@ class TestS4Service(unittest.TestCase):
         self.mock_storage.delete_file.assert_called_once_with(test_file_id)
         self.mock_index.remove_document.assert_called_once_with(test_file_id)
 
+class TestS4ServiceTenants(unittest.TestCase):
+    """Test cases for tenant configuration of S4Service."""
+    
+    def setUp(self):
+        """Set up two tenants with their own OpenAI keys and limits."""
+        self.tenants = {
+            "t1": Tenant(
+                id="t1", name="One", email="one@example.com", openai_api_key="sk-tenant-one",
+                openai_requests_per_minute=11, openai_tokens_per_minute=1100
+            ),
+            "t2": Tenant(
+                id="t2", name="Two", email="two@example.com", openai_api_key="sk-tenant-two",
+                openai_requests_per_minute=22, openai_tokens_per_minute=2200
+            )
+        }
+        for target in ('S3Storage', 'DocumentIndex'):
+            patcher = patch(f's4.service.s4_service.{target}')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('s4.service.s4_service.tenant_manager')
+        self.tenant_manager = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tenant_manager.get_tenant.side_effect = self.tenants.get
+        
+    def test_tenants_get_separate_rate_limiters(self):
+        """Each tenant's own key is registered with that tenant's limits."""
+        S4Service(tenant_id="t1")
+        S4Service(tenant_id="t2")
+        
+        first = get_rate_limiter("sk-tenant-one")
+        second = get_rate_limiter("sk-tenant-two")
+        self.assertIsNot(first, second)
+        self.assertEqual((first.requests.per_minute, first.tokens.per_minute), (11, 1100))
+        self.assertEqual((second.requests.per_minute, second.tokens.per_minute), (22, 2200))
+        
+    def test_unknown_tenant_is_rejected(self):
+        """A service is not built for a tenant that does not exist."""
+        with self.assertRaises(ValidationError):
+            S4Service(tenant_id="missing")
+        
+    def test_upload_file_object_shares_one_buffer(self):
+        """The uploaded buffer is rewound and extracted; nothing is copied."""
+        service = S4Service(tenant_id="t1")
+        sent = []
+        
+        def upload_file(file_obj, **kwargs):
+            sent.append((file_obj, file_obj.read()))
+            return kwargs['file_id'] or "generated/notes.txt"
+        service.storage.upload_file.side_effect = upload_file
+        indexed = []
+        service.index.add_document.side_effect = (
+            lambda file_id, chunks, metadata: indexed.extend(chunks) or len(indexed)
+        )
+        
+        buffer = io.BytesIO(b"quarterly revenue grew in every region")
+        result = service.upload_file_object(buffer, "notes.txt", metadata={"team": "finance"})
+        
+        self.assertEqual(len(sent), 1)
+        self.assertIs(sent[0][0], buffer)
+        self.assertEqual(sent[0][1], buffer.getvalue())
+        self.assertIn("quarterly revenue", "".join(indexed))
+        self.assertEqual(result['file_id'], "generated/notes.txt")
+        self.assertEqual((result['filename'], result['size'], result['content_type']),
+                         ("notes.txt", len(buffer.getvalue()), "text/plain"))
+        self.tenant_manager.increment_tenant_usage.assert_called_once_with("t1", file_size=len(buffer.getvalue()))
+        
+    def test_upload_over_plan_limit_is_rejected(self):
+        """Files larger than the tenant's plan allows are never sent to S3."""
+        service = S4Service(tenant_id="t1")
+        
+        with patch.object(Tenant, 'check_file_size_limit', return_value=False):
+            with self.assertRaises(LimitExceededError):
+                service.upload_file_object(io.BytesIO(b"x" * 16), "big.bin")
+        service.storage.upload_file.assert_not_called()
+
 if __name__ == "__main__":
-    unittest.main() 
\ No newline at end of file
+    unittest.main()
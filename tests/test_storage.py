@@ -0,0 +1,116 @@
+"""Tests for streaming and presigned S3 transfers."""
+
+import io
+import unittest
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+from s4.storage.s3 import MAX_UPLOAD_PARTS, S3Storage
+from s4.storage.transfer import MB
+
+def make_storage(s3_client):
+    """Create an S3Storage around a stub client, skipping bucket setup."""
+    storage = S3Storage.__new__(S3Storage)
+    storage.s3 = s3_client
+    storage.bucket_name = "bucket"
+    storage.tenant_id = None
+    return storage
+
+class TestStreamFile(unittest.TestCase):
+    """Test cases for S3Storage.stream_file."""
+
+    def test_range_is_served_from_one_get(self):
+        """A byte range is passed to S3 and yields a partial response."""
+        data = b"0123456789" * 10
+        s3 = MagicMock()
+        s3.get_object.return_value = {
+            "Body": StreamingBody(io.BytesIO(data[10:20]), 10),
+            "ContentLength": 10,
+            "ContentRange": "bytes 10-19/100",
+            "ContentType": "text/plain",
+            "ETag": '"abc"',
+            "Metadata": {"original_filename": "a.txt"}
+        }
+        download = make_storage(s3).stream_file("file", byte_range="bytes=10-19")
+
+        s3.get_object.assert_called_once_with(Bucket="bucket", Key="file", Range="bytes=10-19")
+        s3.head_object.assert_not_called()
+        self.assertEqual(download["status"], 206)
+        self.assertEqual(download["headers"]["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(download["headers"]["Content-Type"], "text/plain")
+        self.assertEqual(download["metadata"], {"original_filename": "a.txt"})
+        self.assertEqual(b"".join(download["body"]), data[10:20])
+
+    def test_multiple_ranges_get_whole_file(self):
+        """Ranges S3 cannot serve are dropped rather than sent."""
+        s3 = MagicMock()
+        s3.get_object.return_value = {"Body": StreamingBody(io.BytesIO(b"x"), 1), "ContentLength": 1}
+        download = make_storage(s3).stream_file("file", byte_range="bytes=0-1,5-6")
+
+        s3.get_object.assert_called_once_with(Bucket="bucket", Key="file")
+        self.assertEqual(download["status"], 200)
+
+    def test_not_modified(self):
+        """A matching ETag returns 304 without a body."""
+        s3 = MagicMock()
+        s3.get_object.side_effect = ClientError(
+            {"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject"
+        )
+        download = make_storage(s3).stream_file("file", if_none_match='"abc"')
+
+        self.assertEqual(download["status"], 304)
+        self.assertIsNone(download["body"])
+        self.assertEqual(download["headers"], {"ETag": '"abc"'})
+
+class TestPresignedUpload(unittest.TestCase):
+    """Test cases for presigned multipart uploads."""
+
+    def setUp(self):
+        """Set up a stub client that presigns URLs naming the part."""
+        self.s3 = MagicMock()
+        self.s3.create_multipart_upload.return_value = {"UploadId": "upload"}
+        self.s3.generate_presigned_url.side_effect = (
+            lambda method, Params, ExpiresIn: f"https://s3/{method}/{Params.get('PartNumber')}"
+        )
+        self.storage = make_storage(self.s3)
+
+    def test_one_url_per_part(self):
+        """Each part of the configured size gets its own presigned URL."""
+        with patch("s4.config.S3_PART_SIZE_MB", 16):
+            upload = self.storage.create_presigned_upload("Big File.bin", 40 * MB, "application/octet-stream")
+
+        self.assertEqual(upload["upload_id"], "upload")
+        self.assertEqual(upload["part_size"], 16 * MB)
+        self.assertEqual([part["part_number"] for part in upload["parts"]], [1, 2, 3])
+        self.assertEqual(upload["parts"][2]["url"], "https://s3/upload_part/3")
+        self.assertTrue(upload["file_id"].endswith("/big_file.bin"))
+        args = self.s3.create_multipart_upload.call_args.kwargs
+        self.assertEqual(args["Key"], upload["file_id"])
+        self.assertIn("uploaded-at", args["Metadata"])
+
+    def test_parts_grow_to_stay_under_part_limit(self):
+        """Huge files get larger parts instead of more than S3 allows."""
+        with patch("s4.config.S3_PART_SIZE_MB", 16):
+            upload = self.storage.create_presigned_upload("huge.bin", 200 * 1024 * MB)
+
+        self.assertLessEqual(len(upload["parts"]), MAX_UPLOAD_PARTS)
+        self.assertGreaterEqual(upload["part_size"] * len(upload["parts"]), 200 * 1024 * MB)
+
+    def test_complete_sends_parts_in_order(self):
+        """Parts reported out of order are assembled by part number."""
+        self.storage.complete_presigned_upload("file", "upload", [
+            {"part_number": 2, "etag": '"b"'},
+            {"part_number": 1, "etag": '"a"'}
+        ])
+
+        self.s3.complete_multipart_upload.assert_called_once_with(
+            Bucket="bucket",
+            Key="file",
+            UploadId="upload",
+            MultipartUpload={"Parts": [{"PartNumber": 1, "ETag": '"a"'}, {"PartNumber": 2, "ETag": '"b"'}]}
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Tests for S3 upload transfer settings and progress reporting."""
+
+import threading
+import unittest
+from unittest.mock import patch
+
+from s4.storage.transfer import MB, UploadProgress, get_transfer_config
+
+class TestUploadProgress(unittest.TestCase):
+    """Test cases for UploadProgress."""
+
+    def test_reports_once_per_part(self):
+        """The callback runs when each part's worth of bytes has been sent."""
+        reports = []
+        progress = UploadProgress("key", total=250, part_size=100, callback=lambda *args: reports.append(args))
+        for _ in range(25):
+            progress(10)
+        self.assertEqual(reports, [(100, 250), (200, 250), (250, 250)])
+
+    def test_concurrent_calls_count_every_byte(self):
+        """Bytes reported from several transfer threads are all counted."""
+        reports = []
+        progress = UploadProgress("key", part_size=1000, callback=lambda sent, total: reports.append(sent))
+        threads = [
+            threading.Thread(target=lambda: [progress(1) for _ in range(1000)])
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(progress.sent, 8000)
+        self.assertEqual(len(reports), 8)
+
+class TestTransferConfig(unittest.TestCase):
+    """Test cases for get_transfer_config."""
+
+    def test_uses_configured_part_size_and_concurrency(self):
+        """Multipart settings come from the configuration."""
+        with patch("s4.config.S3_PART_SIZE_MB", 32), patch("s4.config.S3_MAX_CONCURRENCY", 4):
+            transfer_config = get_transfer_config()
+        self.assertEqual(transfer_config.multipart_chunksize, 32 * MB)
+        self.assertEqual(transfer_config.max_concurrency, 4)
+        self.assertTrue(transfer_config.use_threads)
+
+if __name__ == "__main__":
+    unittest.main()